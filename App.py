@@ -1,208 +1,78 @@
+import sys
+import time
+_script_started = time.perf_counter()
+# Imported modules outlive reruns, so only the first run in a server process pays for the imports below
+_cold_start = "pipeline" not in sys.modules
 import os
+import base64
+import logging
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from dotenv import load_dotenv
-import google.generativeai as genai
-from PyPDF2 import PdfReader
-import streamlit.components.v1 as components
 import json
-import pandas as pd
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.options import Options
-import time
-from textblob import TextBlob
-from xhtml2pdf import pisa
-
-# Download NLTK resources only once
-nltk.data.path.append("nltk_data")  # Ensure a local download path
-nltk.download('punkt', quiet=True)
-nltk.download('stopwords', quiet=True)
+import pdf_extract
+import dedup
+import draft_mindmap
+import llm_cache
+import browser_pool
+import markmap_assets
+import mindmap_render
+import markmap_view
+import jobs
+import llm_scheduler
+import llm_resilience
+import pipeline
+import telemetry
+import versioning
+
+telemetry.record("app_cold_imports" if _cold_start else "app_imports", time.perf_counter() - _script_started)
 
 load_dotenv()
 
 API_KEY = os.getenv('API_KEY')
 
+# "native" renders PNGs in-process; "browser" screenshots the Markmap view with headless Chrome
+MINDMAP_PNG_BACKEND = os.getenv('MINDMAP_PNG_BACKEND', 'native')
+
+# Stream Gemini output into the summary and mindmap views while it is generated
+STREAMING = os.getenv('STREAMING', 'true').lower() in ('1', 'true', 'yes')
+
+# Write pipeline debug output (chunk responses, final markdown) to the page; timings go to telemetry
+DEBUG_OUTPUT = os.getenv('DEBUG_OUTPUT', 'false').lower() in ('1', 'true', 'yes')
+
+
 def configure_genai():
-    """Configure the Gemini AI with the API key."""
-    if not API_KEY:
-        st.error("API Key is missing. Please provide a valid Google API key.")
-        return False
+    """Configure the Gemini AI with the API key; False means the app runs offline."""
     try:
-        genai.configure(api_key=API_KEY)
+        pipeline.configure(API_KEY)
         return True
+    except ValueError as e:
+        st.warning(f"{e} Running offline: summaries and mindmaps are built locally from the PDF.")
+        return False
     except Exception as e:
         st.error(f"Error configuring Google API: {str(e)}")
         return False
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from uploaded PDF file."""
-    try:
-        pdf_reader = PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-        if not text.strip():
-            st.warning("No text could be extracted from the PDF. It might be scanned or image-based.")
-            return None
-        return text.strip()
-    except Exception as e:
-        st.error(f"Error reading PDF: {str(e)}")
-        return None
-
-def preprocess_text(text):
-    """Preprocess the text by removing stop words."""
-    stop_words = set(stopwords.words('english'))
-    word_tokens = word_tokenize(text)
-    filtered_text = ' '.join([word for word in word_tokens if word.lower() not in stop_words])
-    return filtered_text
-
-def generate_summary(text):
-    """
-    Generate a summary of the text using Gemini AI, with chunking if needed.
-    Debug prints are added to see the response for each chunk.
-    """
-    try:
-        model = genai.GenerativeModel('gemini-pro')
-        max_chunk_size = 50000  # Increased chunk size for large PDFs
-
-        if len(text) > max_chunk_size:
-            st.write("DEBUG: Splitting text into chunks for summary...")
-            # Split text into chunks
-            chunks = [text[i:i+max_chunk_size] for i in range(0, len(text), max_chunk_size)]
-            summaries = []
-
-            for idx, chunk in enumerate(chunks):
-                prompt = f"Summarize the following text in 5-7 bullet points:\n\n{chunk}"
-                response = model.generate_content(prompt)
-                st.write(f"DEBUG: Summary Chunk {idx+1} length={len(chunk)}")
-                st.write(f"DEBUG: Summary Chunk {idx+1} AI response:", response.text)
 
-                if response.text and response.text.strip():
-                    summaries.append(response.text.strip())
-                else:
-                    summaries.append(f"⚠ Could not generate summary for chunk {idx+1}.")
-
-            # Combine chunk summaries
-            combined_summary = "\n".join(summaries)
-
-            # Re-summarize the combined summary
-            final_prompt = f"Summarize the following bullet points into 5-7 concise bullet points:\n\n{combined_summary}"
-            final_response = model.generate_content(final_prompt)
-
-            st.write("DEBUG: Final combined summary response:", final_response.text)
-
-            if final_response.text and final_response.text.strip():
-                return final_response.text.strip()
-            else:
-                return combined_summary
+class StreamlitLogHandler(logging.Handler):
+    """Show pipeline log records on the page when they are emitted by the script thread."""
 
+    def emit(self, record):
+        if jobs.current_job() is not None or get_script_run_ctx(suppress_warning=True) is None:
+            return
+        if record.levelno >= logging.ERROR:
+            st.error(record.getMessage())
         else:
-            # No chunking needed
-            prompt = f"Summarize the following text in 5-7 bullet points:\n\n{text}"
-            response = model.generate_content(prompt)
-            st.write("DEBUG: Single-chunk summary response:", response.text)
+            st.write(f"DEBUG: {record.getMessage()}")
 
-            if not response.text or not response.text.strip():
-                return "⚠ Could not generate summary."
-            return response.text.strip()
 
-    except Exception as e:
-        return f"Error generating summary: {str(e)}"
+# App.py is re-executed on every rerun; attach the handler only once per process
+if not any(getattr(handler, "streamlit_handler", False) for handler in pipeline.logger.handlers):
+    _handler = StreamlitLogHandler()
+    _handler.streamlit_handler = True
+    pipeline.logger.addHandler(_handler)
+pipeline.logger.setLevel(logging.DEBUG if DEBUG_OUTPUT else logging.WARNING)
 
-def create_mindmap_markdown(text):
-    """
-    Create a hierarchical markdown mindmap from the text using Gemini AI, with chunking if needed.
-    Debug prints are added to see the response for each chunk.
-    """
-    try:
-        model = genai.GenerativeModel('gemini-pro')
-        max_chunk_size = 50000  # Increased chunk size for large PDFs
-
-        if len(text) > max_chunk_size:
-            st.write("DEBUG: Splitting text into chunks for mindmap...")
-            # Split text into chunks
-            chunks = [text[i:i+max_chunk_size] for i in range(0, len(text), max_chunk_size)]
-            mindmaps = []
-
-            for idx, chunk in enumerate(chunks):
-                prompt = """
-                Create a hierarchical markdown mindmap from the following text.
-                Use proper markdown heading syntax (# for main topics, ## for subtopics, ### for details).
-                Focus on the main concepts and their relationships.
-                Include relevant details and connections between ideas.
-                Keep the structure clean and organized.
-                
-                Format the output exactly like this example:
-                # Main Topic
-                ## Subtopic 1
-                ### Detail 1
-                - Key point 1
-                - Key point 2
-                ### Detail 2
-                ## Subtopic 2
-                ### Detail 3
-                ### Detail 4
-                
-                Text to analyze: {text}
-                
-                Respond only with the markdown mindmap, no additional text.
-                """
-                response = model.generate_content(prompt.format(text=chunk))
-                st.write(f"DEBUG: Mindmap Chunk {idx+1} length={len(chunk)}")
-                st.write(f"DEBUG: Mindmap Chunk {idx+1} AI response:", response.text)
-
-                if response.text and response.text.strip():
-                    mindmaps.append(f"# Chunk {idx+1}\n" + response.text.strip())
-                else:
-                    mindmaps.append(f"# Chunk {idx+1}\n⚠ Could not generate mindmap for chunk {idx+1}.")
-
-            # Combine chunk mindmaps into a single markdown
-            combined_mindmap = "\n\n".join(mindmaps)
-            st.write("DEBUG: Final combined mindmap markdown:")
-            st.write(combined_mindmap)
-            return combined_mindmap
-
-        else:
-            # No chunking needed
-            prompt = """
-            Create a hierarchical markdown mindmap from the following text.
-            Use proper markdown heading syntax (# for main topics, ## for subtopics, ### for details).
-            Focus on the main concepts and their relationships.
-            Include relevant details and connections between ideas.
-            Keep the structure clean and organized.
-            
-            Format the output exactly like this example:
-            # Main Topic
-            ## Subtopic 1
-            ### Detail 1
-            - Key point 1
-            - Key point 2
-            ### Detail 2
-            ## Subtopic 2
-            ### Detail 3
-            ### Detail 4
-            
-            Text to analyze: {text}
-            
-            Respond only with the markdown mindmap, no additional text.
-            """
-            response = model.generate_content(prompt.format(text=text))
-            st.write("DEBUG: Single-chunk mindmap AI response:", response.text)
-
-            if not response.text or not response.text.strip():
-                st.error("Received empty response from Gemini AI for mindmap.")
-                return None
-            return response.text.strip()
-
-    except Exception as e:
-        st.error(f"Error generating mindmap: {str(e)}")
-        return None
 
 def create_markmap_html(markdown_content):
     """
@@ -235,11 +105,7 @@ def create_markmap_html(markdown_content):
                 height: 90%;
             }}
         </style>
-        <script src="https://cdn.jsdelivr.net/npm/d3@6"></script>
-        <script src="https://cdn.jsdelivr.net/npm/markmap-view"></script>
-        <script src="https://cdn.jsdelivr.net/npm/markmap-lib@0.14.3/dist/browser/index.min.js"></script>
-        <script src="https://cdnjs.cloudflare.com/ajax/libs/html2canvas/1.4.1/html2canvas.min.js"></script>
-        <script src="https://cdnjs.cloudflare.com/ajax/libs/jspdf/2.4.0/jspdf.umd.min.js"></script>
+        {markmap_assets.script_tags()}
     </head>
     <body>
         <div id="mindmap-container">
@@ -264,9 +130,12 @@ def create_markmap_html(markdown_content):
                         initialExpandLevel: 2,
                         duration: 500,
                     }});
-                    mm.setData(root);
-                    mm.fit();
+                    await Promise.resolve(mm.setData(root));
+                    await Promise.resolve(mm.fit());
+                    // Readiness signal for headless export: set once the fit transition has finished
+                    setTimeout(() => {{ window.markmapReady = true; }}, 550);
                 }} catch (error) {{
+                    window.markmapError = (error && error.message) || String(error);
                     console.error('Error rendering mindmap:', error);
                     document.body.innerHTML = '<p style="color: red;">Error rendering mindmap. Please check the console for details.</p>';
                 }}
@@ -294,30 +163,81 @@ def create_markmap_html(markdown_content):
     return html_content
 
 
-def save_mindmap_as_image(html_content):
-    options = Options()
-    options.headless = True
-    options.add_argument("--window-size=1920,1080")
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    driver.get("data:text/html;charset=utf-8," + html_content)
-    time.sleep(2)  # Add a delay to ensure the content is fully rendered
-    driver.save_screenshot("mindmap.png")
-    driver.quit()
-
-def save_mindmap_as_pdf(html_content):
-    pdf_file = "mindmap.pdf"
-    with open(pdf_file, "wb") as pdf:
-        pisa_status = pisa.CreatePDF(html_content, dest=pdf)
-    return pdf_file if not pisa_status.err else None
-
-def analyze_sentiment(text):
-    sentiment = TextBlob(text).sentiment.polarity
-    if sentiment > 0:
-        return "😊 Positive"
-    elif sentiment < 0:
-        return "😞 Negative"
+def save_mindmap_as_image(markdown_content):
+    """
+    Return the mindmap as PNG bytes. The native renderer needs no browser; set
+    MINDMAP_PNG_BACKEND=browser to screenshot the interactive view in headless Chrome
+    instead. If the browser export fails, the native renderer is used.
+    """
+    with telemetry.span("export", format="png", backend=MINDMAP_PNG_BACKEND) as span:
+        if MINDMAP_PNG_BACKEND == "browser":
+            with telemetry.span("html_build"):
+                html_content = create_markmap_html(markdown_content)
+            try:
+                return browser_pool.get_pool().capture_png(html_content)
+            except Exception as e:
+                browser_pool.logger.warning("Browser PNG export failed, using the native renderer: %s", e)
+                span.set(fallback="native")
+        return mindmap_render.render_png(markdown_content)
+
+
+def save_mindmap_as_pdf(markdown_content):
+    """Render the mindmap server-side as a vector PDF and return the bytes."""
+    with telemetry.span("export", format="pdf"):
+        return mindmap_render.render_pdf(markdown_content)
+
+
+def save_mindmap_as_svg(markdown_content):
+    """Render the mindmap server-side as an SVG document."""
+    with telemetry.span("export", format="svg"):
+        return mindmap_render.render_svg(markdown_content)
+
+
+# Seconds between progress panel refreshes while a background job runs
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '1'))
+
+
+def process_document_job(job, data, page_range, preprocess, pipeline_mode, streaming, token_budget, focus, document_id=None,
+                         sentiment=False, incremental=pipeline.INCREMENTAL):
+    """
+    Background job: extract, summarize and map one PDF with pipeline.process_document.
+    Streamed previews go to job.partial for the progress panel, and the mindmap SVG
+    and PDF are rendered here so the results page doesn't re-render them on every rerun.
+    document_id (the file name) is only used in incremental mode to find earlier versions.
+    """
+    def publish(key):
+        def update(partial):
+            job.partial[key] = partial
+        return update
+
+    if incremental and document_id:
+        # Unrelated uploads can share a file name; a revision usually keeps its first page
+        first_page = pdf_extract.extract_pages(data, pages=[0]).pages.get(0, "")
+        document_id = f"{document_id}#{versioning.fingerprint(first_page)}"
     else:
-        return "😐 Neutral"
+        document_id = None
+
+    on_draft = publish("draft")
+    on_summary = on_mindmap = None
+    if streaming:
+        on_summary = publish("summary")
+        on_mindmap = publish("mindmap")
+
+    result = pipeline.process_document(
+        data, page_range, preprocess, pipeline_mode, on_summary, on_mindmap, token_budget=token_budget, on_draft=on_draft,
+        focus=focus, document_id=document_id, sentiment=sentiment, incremental=incremental,
+    )
+    if result is None:
+        return None
+    job.check_cancelled()
+
+    job.add_total("render")
+    result["svg"] = save_mindmap_as_svg(result["markdown"]) if result["markdown"] else None
+    # Base64 keeps the result JSON-serializable for the job store
+    result["pdf"] = base64.b64encode(save_mindmap_as_pdf(result["markdown"])).decode("ascii") if result["markdown"] else None
+    job.advance("render")
+    return result
+
 
 def main():
     st.set_page_config(layout="wide")
@@ -344,103 +264,289 @@ def main():
     except FileNotFoundError:
         st.sidebar.warning("pic.jpg file not found. Please check the file path.")
     
-    if not configure_genai():
-        return
+    if configure_genai():
+        pipeline_mode = st.sidebar.selectbox(
+            "⚙️ LLM pipeline mode",
+            pipeline.PIPELINE_MODES,
+            index=pipeline.PIPELINE_MODES.index(pipeline.PIPELINE_MODE) if pipeline.PIPELINE_MODE in pipeline.PIPELINE_MODES else 0,
+            help="combined: one Gemini call per chunk for summary and mindmap; separate: two calls per chunk; "
+                 "offline: no Gemini calls, local summary and draft mindmap only.",
+        )
+    else:
+        pipeline_mode = "offline"
+    streaming = st.sidebar.checkbox(
+        "⚡ Stream results as they arrive",
+        value=STREAMING,
+        help="Show summary bullets and a mindmap preview while Gemini is still generating.",
+    )
+    token_budget = int(st.sidebar.number_input(
+        "✂️ Local pre-summary token budget",
+        min_value=0,
+        value=pipeline.EXTRACTIVE_TOKEN_BUDGET,
+        step=5000,
+        help="Longer documents are cut down to their most salient sentences, ranked locally, before "
+             "calling Gemini. 0 sends the full text.",
+    ))
+    incremental = st.sidebar.checkbox(
+        "♻️ Incremental reprocessing",
+        value=pipeline.INCREMENTAL,
+        help="Cut chunks at stable page boundaries, so re-uploading an edited document only sends the chunks "
+             "whose pages changed. Chunks are less evenly sized.",
+    )
 
     uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
-    
+    page_range = st.text_input("Pages to process (optional, e.g. 1-20, 35)", "")
+    focus = st.text_input(
+        "🎯 Focus topic (optional)",
+        "",
+        help="Only the passages that best match this topic are summarized and mapped, which takes a handful of "
+             "Gemini calls instead of one per chunk of the whole document.",
+    ).strip()
+    preprocess = st.checkbox("Preprocess text before generating mindmap")
+    sentiment = st.checkbox("📌 🧠Perform Sentiment Analysis😊")
+
+    manager = jobs.get_manager()
+    job = None
     if uploaded_file is not None:
-        with st.spinner("🚨Processing PDF and Generating Mindmap🧠...."):
-            text = extract_text_from_pdf(uploaded_file)
-            
-            if text:
-                st.info(f"Successfully extracted {len(text)} characters from PDF")
-                
-                if st.checkbox("Preprocess text before generating mindmap"):
-                    text = preprocess_text(text)
-                    st.write("DEBUG: Preprocessed text:", text)
-                
-                # Perform Sentiment Analysis
-                if st.checkbox("📌 🧠Perform Sentiment Analysis😊"):
-                    sentiment_result = analyze_sentiment(text)
-                    st.write(f"📊 Sentiment Analysis Result: {sentiment_result}")
-                
-                # Generate and display AI summary (with chunking if needed)
-                summary = generate_summary(text)
-                st.subheader("📌 AI-Generated Summary🧠")
-                st.write(summary)
-                
-                # Generate mindmap markdown (with chunking if needed)
-                markdown_content = create_mindmap_markdown(text)
-
-                st.write("DEBUG: Final Mindmap Markdown:")
-                st.write(markdown_content)
-
-                if markdown_content:
-                    tab1, tab2 = st.tabs(["📊 Mindmap🤷‍♂️", "📝 Markdown & Export🤷‍♂️"])
-                    
-                    with tab1:
-                        st.subheader("Interactive Mindmap")
-                        html_content = create_markmap_html(markdown_content)
-                        components.html(html_content, height=850, scrolling=True)
-                        
-                        # MindMap section
-                        st.subheader("📥 Download MindMap")
-                        if st.button("📥 Download Mindmap as PNG"):
-                            save_mindmap_as_image(html_content)
-                            with open("mindmap.png", "rb") as img_file:
-                                st.download_button("Download Image", img_file, "mindmap.png", "image/png")
-                        
-                        # Add button to download mindmap as PDF
-                        st.markdown("""
-                            <script src="https://cdnjs.cloudflare.com/ajax/libs/jspdf/2.4.0/jspdf.umd.min.js"></script>
-                            <script src="https://cdnjs.cloudflare.com/ajax/libs/html2canvas/0.5.0/html2canvas.min.js"></script>
-
-                            <button id="download-mindmap">Download Mindmap as PDF</button>
-
-                            <script>
-                                document.getElementById('download-mindmap').addEventListener('click', function() {
-                                    let mindmap = document.getElementById('mindmap-container');
-                                    html2canvas(mindmap).then(canvas => {
-                                        let imgData = canvas.toDataURL('image/png');
-                                        let { jsPDF } = window.jspdf;
-                                        let pdf = new jsPDF('p', 'mm', 'a4');
-                                        pdf.addImage(imgData, 'PNG', 10, 10, 180, 100);
-                                        pdf.save("mindmap.pdf");
-                                    });
-                                });
-                            </script>
-                        """, unsafe_allow_html=True)
-                    
-                    with tab2:
-                        st.subheader("Generated Markdown")
-                        st.text_area("Markdown Content", markdown_content, height=400)
-                        
-                        # Prepare data for export
-                        json_data = json.dumps({"mindmap": markdown_content}, indent=4)
-                        csv_data = pd.DataFrame([{"Markdown": markdown_content}]).to_csv(index=False)
-                        
-                        st.download_button("⬇ Download Markdown", markdown_content, "mindmap.md", "text/markdown")
-                        st.download_button("⬇ Download JSON", json_data, "mindmap.json", "application/json")
-                        st.download_button("⬇ Download CSV", csv_data, "mindmap.csv", "text/csv")
-                        
-                else:
-                    st.error("Could not generate mindmap content. Gemini AI might have returned an empty response.")
+        data = uploaded_file.getvalue()
+        # One job per document and processing options; reruns attach to the same job
+        job_id = llm_cache.make_key(
+            'job', pdf_extract.file_hash(data), page_range, preprocess, pipeline_mode, dedup.DEDUP_ENABLED, token_budget,
+            focus, sentiment, incremental, pipeline.MODEL_NAME,
+        )
+        job = manager.get(job_id)
+        if job is None:
+            job = manager.submit(job_id, uploaded_file.name, process_document_job, data, page_range, preprocess, pipeline_mode, streaming, token_budget, focus, uploaded_file.name, sentiment, incremental)
+        st.query_params["job"] = job.id
+    elif "job" in st.query_params:
+        # Reattach to the job this page was showing before a reload
+        job = manager.get(st.query_params["job"])
+
+    if job is not None:
+        if job.status in (jobs.QUEUED, jobs.RUNNING):
+            show_job_progress(job.id)
+        elif job.status == jobs.DONE:
+            show_results(job)
+        else:
+            if job.status == jobs.CANCELLED:
+                st.warning(f"Processing of {job.name} was cancelled.")
             else:
-                st.error("No text extracted from the PDF. It might be scanned or not text-based.")
+                st.error(f"Processing of {job.name} failed: {job.error.splitlines()[0] if job.error else 'unknown error'}")
+            if uploaded_file is not None and st.button("🔄 Restart"):
+                manager.submit(job.id, uploaded_file.name, process_document_job, data, page_range, preprocess, pipeline_mode, streaming, token_budget, focus, uploaded_file.name, sentiment, incremental)
+                st.rerun()
 
     st.write("---")
     st.write("### (Optional) 👨‍💻Test Mindmap Without PDF🤷‍♂️")
     test_text = st.text_area("Enter some sample text to create a mindmap:", "This is a sample text to test mindmap.")
     if st.button("Generate Mindmap from Text"):
-        st.write("DEBUG: Using test_text for mindmap.")
-        test_markdown = create_mindmap_markdown(test_text)
+        pipeline.logger.debug("Using test_text for mindmap.")
+        if pipeline_mode == "offline":
+            test_markdown = draft_mindmap.build({0: test_text})
+        else:
+            test_markdown = pipeline.create_mindmap_markdown(test_text)
         if test_markdown:
             st.write("Markdown Generated:", test_markdown)
-            html_content = create_markmap_html(test_markdown)
-            components.html(html_content, height=850, scrolling=True)
+            markmap_view.markmap_view(test_markdown, height=850, key="test_mindmap")
         else:
             st.error("Failed to generate mindmap from test text.")
 
+    show_cache_stats()
+    show_scheduler_stats()
+    show_performance()
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_job_progress(job_id):
+    """Poll a running job: a progress bar per stage, streamed previews and a cancel button."""
+    job = jobs.get_manager().get(job_id)
+    if job is None or job.status in jobs.FINISHED:
+        # Rerun the whole page so the results (or the failure) replace this panel
+        st.rerun()
+        return
+
+    st.subheader(f"🚨Processing {job.name} and Generating Mindmap🧠....")
+    stages = job.snapshot()
+    if not stages:
+        st.progress(0.0, text="Queued…" if job.status == jobs.QUEUED else "Starting…")
+    for stage, progress in stages.items():
+        total = max(progress["total"], 1)
+        st.progress(min(progress["done"] / total, 1.0), text=f"{stage.capitalize()}: {progress['done']}/{progress['total']}")
+
+    if st.button("⏹ Cancel"):
+        jobs.get_manager().cancel(job_id)
+        st.rerun()
+
+    partial_summary = job.partial.get("summary")
+    if partial_summary:
+        st.subheader("📌 AI-Generated Summary🧠")
+        st.markdown(partial_summary)
+    partial_markdown = job.partial.get("mindmap")
+    draft_markdown = job.partial.get("draft")
+    if partial_markdown and partial_markdown.strip():
+        st.image(mindmap_render.render_svg(partial_markdown), caption="Mindmap preview (streaming…)")
+    elif draft_markdown:
+        st.image(
+            mindmap_render.render_svg(draft_markdown),
+            caption="Draft mindmap from the PDF's outline and key phrases; Gemini's mindmap replaces it when ready.",
+        )
+
+
+def show_results(job):
+    """Show a finished job's summary, mindmap and export options."""
+    for level, message in job.messages:
+        (st.error if level == "error" else st.warning)(message)
+    result = job.result
+    if not result:
+        st.error("No text extracted from the PDF. It might be scanned or not text-based.")
+        return
+
+    st.info(f"Successfully extracted {result['characters']} characters from {result['pages']} of {result['num_pages']} PDF pages")
+    saved = result.get("dedup")
+    if saved and saved["characters_saved"]:
+        st.caption(
+            f"Skipped {saved['characters_saved']} characters ({saved['saved_fraction']:.0%}, ~{saved['tokens_saved']} tokens) "
+            f"of repeated headers, footers and duplicate paragraphs before calling Gemini."
+        )
+    focused = result.get("focus")
+    if focused:
+        pages = ", ".join(str(page) for page in focused["pages"][:20]) + ("…" if len(focused["pages"]) > 20 else "")
+        st.caption(f"Focused on “{focused['topic']}”: ~{focused['tokens']} tokens of the best-matching passages, from pages {pages}.")
+    revision = result.get("revision")
+    calls = result.get("calls")
+    if revision and revision["previous_file_hash"] not in (None, result["file_hash"]):
+        changed = revision["pages_changed"] + revision["pages_added"]
+        pages = ", ".join(str(page) for page in changed[:20]) + ("…" if len(changed) > 20 else "")
+        st.caption(
+            f"Version {revision['version']} of {job.name}: "
+            + (f"pages {pages} changed" if changed else "no pages changed")
+            + (f", {revision['pages_removed']} removed" if revision["pages_removed"] else "")
+            + " since the last upload."
+        )
+    if calls and calls["cached"]:
+        st.caption(f"{calls['cached']} of {calls['sent'] + calls['cached']} Gemini requests were answered from "
+                   f"earlier results for unchanged sections.")
+    used = result.get("memory")
+    if used and used["streaming"]:
+        ceiling = f" of the {used['limit_mb']:.0f} MB ceiling" if used["limit_mb"] else ""
+        st.caption(f"Large document: pages were streamed through {used['spilled_mb']:.1f} MB of temporary files, "
+                   f"keeping the job's memory at ~{used['peak_mb']:.1f} MB{ceiling}.")
+    condensed = result.get("condensed")
+    if condensed:
+        st.caption(
+            f"Condensed to its most salient sentences before calling Gemini: "
+            f"~{condensed['tokens_before']} → ~{condensed['tokens_after']} tokens."
+        )
+
+    if result.get("sentiment"):
+        st.write(f"📊 Sentiment Analysis Result: {result['sentiment']}")
+
+    st.subheader("📌 AI-Generated Summary🧠")
+    if result.get("mode") == "offline":
+        st.caption("Built offline: the summary is the document's key sentences and the mindmap comes from its "
+                   "outline and key phrases.")
+    st.write(result["summary"])
+
+    markdown_content = result["markdown"]
+    pipeline.logger.debug("Final Mindmap Markdown:\n%s", markdown_content)
+
+    if markdown_content:
+        tab1, tab2 = st.tabs(["📊 Mindmap🤷‍♂️", "📝 Markdown & Export🤷‍♂️"])
+        
+        with tab1:
+            st.subheader("Interactive Mindmap")
+            markmap_view.markmap_view(markdown_content, height=850)
+            
+            # MindMap section
+            st.subheader("📥 Download MindMap")
+            if MINDMAP_PNG_BACKEND == "browser":
+                # Start the export browsers in the background so the first PNG is fast
+                browser_pool.get_pool().warm_up_async()
+            if st.button("📥 Download Mindmap as PNG"):
+                try:
+                    png_bytes = save_mindmap_as_image(markdown_content)
+                    st.download_button("Download Image", png_bytes, "mindmap.png", "image/png")
+                except mindmap_render.MindmapTooLarge as e:
+                    st.warning(str(e))
+                except Exception as e:
+                    st.error(f"Error exporting mindmap image: {str(e)}")
+            
+            # Vector exports are rendered server-side, no browser needed
+            # Results stored before the job rendered the PDF and SVG don't carry them
+            pdf_data = base64.b64decode(result["pdf"]) if result.get("pdf") else save_mindmap_as_pdf(markdown_content)
+            svg_data = result.get("svg") or save_mindmap_as_svg(markdown_content)
+            st.download_button("⬇ Download Mindmap as PDF", pdf_data, "mindmap.pdf", "application/pdf")
+            st.download_button("⬇ Download Mindmap as SVG", svg_data, "mindmap.svg", "image/svg+xml")
+        
+        with tab2:
+            st.subheader("Generated Markdown")
+            st.text_area("Markdown Content", markdown_content, height=400)
+            
+            # Prepare data for export
+            json_data = json.dumps({"mindmap": markdown_content}, indent=4)
+            import pandas as pd
+            csv_data = pd.DataFrame([{"Markdown": markdown_content}]).to_csv(index=False)
+            
+            st.download_button("⬇ Download Markdown", markdown_content, "mindmap.md", "text/markdown")
+            st.download_button("⬇ Download JSON", json_data, "mindmap.json", "application/json")
+            st.download_button("⬇ Download CSV", csv_data, "mindmap.csv", "text/csv")
+            
+    else:
+        st.error("Could not generate mindmap content. Gemini AI might have returned an empty response.")
+
+
+def show_cache_stats():
+    """Show LLM cache hit/miss counters in the sidebar."""
+    cache = llm_cache.get_cache()
+    with st.sidebar.expander("🗄️ LLM Cache"):
+        stats = cache.stats()
+        st.write(f"Hits: {stats['hits']} | Misses: {stats['misses']} ({stats['hit_rate']:.0%} hit rate)")
+        st.write(f"Entries: {stats['entries']} ({stats['bytes'] / 1024:.1f} KB of {stats['max_bytes'] / (1024 * 1024):.0f} MB)")
+        if st.button("Clear LLM cache"):
+            cache.clear()
+            st.success("LLM cache cleared.")
+
+
+def show_scheduler_stats():
+    """Show the shared Gemini scheduler's queue and wait-time metrics in the sidebar."""
+    with st.sidebar.expander("🚦 Gemini Scheduler"):
+        stats = llm_scheduler.get_scheduler().stats()
+        st.write(f"Queued calls: {stats['queue_depth']} from {stats['waiting_sessions']} jobs | In flight: {stats['in_flight']}")
+        st.write(f"Wait avg {stats['wait_avg']:.2f}s | p95 {stats['wait_p95']:.2f}s | max {stats['wait_max']:.2f}s")
+        st.write(f"Calls: {stats['granted']} ({stats['throttled']} throttled, {stats['quota_errors']} quota errors)")
+        resilience = llm_resilience.stats()
+        st.write(f"Circuit breaker: {resilience['state']} ({resilience['recent_error_rate']:.0%} recent errors, "
+                 f"{resilience['rejected']} calls skipped)")
+        st.write(f"Retries: {resilience['retries']} | Hedged calls: {resilience['hedges']} ({resilience['hedge_wins']} won)")
+
+
+def show_performance():
+    """Collapsible per-stage timing table from the telemetry spans recorded by this server."""
+    with st.sidebar.expander("⏱️ Performance"):
+        rows = telemetry.summary()
+        stages = {row["stage"]: row for row in rows}
+        startup = []
+        if "app_cold_imports" in stages:
+            startup.append(f"cold imports {stages['app_cold_imports']['max_s']:.2f}s")
+        if "nlp_resource" in stages:
+            startup.append(f"NLP resources {stages['nlp_resource']['total_s']:.2f}s")
+        if "app_rerun" in stages:
+            startup.append(f"reruns avg {stages['app_rerun']['avg_s']:.2f}s")
+        if startup:
+            st.caption("Startup: " + " | ".join(startup))
+        if rows:
+            import pandas as pd
+            st.dataframe(pd.DataFrame(rows).set_index("stage"))
+        else:
+            st.write("No timings recorded yet.")
+        st.caption(f"Trace file: {telemetry.get_writer().path} (open in ui.perfetto.dev)")
+        if st.button("Reset timings"):
+            telemetry.reset()
+
+
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        # st.rerun() and st.stop() end the script with an exception; the run still counts
+        telemetry.record("app_rerun", time.perf_counter() - _script_started)
@@ -0,0 +1,259 @@
+"""Headless batch processing of PDFs into summaries and mindmaps.
+
+    python batch.py INPUT [--output DIR] [--workers N] [--llm-concurrency N]
+
+INPUT is a directory (searched recursively for *.pdf) or a manifest: a text
+file with one PDF path per line, or a .jsonl file of {"path", "id",
+"page_range", "focus"} objects. Relative manifest paths are resolved against
+the manifest's directory.
+
+Documents are spread across a spawn process pool; every worker shares one
+semaphore, so at most --llm-concurrency Gemini calls are in flight across the
+whole run, and the --rpm / --tpm quota is split evenly between the workers'
+llm_scheduler buckets. Each finished document is appended to
+DIR/results.jsonl (summary, mindmap markdown and the mindmap as a JSON tree)
+and then recorded in DIR/checkpoint.jsonl. Re-running the same command
+skips documents whose checkpoint says done, so an interrupted run resumes
+where it stopped. A crash between the two writes can leave a duplicate
+results line; the last record for an id wins. Stage timings are traced to
+DIR/traces/trace-<pid>.json (see telemetry.py).
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from dotenv import load_dotenv
+
+import dedup
+import llm_cache
+import llm_scheduler
+import memory
+import mindmap_tree
+import pdf_extract
+import pipeline
+import telemetry
+
+RESULTS_FILE = 'results.jsonl'
+CHECKPOINT_FILE = 'checkpoint.jsonl'
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', str(os.cpu_count() or 1)))
+BATCH_LLM_CONCURRENCY = int(os.getenv('BATCH_LLM_CONCURRENCY', '8'))
+
+
+def load_inputs(source, page_range=None, focus=None):
+    """Return the documents to process as {"id", "path", "page_range", "focus"} dicts."""
+    if os.path.isdir(source):
+        items = []
+        for directory, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith('.pdf'):
+                    path = os.path.join(directory, name)
+                    items.append({"id": os.path.relpath(path, source), "path": path})
+        items.sort(key=lambda item: item["id"])
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        items = []
+        with open(source, encoding='utf-8') as handle:
+            for line in handle:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                item = json.loads(line) if source.endswith('.jsonl') else {"path": line}
+                item["path"] = os.path.join(base, item["path"])
+                item.setdefault("id", os.path.relpath(item["path"], base))
+                items.append(item)
+    for item in items:
+        item.setdefault("page_range", page_range)
+        item.setdefault("focus", focus)
+    return items
+
+
+def checkpoint_key(item, preprocess, mode, token_budget=0, sentiment=False, incremental=False):
+    """Identify a document and the options it was processed with; changes to the file invalidate it."""
+    stat = os.stat(item["path"])
+    return llm_cache.make_key(
+        'batch', item["id"], stat.st_size, stat.st_mtime_ns, item["page_range"], preprocess, mode, dedup.DEDUP_ENABLED,
+        token_budget, item.get("focus"), sentiment, incremental, pipeline.MODEL_NAME,
+    )
+
+
+def read_checkpoint(path):
+    """Return {key: status} from a checkpoint file; later lines override earlier ones."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash
+                continue
+            done[entry["key"]] = entry["status"]
+    return done
+
+
+def _share(limit, workers):
+    """One worker's share of a per-minute quota; 0 (unlimited) stays unlimited."""
+    return max(1, limit // workers) if limit > 0 else 0
+
+
+def _init_worker(api_key, llm_slots, rpm, tpm, trace_dir, log_level):
+    logging.basicConfig(level=log_level, format="%(processName)s %(levelname)s %(message)s")
+    # One trace file per worker process, so concurrent writers never interleave
+    telemetry.configure(os.path.join(trace_dir, f"trace-{os.getpid()}.json"))
+    llm_scheduler.configure(rpm, tpm)
+    # Documents are already spread across processes; don't nest a page-extraction pool
+    pdf_extract.PDF_EXTRACT_WORKERS = 1
+    if api_key:
+        pipeline.configure(api_key)
+    pipeline.set_llm_limit(llm_slots)
+
+
+def process_item(item, preprocess, mode, token_budget=0, memory_limit_mb=memory.JOB_MEMORY_LIMIT_MB, sentiment=False,
+                 incremental=False):
+    """Worker entry point: run the pipeline on one document and return its output record."""
+    started = time.monotonic()
+    record = {"id": item["id"], "path": item["path"], "page_range": item["page_range"], "focus": item.get("focus"),
+              "mode": mode}
+    try:
+        result = pipeline.process_document(item["path"], item["page_range"], preprocess, mode,
+                                           token_budget=token_budget, focus=item.get("focus"),
+                                           document_id=item["id"] if incremental else None, memory_limit_mb=memory_limit_mb,
+                                           sentiment=sentiment, incremental=incremental)
+    except Exception as e:
+        record.update(status="failed", error=f"{type(e).__name__}: {e}")
+    else:
+        if result is None:
+            record.update(status="failed", error="No text could be extracted from the PDF.")
+        else:
+            record.update(result)
+            if result["markdown"]:
+                record["mindmap"] = mindmap_tree.to_dict(mindmap_tree.parse_markdown(result["markdown"]))
+            record["status"] = "done" if result["complete"] else "failed"
+    record["seconds"] = round(time.monotonic() - started, 3)
+    return record
+
+
+def _append(handle, entry):
+    handle.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    handle.flush()
+
+
+def run(items, output_dir, workers=BATCH_WORKERS, llm_concurrency=BATCH_LLM_CONCURRENCY,
+        preprocess=False, mode=pipeline.PIPELINE_MODE, retry_failed=True, api_key=None,
+        rpm=llm_scheduler.GEMINI_RPM, tpm=llm_scheduler.GEMINI_TPM, log_level=logging.WARNING,
+        token_budget=pipeline.EXTRACTIVE_TOKEN_BUDGET, memory_limit_mb=memory.JOB_MEMORY_LIMIT_MB, sentiment=False,
+        incremental=pipeline.INCREMENTAL):
+    """Process items across a process pool, skipping those already checkpointed. Returns status counts."""
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+    previous = read_checkpoint(checkpoint_path)
+    skip = ("done",) if retry_failed else ("done", "failed")
+
+    pending = []
+    counts = {"done": 0, "failed": 0, "skipped": 0}
+    for item in items:
+        try:
+            key = checkpoint_key(item, preprocess, mode, token_budget, sentiment, incremental)
+        except OSError as e:
+            print(f"Skipping {item['path']}: {e}", file=sys.stderr)
+            counts["failed"] += 1
+            continue
+        if previous.get(key) in skip:
+            counts["skipped"] += 1
+        else:
+            pending.append((key, item))
+    if not pending:
+        return counts
+
+    context = multiprocessing.get_context('spawn')
+    llm_slots = context.BoundedSemaphore(max(1, llm_concurrency))
+    workers = max(1, min(workers, len(pending)))
+    total = len(pending)
+    finished = 0
+    with open(os.path.join(output_dir, RESULTS_FILE), 'a', encoding='utf-8') as results, \
+            open(checkpoint_path, 'a', encoding='utf-8') as checkpoint, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                initargs=(api_key, llm_slots, _share(rpm, workers), _share(tpm, workers),
+                                          os.path.join(output_dir, 'traces'), log_level)) as executor:
+        queue = iter(pending)
+        in_flight = {}
+
+        def fill():
+            # Keep a bounded number of documents queued so huge corpora don't pile up futures
+            while len(in_flight) < 2 * workers:
+                try:
+                    key, item = next(queue)
+                except StopIteration:
+                    return
+                in_flight[executor.submit(
+                    process_item, item, preprocess, mode, token_budget, memory_limit_mb, sentiment, incremental
+                )] = key
+
+        fill()
+        while in_flight:
+            completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                key = in_flight.pop(future)
+                record = future.result()
+                _append(results, record)
+                _append(checkpoint, {"key": key, "id": record["id"], "status": record["status"]})
+                counts[record["status"]] += 1
+                finished += 1
+                detail = f": {record['error']}" if record.get("error") else ""
+                print(f"[{finished}/{total}] {record['status']} {record['id']} ({record['seconds']:.1f}s){detail}",
+                      file=sys.stderr)
+            fill()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize PDFs and build their mindmaps without the Streamlit UI.")
+    parser.add_argument("input", help="directory of PDFs, or a manifest (.txt with one path per line, or .jsonl)")
+    parser.add_argument("-o", "--output", default="batch_output", help="output directory (default: batch_output)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="documents processed in parallel")
+    parser.add_argument("--llm-concurrency", type=int, default=BATCH_LLM_CONCURRENCY,
+                        help="maximum Gemini calls in flight across all workers")
+    parser.add_argument("--rpm", type=int, default=llm_scheduler.GEMINI_RPM,
+                        help="Gemini requests per minute for the whole run (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=llm_scheduler.GEMINI_TPM,
+                        help="Gemini tokens per minute for the whole run (0 = unlimited)")
+    parser.add_argument("--mode", choices=pipeline.PIPELINE_MODES, default=pipeline.PIPELINE_MODE)
+    parser.add_argument("--pages", default=None, help="page range for documents without their own, e.g. 1-20")
+    parser.add_argument("--focus", default=None, help="focus topic for documents without their own")
+    parser.add_argument("--preprocess", action="store_true", help="remove stop words before calling Gemini")
+    parser.add_argument("--incremental", action="store_true", default=pipeline.INCREMENTAL,
+                        help="cut chunks at stable page boundaries so revised documents only resend changed chunks")
+    parser.add_argument("--sentiment", action="store_true", help="also analyze each document's sentiment")
+    parser.add_argument("--token-budget", type=int, default=pipeline.EXTRACTIVE_TOKEN_BUDGET,
+                        help="condense longer documents to their most salient sentences first (0 = off)")
+    parser.add_argument("--memory-limit-mb", type=int, default=memory.JOB_MEMORY_LIMIT_MB,
+                        help="memory ceiling per document; larger documents are streamed through temp files (0 = none)")
+    parser.add_argument("--no-retry-failed", dest="retry_failed", action="store_false",
+                        help="skip documents that failed in an earlier run")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log pipeline debug output")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    api_key = os.getenv('API_KEY')
+    if not api_key and args.mode != "offline":
+        parser.error("API_KEY is not set (environment or .env); use --mode offline to run without Gemini.")
+
+    items = load_inputs(args.input, args.pages, args.focus)
+    counts = run(
+        items, args.output, workers=args.workers, llm_concurrency=args.llm_concurrency, preprocess=args.preprocess,
+        mode=args.mode, retry_failed=args.retry_failed, api_key=api_key, rpm=args.rpm, tpm=args.tpm,
+        log_level=logging.DEBUG if args.verbose else logging.WARNING, token_budget=args.token_budget,
+        memory_limit_mb=args.memory_limit_mb, sentiment=args.sentiment, incremental=args.incremental,
+    )
+    print(f"{counts['done']} done, {counts['failed']} failed, {counts['skipped']} already done", file=sys.stderr)
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
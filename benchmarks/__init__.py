@@ -0,0 +1 @@
+"""Reproducible benchmarks for the summary and mindmap pipeline (see run_benchmarks.py)."""
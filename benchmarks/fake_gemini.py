@@ -0,0 +1,160 @@
+"""A local stand-in for google.generativeai.GenerativeModel.
+
+FakeGenerativeModel answers the pipeline's prompts with plausible output of
+a configurable size, after a latency drawn from a log-normal distribution,
+and fails a configurable fraction of calls with a transient API error. All
+randomness comes from a seeded generator, so runs are reproducible. Calls
+and token counts are tallied in FakeStats for the benchmark report.
+"""
+import hashlib
+import random
+import re
+import threading
+import time
+
+from google.api_core import exceptions as google_exceptions
+
+CHARS_PER_TOKEN = 4
+_WORD_RE = re.compile(r"[A-Za-z]{5,}")
+
+
+class FakeConfig:
+    """
+    latency_ms / latency_sigma: median and log-normal spread of each call's latency.
+    error_rate: fraction of calls that raise ServiceUnavailable.
+    output_tokens: approximate size of each response.
+    """
+
+    def __init__(self, latency_ms=50.0, latency_sigma=0.5, error_rate=0.0, output_tokens=300, seed=0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.output_tokens = output_tokens
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class FakeStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, input_tokens, output_tokens, error=False):
+        with self._lock:
+            self.calls += 1
+            self.errors += error
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+
+    def to_dict(self):
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors,
+                    "input_tokens": self.input_tokens, "output_tokens": self.output_tokens}
+
+
+class _UsageMetadata:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class FakeResponse:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+def _topics(prompt, count):
+    """Pick recurring words from the prompt so chunk mindmaps overlap like real ones do."""
+    words = _WORD_RE.findall(prompt[-4000:]) or ["Topic"]
+    ranked = sorted(set(words), key=lambda word: (-words.count(word), word))
+    return [word.capitalize() for word in ranked[:count]] or ["Topic"]
+
+
+def fake_output(prompt, output_tokens, rng):
+    """Build a response in the shape the prompt asks for (summary, mindmap or both)."""
+    budget = max(1, output_tokens * CHARS_PER_TOKEN)
+    topics = _topics(prompt, 8)
+    bullets = []
+    while sum(len(line) + 1 for line in bullets) < budget // 3:
+        bullets.append(f"- {rng.choice(topics)} relates to {rng.choice(topics).lower()} ({rng.randint(1, 99)})")
+    mindmap = [f"# {topics[0]}"]
+    while sum(len(line) + 1 for line in mindmap) < budget:
+        mindmap.append(f"## {rng.choice(topics)}")
+        mindmap.append(f"### {rng.choice(topics)} detail {rng.randint(1, 20)}")
+        mindmap.append(f"- {rng.choice(topics)} point {rng.randint(1, 50)}")
+    if "<summary>" in prompt:
+        return "<summary>\n" + "\n".join(bullets) + "\n</summary>\n<mindmap>\n" + "\n".join(mindmap) + "\n</mindmap>"
+    if "mindmap" in prompt.lower():
+        return "\n".join(mindmap)
+    return "\n".join(bullets)
+
+
+class FakeGenerativeModel:
+    """Drop-in for genai.GenerativeModel; configure via the class attributes or install()."""
+
+    config = FakeConfig()
+    stats = FakeStats()
+
+    _attempts = {}
+    _attempts_lock = threading.Lock()
+
+    def __init__(self, model_name=None, **kwargs):
+        self.model_name = model_name
+
+    def _rng(self, prompt):
+        # Seeded per prompt and attempt: runs are reproducible, yet a retry can succeed
+        key = hashlib.sha256(f"{self.config.seed}:{prompt}".encode("utf-8")).hexdigest()
+        with self._attempts_lock:
+            attempt = self._attempts[key] = self._attempts.get(key, 0) + 1
+        return random.Random(f"{key}:{attempt}")
+
+    def generate_content(self, prompt, stream=False, request_options=None, **kwargs):
+        rng = self._rng(prompt)
+        config = self.config
+        latency = config.latency_ms / 1000 * rng.lognormvariate(0, config.latency_sigma) if config.latency_ms > 0 else 0
+        input_tokens = len(prompt) // CHARS_PER_TOKEN
+        failing = rng.random() < config.error_rate
+        if not stream:
+            time.sleep(latency)
+            if failing:
+                self.stats.record(input_tokens, 0, error=True)
+                raise google_exceptions.ServiceUnavailable("fake Gemini: simulated overload")
+            text = fake_output(prompt, config.output_tokens, rng)
+            output_tokens = len(text) // CHARS_PER_TOKEN
+            self.stats.record(input_tokens, output_tokens)
+            return FakeResponse(text, _UsageMetadata(input_tokens, output_tokens))
+        return self._stream(prompt, rng, latency, failing, input_tokens)
+
+    def _stream(self, prompt, rng, latency, failing, input_tokens):
+        # Time to first part is half the latency; the rest is spread over the parts
+        time.sleep(latency / 2)
+        if failing:
+            self.stats.record(input_tokens, 0, error=True)
+            raise google_exceptions.ServiceUnavailable("fake Gemini: simulated overload")
+        text = fake_output(prompt, self.config.output_tokens, rng)
+        lines = text.splitlines(keepends=True)
+        parts = [''.join(lines[i:i + 4]) for i in range(0, len(lines), 4)]
+        output_tokens = len(text) // CHARS_PER_TOKEN
+        for number, part in enumerate(parts):
+            time.sleep(latency / 2 / len(parts))
+            last = number == len(parts) - 1
+            yield FakeResponse(part, _UsageMetadata(input_tokens, output_tokens) if last else None)
+        self.stats.record(input_tokens, output_tokens)
+
+
+def install(genai_module, config=None):
+    """Replace genai_module.GenerativeModel with the fake; returns the shared FakeStats."""
+    if config is not None:
+        FakeGenerativeModel.config = config
+    FakeGenerativeModel.stats = FakeStats()
+    FakeGenerativeModel._attempts = {}
+    genai_module.GenerativeModel = FakeGenerativeModel
+    genai_module.configure = lambda **kwargs: None
+    return FakeGenerativeModel.stats
@@ -0,0 +1,204 @@
+"""End-to-end pipeline benchmarks against a local fake Gemini model.
+
+    python -m benchmarks.run_benchmarks [--sizes 5,50,500] [--modes combined,separate]
+                                        [--baseline REPORT.json] [--tolerance 0.2]
+
+Each scenario (one synthetic PDF size x one pipeline mode) runs in a fresh
+spawn process with its own empty LLM, page and telemetry caches, and the
+Gemini client replaced by benchmarks.fake_gemini. The document is processed
+twice: a cold pass (nothing cached) and a warm pass (the re-upload case).
+For every pass the report records wall time, peak memory, fake-model calls
+and tokens, and the per-stage timings from telemetry.summary().
+
+The JSON report is written to --output. With --baseline, the wall time,
+peak memory, calls and tokens of each pass are compared against an earlier
+report, and the exit status is 1 if any grew by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from benchmarks import fake_gemini, synthetic_pdf
+
+DEFAULT_SIZES = (5, 50, 500)
+DEFAULT_MODES = ("combined", "separate")
+BENCHMARK_DIR = os.path.join('.mindgraphx_cache', 'benchmarks')
+# Metrics compared against a baseline, with the absolute slack below which changes are noise
+COMPARED_METRICS = {"wall_s": 0.05, "peak_rss_mb": 5.0, "calls": 0, "input_tokens": 0, "output_tokens": 0}
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process and its (page extraction) children, in MB."""
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024  # ru_maxrss is bytes on macOS, KB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / scale, 1)
+
+
+def _run_scenario(pdf_path, mode, fake_config, rpm, tpm, trace_python_memory, token_budget):
+    """Child process entry point: process pdf_path cold, then warm; return the per-pass metrics."""
+    workdir = tempfile.mkdtemp(prefix="mindgraphx-bench-")
+    # The caches are configured from the environment at import time, so set them first
+    os.environ['LLM_CACHE_PATH'] = os.path.join(workdir, 'llm_cache.sqlite3')
+    os.environ['PAGE_CACHE_PATH'] = os.path.join(workdir, 'page_cache.sqlite3')
+    os.environ['TELEMETRY_PATH'] = os.path.join(workdir, 'trace.json')
+
+    import google.generativeai as genai
+    stats = fake_gemini.install(genai, fake_gemini.FakeConfig(**fake_config))
+    import llm_scheduler
+    import pipeline
+    import telemetry
+
+    llm_scheduler.configure(rpm, tpm)
+    pipeline.configure("benchmark")
+    with open(pdf_path, 'rb') as handle:
+        data = handle.read()
+
+    passes = {}
+    for name in ("cold", "warm"):
+        telemetry.reset()
+        before = stats.to_dict()
+        if trace_python_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        result = pipeline.process_document(data, mode=mode, token_budget=token_budget)
+        wall = time.perf_counter() - started
+        metrics = {"wall_s": round(wall, 3), "peak_rss_mb": _peak_rss_mb()}
+        if trace_python_memory:
+            metrics["python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            tracemalloc.stop()
+        after = stats.to_dict()
+        metrics.update({key: after[key] - before[key] for key in after})
+        metrics.update(
+            complete=bool(result and result["complete"]),
+            summary_chars=len(result["summary"] or "") if result else 0,
+            markdown_chars=len(result["markdown"] or "") if result else 0,
+            stages=telemetry.summary(),
+        )
+        passes[name] = metrics
+    return {"characters": result["characters"] if result else 0, "passes": passes}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes=DEFAULT_SIZES, modes=DEFAULT_MODES, fake_config=None, rpm=0, tpm=0, seed=0,
+        corpus_dir=os.path.join(BENCHMARK_DIR, 'corpus'), trace_python_memory=False, token_budget=0):
+    """Run every size x mode scenario and return the report dict."""
+    fake_config = fake_config or fake_gemini.FakeConfig(seed=seed)
+    corpus = synthetic_pdf.write_corpus(corpus_dir, sizes, seed)
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "fake_model": fake_config.to_dict(),
+            "rpm": rpm,
+            "tpm": tpm,
+            "seed": seed,
+            "token_budget": token_budget,
+        },
+        "scenarios": {},
+    }
+    context = multiprocessing.get_context('spawn')
+    for pages in sizes:
+        for mode in modes:
+            name = f"{mode}-{pages}p"
+            print(f"Running {name} ...", file=sys.stderr)
+            # A fresh process per scenario keeps peak memory and caches independent
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                scenario = executor.submit(
+                    _run_scenario, corpus[pages], mode, fake_config.to_dict(), rpm, tpm, trace_python_memory, token_budget
+                ).result()
+            scenario.update(pages=pages, mode=mode)
+            report["scenarios"][name] = scenario
+            cold, warm = scenario["passes"]["cold"], scenario["passes"]["warm"]
+            print(f"  cold {cold['wall_s']:.2f}s {cold['calls']} calls {cold['peak_rss_mb']} MB; "
+                  f"warm {warm['wall_s']:.2f}s {warm['calls']} calls", file=sys.stderr)
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Return a list of regression messages for metrics that grew past tolerance since baseline."""
+    regressions = []
+    for name, scenario in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        for pass_name, metrics in scenario["passes"].items():
+            old_metrics = previous["passes"].get(pass_name, {})
+            for metric, slack in COMPARED_METRICS.items():
+                old, new = old_metrics.get(metric), metrics.get(metric)
+                if old is None or new is None:
+                    continue
+                if new > old * (1 + tolerance) + slack:
+                    change = f"+{(new - old) / old:.0%}" if old else "new"
+                    regressions.append(f"{name} {pass_name} {metric}: {old} -> {new} ({change})")
+    return regressions
+
+
+def _sizes(value):
+    return tuple(int(size) for size in value.split(',') if size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline end to end against a fake Gemini model.")
+    parser.add_argument("--sizes", type=_sizes, default=DEFAULT_SIZES,
+                        help="comma-separated PDF page counts (default: 5,50,500; try 2000 for a stress run)")
+    parser.add_argument("--modes", default=",".join(DEFAULT_MODES), help="comma-separated pipeline modes")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="median fake call latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake calls that fail transiently")
+    parser.add_argument("--output-tokens", type=int, default=300, help="approximate tokens per fake response")
+    parser.add_argument("--rpm", type=int, default=0, help="scheduler requests per minute (default: unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="scheduler tokens per minute (default: unlimited)")
+    parser.add_argument("--token-budget", type=int, default=0,
+                        help="condense documents to this many tokens locally first (default: off)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tracemalloc", action="store_true", help="also record the Python heap peak (slower)")
+    parser.add_argument("-o", "--output", default=None,
+                        help=f"report path (default: {BENCHMARK_DIR}/report-<timestamp>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative growth per metric")
+    args = parser.parse_args(argv)
+
+    modes = tuple(mode for mode in args.modes.split(',') if mode)
+    config = fake_gemini.FakeConfig(args.latency_ms, args.latency_sigma, args.error_rate, args.output_tokens, args.seed)
+    report = run(args.sizes, modes, config, args.rpm, args.tpm, args.seed, trace_python_memory=args.tracemalloc,
+                 token_budget=args.token_budget)
+
+    output = args.output or os.path.join(BENCHMARK_DIR, time.strftime("report-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Report written to {output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as handle:
+            regressions = compare(report, json.load(handle), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("No regressions against the baseline.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
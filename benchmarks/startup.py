@@ -0,0 +1,88 @@
+"""Cold-start report: how long a fresh server process takes to import the app.
+
+    python -m benchmarks.startup [--runs N] [--module App] [--top 15] [-o report.json]
+
+Each run imports the module in a new interpreter with -X importtime, so
+nothing is shared between runs. The report has the median wall time and
+the slowest top-level imports with their cumulative time (including the
+modules they pulled in). A second import of a module that is already
+loaded costs nothing, so only the cold import matters on a Streamlit
+rerun; the app shows its own cold and rerun timings in the Performance
+panel (see the "app_imports" and "app_script" spans).
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+# "import time: self [us] | cumulative | imported package"
+_IMPORT_TIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _import_once(module):
+    """Import module in a fresh interpreter; returns (wall seconds, {module it imports: cumulative seconds})."""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    wall = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    imports = {}
+    children = {}
+    for match in _IMPORT_TIME_RE.finditer(completed.stderr):
+        _, cumulative, indent, name = match.groups()
+        seconds = int(cumulative) / 1e6
+        # A module is listed after the imports it made, which are indented two spaces further
+        if len(indent) == 3:
+            children[name] = children.get(name, 0.0) + seconds
+        elif len(indent) == 1:
+            if name == module:
+                imports = dict(children, **{name: seconds})
+            children = {}
+    return wall, imports
+
+
+def run(module="App", runs=3, top=15):
+    walls = []
+    samples = {}
+    for _ in range(runs):
+        wall, imports = _import_once(module)
+        walls.append(wall)
+        for name, seconds in imports.items():
+            samples.setdefault(name, []).append(seconds)
+    slowest = sorted(((statistics.median(values), name) for name, values in samples.items()), reverse=True)
+    return {
+        "module": module,
+        "runs": runs,
+        "python": sys.version.split()[0],
+        "wall_s": round(statistics.median(walls), 3),
+        "imports": [{"module": name, "cumulative_s": round(seconds, 3)} for seconds, name in slowest[:top]],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the cold import time of the app in fresh interpreters.")
+    parser.add_argument("--module", default="App", help="module to import (default: App)")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters to time; the median is reported")
+    parser.add_argument("--top", type=int, default=15, help="slowest top-level imports to list")
+    parser.add_argument("-o", "--output", default=None, help="also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = run(args.module, args.runs, args.top)
+    print(f"import {report['module']}: {report['wall_s']:.3f}s wall (median of {report['runs']} fresh interpreters)")
+    for row in report["imports"]:
+        print(f"  {row['cumulative_s']:8.3f}s  {row['module']}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
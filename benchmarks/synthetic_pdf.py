@@ -0,0 +1,107 @@
+"""Deterministic multi-page text PDFs for benchmarking.
+
+make_pdf(pages, seed) writes a document of numbered sections with a heading
+and a few paragraphs per page, drawn from a fixed vocabulary so chunking,
+caching and the fake model behave the same on every run. Like a corporate
+manual, every page has a running header and a page-number footer, and every
+tenth page repeats a disclaimer, so the dedup stage has work to do. The writer is
+self-contained (uncompressed Helvetica text, like mindmap_render.render_pdf),
+so thousands of pages take well under a second to generate.
+"""
+import os
+import random
+
+from mindmap_render import _pdf_text
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+MARGIN = 56
+FONT_SIZE = 10
+LINE_HEIGHT = 13
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LINE_HEIGHT
+CHARS_PER_LINE = 95
+
+VOCABULARY = (
+    "analysis architecture benchmark cache capacity cluster compiler concurrency consistency "
+    "database deadline dependency deployment distributed encoding experiment gradient hardware "
+    "indexing inference interface kernel latency learning memory network optimization parallel "
+    "pipeline protocol quality queue recovery regression replication research retrieval scheduler "
+    "security semantics storage streaming summary throughput training transaction validation workload"
+).split()
+
+
+HEADER = "MindGraphX Benchmark Corpus - Internal Use Only"
+DISCLAIMER = (
+    "This document is provided for benchmarking purposes only. Its contents are generated and do not "
+    "describe any real system, product or organisation, and must not be relied upon for any decision."
+)
+
+
+def _sentence(rng):
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(8, 18))]
+    return " ".join(words).capitalize() + "."
+
+
+def _page_lines(rng, number, pages):
+    lines = [HEADER, f"Section {number}: {rng.choice(VOCABULARY).capitalize()} and {rng.choice(VOCABULARY)}", ""]
+    body_lines = LINES_PER_PAGE - 2
+    paragraphs = [DISCLAIMER] if number % 10 == 0 else []
+    while len(lines) < body_lines:
+        paragraph = paragraphs.pop() if paragraphs else " ".join(_sentence(rng) for _ in range(rng.randint(3, 6)))
+        while paragraph and len(lines) < body_lines:
+            cut = paragraph.rfind(" ", 0, CHARS_PER_LINE) if len(paragraph) > CHARS_PER_LINE else len(paragraph)
+            lines.append(paragraph[:cut])
+            paragraph = paragraph[cut:].lstrip()
+        if len(lines) < body_lines:
+            lines.append("")
+    lines.extend(["", f"Page {number} of {pages}"])
+    return lines
+
+
+def make_pdf(pages, seed=0):
+    """Return the bytes of a pages-long text PDF; the same (pages, seed) always gives the same bytes."""
+    rng = random.Random(seed)
+    # Objects: 1 catalog, 2 page tree, 3 font, then a (page, contents) pair per page
+    objects = {
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    }
+    kids = []
+    for number in range(pages):
+        page_id, contents_id = 4 + 2 * number, 5 + 2 * number
+        kids.append(b"%d 0 R" % page_id)
+        text = [b"BT /F1 %d Tf %d TL %d %d Td" % (FONT_SIZE, LINE_HEIGHT, MARGIN, PAGE_HEIGHT - MARGIN)]
+        text.extend(b"(%s) '" % _pdf_text(line) for line in _page_lines(rng, number + 1, pages))
+        text.append(b"ET")
+        stream = b"\n".join(text)
+        objects[page_id] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (PAGE_WIDTH, PAGE_HEIGHT, contents_id)
+        )
+        objects[contents_id] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[2] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % pages
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number in range(1, len(objects) + 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + objects[number] + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(output)
+
+
+def write_corpus(directory, sizes, seed=0):
+    """Write one PDF per page count in sizes (e.g. pages-0050.pdf) and return {pages: path}."""
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for pages in sizes:
+        path = os.path.join(directory, f"pages-{pages:04d}.pdf")
+        if not os.path.exists(path):
+            data = make_pdf(pages, seed + pages)
+            with open(path + ".tmp", "wb") as handle:
+                handle.write(data)
+            os.replace(path + ".tmp", path)
+        paths[pages] = path
+    return paths
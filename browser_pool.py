@@ -0,0 +1,187 @@
+"""Pool of warm headless Chrome instances for mindmap PNG export.
+
+Launching Chrome (and resolving chromedriver) costs seconds, so a small pool
+of browsers is started once per server process and reused by every session.
+Each capture loads the page from its own temporary file, waits for the
+readiness flag set by the Markmap page instead of sleeping, and returns the
+PNG bytes in memory, so concurrent exports never share a file. A page that
+failed to render raises RuntimeError and a pool that stays busy for
+CAPTURE_TIMEOUT raises TimeoutError, so the caller can fall back to the
+native renderer instead of returning a screenshot of an error. selenium and
+webdriver_manager are imported when the first browser is launched, so
+servers that never export PNGs through Chrome don't pay for them.
+"""
+import atexit
+import logging
+import os
+import queue
+import tempfile
+import threading
+
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', '2'))
+# Browsers are restarted after this many captures to bound memory growth
+BROWSER_MAX_USES = int(os.getenv('BROWSER_MAX_USES', '50'))
+CAPTURE_TIMEOUT = float(os.getenv('BROWSER_CAPTURE_TIMEOUT', '20'))
+
+# JavaScript condition the Markmap page satisfies once it has rendered (or failed);
+# on failure window.markmapError holds the error message
+READY_CONDITION = "return window.markmapReady === true || !!window.markmapError"
+ERROR_MESSAGE = "return window.markmapError ? String(window.markmapError) : null"
+
+logger = logging.getLogger("browser_pool")
+
+
+class BrowserPool:
+    """A fixed-size pool of headless Chrome drivers shared across sessions."""
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_uses=BROWSER_MAX_USES):
+        self.size = size
+        self.max_uses = max_uses
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = 0
+        self._driver_path = None
+        self._closed = False
+
+    def _launch(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        options = Options()
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1920,1080")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument("--allow-file-access-from-files")
+        with self._lock:
+            if self._driver_path is None:
+                self._driver_path = ChromeDriverManager().install()
+        driver = webdriver.Chrome(service=Service(self._driver_path), options=options)
+        driver.set_page_load_timeout(CAPTURE_TIMEOUT)
+        return [driver, 0]
+
+    def warm_up(self):
+        """Start browsers until the pool is full. Safe to call repeatedly."""
+        while True:
+            with self._lock:
+                if self._closed or self._started >= self.size:
+                    return
+                self._started += 1
+            try:
+                self._idle.put(self._launch())
+            except Exception:
+                with self._lock:
+                    self._started -= 1
+                raise
+
+    def warm_up_async(self):
+        """Warm the pool on a background thread so the first export is fast."""
+        with self._lock:
+            if self._closed or self._started >= self.size:
+                return
+        threading.Thread(target=self._warm_quietly, name="browser-pool-warm-up", daemon=True).start()
+
+    def _warm_quietly(self):
+        try:
+            self.warm_up()
+        except Exception:
+            # The export path launches (and reports) on demand if warming fails
+            pass
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_start = self._started < self.size
+            if can_start:
+                self._started += 1
+        if can_start:
+            try:
+                return self._launch()
+            except Exception:
+                with self._lock:
+                    self._started -= 1
+                raise
+        try:
+            return self._idle.get(timeout=CAPTURE_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError(
+                f"No export browser became free within {CAPTURE_TIMEOUT:g}s (all {self.size} busy)"
+            ) from None
+
+    def _release(self, entry, healthy):
+        driver, uses = entry
+        if healthy and not self._closed and uses < self.max_uses:
+            self._idle.put(entry)
+            return
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self._lock:
+            self._started -= 1
+
+    def capture_png(self, html_content, selector="#mindmap-container"):
+        """Render html_content in a pooled browser and return a PNG of selector as bytes."""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        fd, path = tempfile.mkstemp(suffix=".html")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(html_content)
+        entry = None
+        healthy = False
+        try:
+            entry = self._acquire()
+            driver = entry[0]
+            entry[1] += 1
+            driver.get("file://" + path)
+            WebDriverWait(driver, CAPTURE_TIMEOUT, poll_frequency=0.05).until(
+                lambda d: d.execute_script(READY_CONDITION)
+            )
+            error = driver.execute_script(ERROR_MESSAGE)
+            if error:
+                # The browser itself is fine; only this page failed
+                driver.get("about:blank")
+                healthy = True
+                raise RuntimeError(f"Markmap failed to render the mindmap: {error}")
+            elements = driver.find_elements(By.CSS_SELECTOR, selector)
+            png = elements[0].screenshot_as_png if elements else driver.get_screenshot_as_png()
+            driver.get("about:blank")
+            healthy = True
+            return png
+        finally:
+            if entry is not None:
+                self._release(entry, healthy)
+            os.remove(path)
+
+    def close(self):
+        """Quit every idle browser; busy ones are quit when released."""
+        self._closed = True
+        while True:
+            try:
+                driver, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide browser pool shared by every Streamlit session."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.close)
+        return _pool
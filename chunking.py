@@ -0,0 +1,317 @@
+"""Token-aware, boundary-respecting text chunker for Gemini requests.
+
+Text is first cut into segments at the strongest available boundary (page,
+heading, paragraph, line, sentence, word) so that no segment exceeds the token
+budget. Segments are then packed into chunks of roughly equal size, cutting
+at the strongest boundary near the end of each chunk. Balancing the chunk
+sizes avoids the tiny trailing fragment that fixed-width slicing produces.
+
+chunk_pages trades that balance and the overlap for stability: whole pages
+are grouped and a chunk ends where a page's own content says so, so editing
+one page of a long document changes one or two chunks instead of moving every
+later boundary. Unchanged chunks then hit the pipeline's per-chunk response
+cache. The pipeline only uses it for incremental reprocessing.
+"""
+import hashlib
+import math
+import os
+import re
+
+# Separator placed between PDF pages so the chunker can prefer page breaks
+PAGE_BREAK = "\n\f"
+
+# Rough Gemini tokenizer ratio for English prose
+CHARS_PER_TOKEN = 4
+
+# Input token limits of the models the app can be pointed at
+MODEL_INPUT_TOKEN_LIMITS = {
+    'gemini-pro': 30720,
+    'gemini-1.0-pro': 30720,
+    'gemini-1.5-flash': 1048576,
+    'gemini-1.5-pro': 2097152,
+}
+DEFAULT_INPUT_TOKEN_LIMIT = 30720
+
+# Tokens kept free for the prompt template wrapped around each chunk
+PROMPT_RESERVE_TOKENS = 1024
+# Headroom for the difference between the estimate and the real tokenizer
+SAFETY_MARGIN = 0.9
+
+CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', '0'))  # 0 = derive from the model limit
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '200'))
+
+# A chunk is only cut early at a strong boundary if it is at least this full
+MIN_FILL = 0.8
+# chunk_pages ends a chunk after a page whose content hash is divisible by this,
+# once the chunk is at least STABLE_MIN_FILL full
+STABLE_CUT_DIVISOR = 3
+STABLE_MIN_FILL = 0.75
+
+# Boundary patterns from strongest to weakest; a segment starts at each match end
+_BOUNDARIES = [
+    re.compile(r"\f"),
+    re.compile(r"\n(?=[ \t]*(?:#{1,6}\s|\d+(?:\.\d+)*\.?[ \t]+[A-Z]|[A-Z][A-Z0-9 ,&:'-]{3,60}\n))"),
+    re.compile(r"\n[ \t]*\n"),
+    re.compile(r"\n"),
+    re.compile(r"(?<=[.!?])\s+"),
+    re.compile(r"\s+"),
+]
+_HARD_CUT = len(_BOUNDARIES)
+
+
+def estimate_tokens(text):
+    """Estimate the number of model tokens in text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def max_chunk_tokens(model_name):
+    """Return the per-chunk token budget for model_name, honouring CHUNK_MAX_TOKENS."""
+    if CHUNK_MAX_TOKENS > 0:
+        return CHUNK_MAX_TOKENS
+    limit = MODEL_INPUT_TOKEN_LIMITS.get(model_name, DEFAULT_INPUT_TOKEN_LIMIT)
+    return int((limit - PROMPT_RESERVE_TOKENS) * SAFETY_MARGIN)
+
+
+def _split(text, pattern):
+    """Split text after every boundary match; the pieces concatenate back to text."""
+    pieces = []
+    start = 0
+    for match in pattern.finditer(text):
+        end = match.end()
+        if end > start:
+            pieces.append(text[start:end])
+            start = end
+    if start < len(text):
+        pieces.append(text[start:])
+    return pieces
+
+
+def _segments(text, max_tokens, level=0, strength=0):
+    """
+    Yield (segment, strength) pairs no larger than max_tokens.
+    strength is the strength of the boundary in front of the segment (higher is stronger).
+    """
+    if estimate_tokens(text) <= max_tokens:
+        yield text, strength
+        return
+    if level >= _HARD_CUT:
+        width = max_tokens * CHARS_PER_TOKEN
+        for i in range(0, len(text), width):
+            yield text[i:i + width], strength if i == 0 else 0
+        return
+    pieces = _split(text, _BOUNDARIES[level])
+    if len(pieces) == 1:
+        yield from _segments(text, max_tokens, level + 1, strength)
+        return
+    boundary_strength = _HARD_CUT - level
+    for i, piece in enumerate(pieces):
+        yield from _segments(piece, max_tokens, level + 1, strength if i == 0 else boundary_strength)
+
+
+def _pack(segments, budget):
+    """Greedily pack segments into chunks of at most budget tokens, cutting at strong boundaries."""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for segment, strength, tokens in segments:
+        if current and current_tokens + tokens > budget:
+            cut = _best_cut(current, budget, strength)
+            chunks.append(current[:cut])
+            current = current[cut:]
+            current_tokens = sum(item[2] for item in current)
+            if current and current_tokens + tokens > budget:
+                chunks.append(current)
+                current = []
+                current_tokens = 0
+        current.append((segment, strength, tokens))
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _best_cut(current, budget, next_strength):
+    """
+    Pick where to end the chunk: the strongest boundary that still leaves it MIN_FILL
+    full, the latest one on a tie. next_strength is the boundary after current.
+    """
+    best, best_strength = len(current), -1
+    prefix = 0
+    for i, (_, _, tokens) in enumerate(current):
+        prefix += tokens
+        cut = i + 1
+        if prefix < MIN_FILL * budget:
+            continue
+        strength = current[cut][1] if cut < len(current) else next_strength
+        if strength >= best_strength:
+            best, best_strength = cut, strength
+    if best_strength <= 0:
+        return len(current)
+    return best
+
+
+def _balanced_limit(count, total, budget):
+    """
+    Per-chunk token limit that splits total tokens into even chunks, where
+    count(limit) is how many chunks packing at limit makes. Starting from an even
+    split over the chunks packing at the full budget needs, the limit grows in 2%
+    steps until it needs no more chunks than that, so the last chunk isn't a
+    fragment that costs a full round trip.
+    """
+    packed = count(budget)
+    if not packed:
+        return budget
+    limit = math.ceil(total / packed)
+    while limit < budget and count(limit) > packed:
+        limit = min(budget, math.ceil(limit * 1.02))
+    return limit
+
+
+def _tail(text, tokens):
+    """Return roughly the last `tokens` tokens of text, starting on a word boundary."""
+    width = tokens * CHARS_PER_TOKEN
+    if width <= 0:
+        return ""
+    if len(text) <= width:
+        return text
+    tail = text[-width:]
+    space = tail.find(" ")
+    return tail[space + 1:] if 0 <= space < len(tail) - 1 else tail
+
+
+def chunk_text(text, max_tokens, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Split text (a string, or a list of page strings) into chunks of at most max_tokens
+    estimated tokens. Consecutive chunks share about overlap_tokens of context.
+    """
+    if not isinstance(text, str):
+        text = PAGE_BREAK.join(text)
+    if not text:
+        return []
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    overlap_tokens = min(overlap_tokens, max_tokens // 4)
+    budget = max_tokens - overlap_tokens
+    segments = [
+        (segment, strength, estimate_tokens(segment))
+        for segment, strength in _segments(text, budget)
+    ]
+
+    total = sum(tokens for _, _, tokens in segments)
+    limit = _balanced_limit(lambda limit: len(_pack(segments, limit)), total, budget)
+    packed = _pack(segments, limit)
+
+    chunks = ["".join(segment for segment, _, _ in chunk) for chunk in packed]
+    if overlap_tokens > 0:
+        chunks = [chunks[0]] + [
+            _tail(previous, overlap_tokens) + chunk for previous, chunk in zip(chunks, chunks[1:])
+        ]
+    return chunks
+
+
+def _is_stable_cut(page):
+    digest = hashlib.blake2b(page.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % STABLE_CUT_DIVISOR == 0
+
+
+def chunk_pages(text, max_tokens, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Split text (pages joined by PAGE_BREAK) into chunks of whole pages with
+    content-defined boundaries. A chunk ends after a page whose hash marks a
+    cut once the chunk is STABLE_MIN_FILL full, or before a page that would not
+    fit, so a chunk's boundaries depend only on the pages near it. A page larger
+    than max_tokens is split with chunk_text on its own. Chunks don't overlap,
+    which would carry an edit into the next chunk.
+    """
+    if not text:
+        return []
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    return list(iter_page_chunks(text.split(PAGE_BREAK), max_tokens, overlap_tokens))
+
+
+def iter_page_chunks(pages, max_tokens, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Yield chunk_pages' chunks of an iterable of page texts, holding one chunk at a time."""
+    current = []
+    used = 0
+    for page in pages:
+        tokens = estimate_tokens(page + PAGE_BREAK)
+        if current and used + tokens > max_tokens:
+            yield PAGE_BREAK.join(current)
+            current, used = [], 0
+        if tokens > max_tokens:
+            yield from chunk_text(page, max_tokens, overlap_tokens)
+            continue
+        current.append(page)
+        used += tokens
+        if used >= STABLE_MIN_FILL * max_tokens and _is_stable_cut(page):
+            yield PAGE_BREAK.join(current)
+            current, used = [], 0
+    if current:
+        yield PAGE_BREAK.join(current)
+
+
+def _pack_pages(pages, limit, budget):
+    """Yield pages joined greedily into chunks of up to limit tokens; pages over budget are split alone."""
+    current = []
+    used = 0
+    for page in pages:
+        tokens = estimate_tokens(page + PAGE_BREAK)
+        if current and used + tokens > limit:
+            yield PAGE_BREAK.join(current)
+            current, used = [], 0
+        if tokens > budget:
+            yield from chunk_text(page, budget, 0)
+            continue
+        current.append(page)
+        used += tokens
+    if current:
+        yield PAGE_BREAK.join(current)
+
+
+def _count_packed(sizes, limit, budget):
+    """How many chunks _pack_pages makes of pages with these token sizes."""
+    count = used = 0
+    for tokens in sizes:
+        if used and used + tokens > limit:
+            count += 1
+            used = 0
+        if tokens > budget:
+            count += math.ceil(tokens / budget)
+            continue
+        used += tokens
+    return count + (used > 0)
+
+
+def iter_balanced_page_chunks(texts, max_tokens, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Yield chunks of the pages returned by texts() (e.g. memory.PageStore.texts;
+    it is called twice), holding one chunk at a time. Chunks are balanced and
+    overlap like chunk_text's, but are only cut between pages; a page larger
+    than a chunk is split with chunk_text.
+    """
+    overlap_tokens = min(overlap_tokens, max_tokens // 4)
+    budget = max_tokens - overlap_tokens
+    sizes = [estimate_tokens(page + PAGE_BREAK) for page in texts()]
+    limit = _balanced_limit(lambda limit: _count_packed(sizes, limit, budget), sum(sizes), budget)
+    previous = None
+    for chunk in _pack_pages(texts(), limit, budget):
+        yield _tail(previous, overlap_tokens) + chunk if previous is not None and overlap_tokens > 0 else chunk
+        previous = chunk
+
+
+def chunk_stats(chunks, max_tokens):
+    """Summarize chunk sizes: count, token totals and how full the chunks are on average."""
+    sizes = [estimate_tokens(chunk) for chunk in chunks]
+    if not sizes:
+        return {"chunks": 0, "total_tokens": 0, "min_tokens": 0, "max_tokens": 0, "mean_tokens": 0, "fill_ratio": 0.0}
+    mean = sum(sizes) / len(sizes)
+    return {
+        "chunks": len(sizes),
+        "total_tokens": sum(sizes),
+        "min_tokens": min(sizes),
+        "max_tokens": max(sizes),
+        "mean_tokens": round(mean),
+        "fill_ratio": round(mean / max_tokens, 3),
+    }
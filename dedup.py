@@ -0,0 +1,212 @@
+"""Removal of repeated boilerplate before text is sent to Gemini.
+
+Corporate PDFs repeat running headers, footers, page numbers, disclaimers
+and sometimes whole sections. Every copy costs input tokens and chunks, so
+pages are cleaned in one streaming pass before chunking:
+
+* Running headers and footers: a line among the first or last EDGE_LINES of
+  a page is dropped once the same line has appeared at the edge of
+  BOILERPLATE_MIN_PAGES earlier pages and of at least
+  BOILERPLATE_MIN_FRACTION of them. Digits are ignored only in lines that
+  look like page numbers: short, one or two plain integers and hardly any
+  words besides "page" and "of". So "Page 3 of 90" matches "Page 4 of 90",
+  but table rows and templated body lines that differ only in their figures
+  do not match each other. Headings
+  (draft_mindmap.parse_heading) keep their digits too, so "Chapter 3" and
+  "Chapter 4" opening their pages are kept.
+* Near-duplicate paragraphs: each paragraph of at least MIN_PARAGRAPH_WORDS
+  words gets a MinHash signature over its word shingles. A paragraph whose
+  estimated Jaccard similarity to an earlier one reaches
+  NEAR_DUPLICATE_THRESHOLD is dropped. Candidates are found through LSH
+  bands, so the cost stays linear in the document size.
+
+The first copy of everything is kept, so the text still reads the same.
+"""
+import os
+import re
+import zlib
+
+import numpy as np
+
+import chunking
+import draft_mindmap
+
+DEDUP_ENABLED = os.getenv('PIPELINE_DEDUP', 'true').lower() in ('1', 'true', 'yes')
+EDGE_LINES = 3
+BOILERPLATE_MIN_PAGES = 3
+BOILERPLATE_MIN_FRACTION = 0.2
+# Longer lines are body text even when they sit at the edge of a page
+MAX_BOILERPLATE_LINE_CHARS = 100
+# Page number lines are at most this long, with one or two integers of up to 4 digits
+PAGE_NUMBER_LINE_CHARS = 40
+# Words that don't count against a line being a page number
+_PAGE_WORDS = frozenset(("page", "pages", "of", "p", "pg", "no"))
+MIN_PARAGRAPH_WORDS = 12
+SHINGLE_WORDS = 3
+NEAR_DUPLICATE_THRESHOLD = 0.7
+MINHASH_PERMUTATIONS = 32
+LSH_BANDS = 8
+
+_DIGITS_RE = re.compile(r"\d+")
+# Figures like "1,234", "3.5" or "2024-03-12" count as one number
+_NUMBER_RE = re.compile(r"\d+(?:[.,:/-]\d+)*")
+_LETTERS_RE = re.compile(r"[^\W\d_]+")
+_SPACE_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"\w+")
+_SENTENCE_END = ('.', '!', '?', ':', '"', '”')
+
+# Multiply-shift hash family: odd 64-bit multipliers, fixed so signatures are stable across runs
+_rng = np.random.default_rng(20240601)
+_MULTIPLIERS = _rng.integers(1, 2 ** 63, MINHASH_PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_OFFSETS = _rng.integers(0, 2 ** 63, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+class DedupStats:
+    """What a Deduplicator removed; characters_in/out count the text before and after."""
+
+    def __init__(self):
+        self.characters_in = 0
+        self.characters_out = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.lines_removed = 0
+        self.paragraphs_removed = 0
+
+    @property
+    def characters_saved(self):
+        return self.characters_in - self.characters_out
+
+    @property
+    def tokens_saved(self):
+        return self.tokens_in - self.tokens_out
+
+    def to_dict(self):
+        return {
+            "characters_saved": self.characters_saved,
+            "tokens_saved": self.tokens_saved,
+            "saved_fraction": round(self.characters_saved / self.characters_in, 4) if self.characters_in else 0.0,
+            "lines_removed": self.lines_removed,
+            "paragraphs_removed": self.paragraphs_removed,
+        }
+
+
+def _is_page_number(line):
+    """True for lines like "12", "- 12 -" or "Page 12 of 90": mostly a page number, not text."""
+    line = line.strip().lower()
+    if len(line) > PAGE_NUMBER_LINE_CHARS:
+        return False
+    numbers = _NUMBER_RE.findall(line)
+    if not 1 <= len(numbers) <= 2 or not all(number.isdigit() and len(number) <= 4 for number in numbers):
+        return False
+    letters = sum(len(word) for word in _LETTERS_RE.findall(line) if word not in _PAGE_WORDS)
+    return letters <= len(line.replace(" ", "")) / 2
+
+
+def _normalize_line(line):
+    if _is_page_number(line) and draft_mindmap.parse_heading(line) is None:
+        line = _DIGITS_RE.sub("#", line)
+    return _SPACE_RE.sub(" ", line.lower()).strip()
+
+
+def _paragraphs(lines):
+    """
+    Group lines into paragraphs. PDF extraction rarely keeps blank lines, so a
+    paragraph also ends at a line that finishes a sentence well short of the
+    page's full line width.
+    """
+    width = max((len(line) for line in lines), default=0)
+    paragraph = []
+    for line in lines:
+        if not line.strip():
+            if paragraph:
+                yield paragraph
+                paragraph = []
+            continue
+        paragraph.append(line)
+        stripped = line.rstrip()
+        if stripped.endswith(_SENTENCE_END) and len(stripped) < 0.75 * width:
+            yield paragraph
+            paragraph = []
+    if paragraph:
+        yield paragraph
+
+
+def _signature(words):
+    shingles = np.fromiter(
+        (zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"))
+         for i in range(max(1, len(words) - SHINGLE_WORDS + 1))),
+        dtype=np.uint64,
+    )
+    # uint64 arithmetic wraps, which is exactly the multiply-shift hash
+    hashed = (shingles[:, None] * _MULTIPLIERS + _OFFSETS) >> np.uint64(32)
+    return hashed.min(axis=0)
+
+
+class Deduplicator:
+    """Cleans pages one at a time; later pages are compared with everything fed before them."""
+
+    def __init__(self):
+        self.stats = DedupStats()
+        self._edge_counts = {}  # normalized edge line -> pages it was seen on
+        self._pages = 0
+        self._signatures = []
+        self._bands = {}  # (band, band values) -> indexes into _signatures
+
+    def feed(self, page):
+        """Return page with running headers/footers and near-duplicate paragraphs removed."""
+        self.stats.characters_in += len(page)
+        self.stats.tokens_in += chunking.estimate_tokens(page)
+        lines = self._strip_edges(page.split("\n"))
+        kept = []
+        for paragraph in _paragraphs(lines):
+            if self._is_duplicate(paragraph):
+                self.stats.paragraphs_removed += 1
+            else:
+                kept.extend(paragraph)
+        cleaned = "\n".join(kept)
+        self.stats.characters_out += len(cleaned)
+        self.stats.tokens_out += chunking.estimate_tokens(cleaned)
+        return cleaned
+
+    def _strip_edges(self, lines):
+        content = [i for i, line in enumerate(lines) if line.strip()]
+        edges = set(content[:EDGE_LINES] + content[-EDGE_LINES:])
+        threshold = max(BOILERPLATE_MIN_PAGES, BOILERPLATE_MIN_FRACTION * self._pages)
+        self._pages += 1
+        seen = set()
+        kept = []
+        for i, line in enumerate(lines):
+            if i in edges and len(line) <= MAX_BOILERPLATE_LINE_CHARS:
+                key = _normalize_line(line)
+                seen.add(key)
+                if self._edge_counts.get(key, 0) >= threshold:
+                    self.stats.lines_removed += 1
+                    continue
+            kept.append(line)
+        for key in seen:
+            self._edge_counts[key] = self._edge_counts.get(key, 0) + 1
+        return kept
+
+    def _is_duplicate(self, paragraph):
+        words = _WORD_RE.findall(" ".join(paragraph).lower())
+        if len(words) < MIN_PARAGRAPH_WORDS:
+            return False
+        signature = _signature(words)
+        rows = MINHASH_PERMUTATIONS // LSH_BANDS
+        keys = [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(LSH_BANDS)]
+        candidates = {index for key in keys for index in self._bands.get(key, ())}
+        for index in candidates:
+            if np.mean(self._signatures[index] == signature) >= NEAR_DUPLICATE_THRESHOLD:
+                return True
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for key in keys:
+            self._bands.setdefault(key, []).append(index)
+        return False
+
+
+def deduplicate(pages):
+    """Clean an iterable of page texts in order; returns (cleaned pages, DedupStats)."""
+    deduplicator = Deduplicator()
+    cleaned = [deduplicator.feed(page) for page in pages]
+    return cleaned, deduplicator.stats
@@ -0,0 +1,225 @@
+"""Instant local draft mindmap, shown while Gemini works and used offline.
+
+build(pages, outline) returns mindmap markdown in well under a second, with
+no API calls:
+
+* Structure comes from the PDF's bookmarks when it has them (see
+  pdf_extract.read_outline). Otherwise it comes from lines that look like
+  headings: "2.3 Results", "Chapter 4: Scope", "EXECUTIVE SUMMARY" or
+  markdown "#" lines.
+* Under every section its key phrases are listed as bullets. Phrases are
+  scored RAKE-style: candidates are the runs of words between stop words and
+  punctuation, and a phrase scores the sum of its words' degree / frequency,
+  weighted by how often it recurs. A document without headings gets its top
+  phrases as sections instead.
+
+Font sizes are not consulted. Reading them means re-parsing every page's
+content stream, which alone costs more than the time budget on long
+documents. Bookmarks and text patterns come from data already extracted.
+"""
+import math
+import re
+from collections import Counter
+
+import mindmap_tree
+import nlp_resources
+
+DRAFT_MAX_SECTIONS = 40
+DRAFT_PHRASES_PER_SECTION = 4
+DRAFT_TOP_PHRASES = 8
+# Characters of each section scanned for key phrases; bounds the cost on huge sections
+SECTION_SAMPLE_CHARS = 6000
+MAX_PHRASE_WORDS = 4
+MAX_HEADING_CHARS = 90
+
+_FRAGMENT_RE = re.compile(r"[^\w\s'-]+|\s-\s|\n")
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z'-]*|\S+")
+_MARKDOWN_HEADING_RE = re.compile(r"^(#{1,6})\s+(\S.*)$")
+_NUMBERED_HEADING_RE = re.compile(r"^(\d{1,3}(?:\.\d{1,3}){0,3})\.?\s+([A-Z][^.;,]*)$")
+_CHAPTER_HEADING_RE = re.compile(r"^(?:chapter|section|part)\s+(?:\d+|[ivxlc]+)\b.*$", re.I)
+
+
+def parse_heading(line):
+    """Return (depth, title) if line looks like a heading, else None."""
+    line = line.strip()
+    if not line or len(line) > MAX_HEADING_CHARS:
+        return None
+    match = _MARKDOWN_HEADING_RE.match(line)
+    if match:
+        return len(match.group(1)) - 1, match.group(2).strip()
+    match = _NUMBERED_HEADING_RE.match(line)
+    if match and len(match.group(2).split()) <= 12:
+        return match.group(1).count("."), line
+    if _CHAPTER_HEADING_RE.match(line):
+        return 0, line
+    words = line.split()
+    if 1 <= len(words) <= 10 and line.isupper() and any(len(word) > 3 for word in words):
+        return 0, line.title()
+    return None
+
+
+def _sample(parts):
+    """Join parts with newlines, stopping once past SECTION_SAMPLE_CHARS; key_phrases reads no further."""
+    joined = []
+    size = -1
+    for part in parts:
+        if size > SECTION_SAMPLE_CHARS:
+            break
+        joined.append(part)
+        size += len(part) + 1
+    return "\n".join(joined)
+
+
+def _sections_from_outline(pages, outline):
+    """(depth, title, text) per bookmark; a bookmark's text runs up to the next bookmark's page."""
+    numbers = sorted(pages)
+    sections = []
+    for i, (depth, title, page) in enumerate(outline):
+        if page is None:
+            sections.append((depth, title, ""))
+            continue
+        end = next((later for _, _, later in outline[i + 1:] if later is not None and later > page), None)
+        text = _sample(pages[number] for number in numbers if number >= page and (end is None or number < end))
+        sections.append((depth, title, text))
+    return sections
+
+
+def _sections_from_text(pages):
+    """(depth, title, text) per heading-like line, in page order."""
+    sections = []
+    lines = []
+    size = -1
+    current = None
+    for number in sorted(pages):
+        for line in pages[number].split("\n"):
+            heading = parse_heading(line)
+            if heading is None:
+                # Like _sample: the rest of a long section is never read
+                if size <= SECTION_SAMPLE_CHARS:
+                    lines.append(line)
+                    size += len(line) + 1
+                continue
+            if current is not None:
+                sections.append((current[0], current[1], "\n".join(lines)))
+            current = heading
+            lines = []
+            size = -1
+    if current is not None:
+        sections.append((current[0], current[1], "\n".join(lines)))
+    return sections
+
+
+def _limit(sections):
+    """Keep at most DRAFT_MAX_SECTIONS sections, dropping the deepest levels first."""
+    if len(sections) <= DRAFT_MAX_SECTIONS:
+        return sections
+    depths = sorted({depth for depth, _, _ in sections})
+    kept_depth = depths[0]
+    for depth in depths:
+        if sum(1 for d, _, _ in sections if d <= depth) > DRAFT_MAX_SECTIONS:
+            break
+        kept_depth = depth
+    limited = []
+    for depth, title, text in sections:
+        if depth <= kept_depth:
+            limited.append([depth, title, text])
+        elif limited:
+            # A dropped subsection's text still counts towards its parent's key phrases
+            limited[-1][2] += "\n" + text
+    if len(limited) > DRAFT_MAX_SECTIONS:
+        # Even the top level is too long: keep evenly spaced sections, folding the rest in
+        step = math.ceil(len(limited) / DRAFT_MAX_SECTIONS)
+        folded = []
+        for i, section in enumerate(limited):
+            if i % step == 0:
+                folded.append(section)
+            else:
+                folded[-1][2] += "\n" + section[2]
+        limited = folded
+    return [tuple(section) for section in limited]
+
+
+def key_phrases(text, count, min_occurrences=1):
+    """Return up to count key phrases of text, best first, in the case they first appeared in."""
+    ignored = nlp_resources.stop_words()
+    if len(text) > SECTION_SAMPLE_CHARS:
+        # Cut at a word boundary so the sample doesn't end in half a word
+        cut = text.rfind(" ", 0, SECTION_SAMPLE_CHARS)
+        text = text[:cut if cut > 0 else SECTION_SAMPLE_CHARS]
+    phrases = []
+    for fragment in _FRAGMENT_RE.split(text):
+        run = []
+        for word in _WORD_RE.findall(fragment):
+            if word.lower() in ignored or len(word) < 3 or not word[0].isalpha():
+                if 0 < len(run) <= MAX_PHRASE_WORDS:
+                    phrases.append(run)
+                run = []
+            else:
+                run.append(word)
+        if 0 < len(run) <= MAX_PHRASE_WORDS:
+            phrases.append(run)
+
+    frequency = Counter()
+    degree = Counter()
+    occurrences = Counter()
+    surface = {}
+    for phrase in phrases:
+        key = " ".join(phrase).lower()
+        occurrences[key] += 1
+        surface.setdefault(key, " ".join(phrase))
+        for word in phrase:
+            frequency[word.lower()] += 1
+            degree[word.lower()] += len(phrase)
+
+    def score(key):
+        return sum(degree[word] / frequency[word] for word in key.split()) * math.log2(1 + occurrences[key])
+
+    candidates = [key for key in occurrences if occurrences[key] >= min_occurrences]
+    best = sorted(candidates, key=lambda key: (-score(key), key))
+    picked = []
+    for key in best:
+        # Skip phrases already covered by a better one ("cache" after "page cache")
+        if any(f" {key} " in f" {chosen} " or f" {chosen} " in f" {key} " for chosen in picked):
+            continue
+        picked.append(key)
+        if len(picked) == count:
+            break
+    return [surface[key] for key in picked]
+
+
+def _title(pages):
+    for number in sorted(pages):
+        for line in pages[number].split("\n"):
+            line = line.strip()
+            if line:
+                return line if len(line) <= MAX_HEADING_CHARS else "Document"
+    return "Document"
+
+
+def build(pages, outline=(), title=None):
+    """
+    Return draft mindmap markdown for pages ({page number: text}) and the PDF's
+    outline ((depth, title, page number) tuples, e.g. from pdf_extract.read_outline).
+    """
+    sections = _sections_from_outline(pages, list(outline)) if outline else _sections_from_text(pages)
+    title = title or _title(pages)
+    root = mindmap_tree.MindmapNode()
+    top = root.add_child(mindmap_tree.MindmapNode(title))
+
+    if not sections:
+        text = _sample(pages[number] for number in sorted(pages))
+        for phrase in key_phrases(text, DRAFT_TOP_PHRASES, min_occurrences=2 if len(text) > 2000 else 1):
+            top.add_child(mindmap_tree.MindmapNode(phrase))
+        return mindmap_tree.to_markdown(root)
+
+    sections = _limit(sections)
+    # Nest each section under the closest earlier section that is shallower
+    stack = [(-1, top)]
+    for depth, heading, text in sections:
+        while stack[-1][0] >= depth:
+            stack.pop()
+        node = stack[-1][1].add_child(mindmap_tree.MindmapNode(heading))
+        stack.append((depth, node))
+        for phrase in key_phrases(text, DRAFT_PHRASES_PER_SECTION):
+            node.add_child(mindmap_tree.MindmapNode(phrase, False))
+    return mindmap_tree.to_markdown(root)
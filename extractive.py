@@ -0,0 +1,126 @@
+"""Local extractive summarization: TF-IDF sentence vectors ranked with TextRank.
+
+Used by the pipeline in two places:
+
+* condense(text, token_budget) keeps the most salient sentences, in document
+  order, until the budget is filled. Very long documents then cost a
+  fraction of the Gemini calls (pipeline.EXTRACTIVE_TOKEN_BUDGET, 0 = off).
+* summarize(text) returns the top sentences as bullets. It is shown instead of
+  the Gemini summary when the API can't be reached.
+
+The sentence similarity graph is never materialized. With L2-normalized
+TF-IDF rows X, the similarities are X Xᵀ, so each PageRank iteration is two
+sparse matrix-vector products. That is linear in the number of terms, which
+keeps 1M-character inputs to a few seconds on CPU.
+"""
+import re
+
+import numpy as np
+from scipy import sparse
+
+import chunking
+import nlp_resources
+
+SUMMARY_SENTENCES = 7
+MIN_SENTENCE_WORDS = 4
+# Sentences at least this similar to one already picked add nothing to a summary
+REDUNDANCY_THRESHOLD = 0.6
+DAMPING = 0.85
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-6
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n[ \t]*\n|\f")
+_SPACE_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"[a-z][a-z'-]+")
+
+
+def split_sentences(text):
+    """Split text into sentences with whitespace (including PDF line breaks) collapsed."""
+    sentences = (_SPACE_RE.sub(" ", sentence).strip() for sentence in _SENTENCE_RE.split(text))
+    return [sentence for sentence in sentences if sentence]
+
+
+def tfidf_matrix(sentences):
+    """Return the sentences x terms TF-IDF matrix (CSR) with L2-normalized rows."""
+    ignored = nlp_resources.stop_words()
+    vocabulary = {}
+    indices = []
+    indptr = [0]
+    for sentence in sentences:
+        indices.extend(vocabulary.setdefault(word, len(vocabulary))
+                       for word in _WORD_RE.findall(sentence.lower()) if word not in ignored)
+        indptr.append(len(indices))
+    counts = sparse.csr_matrix(
+        (np.ones(len(indices)), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(sentences), len(vocabulary)),
+    )
+    counts.sum_duplicates()
+    document_frequency = np.bincount(counts.indices, minlength=len(vocabulary))
+    idf = np.log((1 + len(sentences)) / (1 + document_frequency)) + 1
+    matrix = counts.astype(np.float64)
+    matrix.data = (1 + np.log(matrix.data)) * idf[matrix.indices]
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return sparse.diags(scale) @ matrix
+
+
+def textrank(matrix):
+    """PageRank over the cosine-similarity graph of matrix's rows; returns one score per row."""
+    n = matrix.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    transposed = matrix.T.tocsr()
+    self_similarity = np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel()
+    degree = matrix @ (transposed @ np.ones(n)) - self_similarity
+    inverse_degree = np.divide(1.0, degree, out=np.zeros(n), where=degree > 1e-12)
+    dangling = inverse_degree == 0
+    rank = np.full(n, 1.0 / n)
+    for _ in range(MAX_ITERATIONS):
+        weighted = rank * inverse_degree
+        updated = DAMPING * (matrix @ (transposed @ weighted) - self_similarity * weighted)
+        # Sentences with no similar neighbours spread their rank evenly
+        updated += (1 - DAMPING) / n + DAMPING * rank[dangling].sum() / n
+        converged = np.abs(updated - rank).sum() < TOLERANCE
+        rank = updated
+        if converged:
+            break
+    return rank
+
+
+def _ranked(sentences):
+    """Return (tfidf matrix, sentence indexes best first), skipping sentences too short to stand alone."""
+    matrix = tfidf_matrix(sentences)
+    scores = textrank(matrix)
+    order = np.argsort(-scores, kind="stable")
+    return matrix, [int(i) for i in order if len(sentences[i].split()) >= MIN_SENTENCE_WORDS]
+
+
+def condense(text, token_budget):
+    """Keep the highest-ranked sentences of text, in their original order, within token_budget tokens."""
+    if chunking.estimate_tokens(text) <= token_budget:
+        return text
+    sentences = split_sentences(text)
+    _, order = _ranked(sentences)
+    kept = []
+    used = 0
+    for i in order:
+        tokens = chunking.estimate_tokens(sentences[i]) + 1
+        if used + tokens > token_budget:
+            continue
+        kept.append(i)
+        used += tokens
+    return "\n".join(sentences[i] for i in sorted(kept))
+
+
+def summarize(text, count=SUMMARY_SENTENCES):
+    """Return the count most salient, mutually distinct sentences of text as markdown bullets."""
+    sentences = split_sentences(text)
+    matrix, order = _ranked(sentences)
+    picked = []
+    for i in order:
+        if len(picked) == count:
+            break
+        if picked and (matrix[picked] @ matrix[i].T).max() >= REDUNDANCY_THRESHOLD:
+            continue
+        picked.append(i)
+    return "\n".join(f"- {sentences[i]}" for i in sorted(picked))
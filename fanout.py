@@ -0,0 +1,43 @@
+"""Bounded-concurrency fan-out for per-chunk Gemini calls."""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+
+
+def map_in_order(func, items, max_workers=None):
+    """
+    Apply func to every item with at most max_workers calls in flight.
+    Results are returned in the same order as items; the first exception is re-raised.
+    """
+    items = list(items)
+    if max_workers is None:
+        max_workers = LLM_MAX_CONCURRENCY
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix="llm-fanout") as executor:
+        return list(executor.map(func, items))
+
+
+def tree_reduce(items, combine, fan_in, max_workers=None, final_combine=None):
+    """
+    Reduce items to a single value by combining them in groups of at most fan_in,
+    level by level. Each level's groups run in parallel via map_in_order, so no
+    single combine call ever sees more than fan_in inputs. The last call runs on
+    the caller's thread, through final_combine when given.
+    """
+    level = list(items)
+    if fan_in < 2:
+        raise ValueError("fan_in must be at least 2")
+    while len(level) > fan_in:
+        # Spread items evenly over the fewest groups so no group is a lone leftover
+        group_count = -(-len(level) // fan_in)
+        size, extra = divmod(len(level), group_count)
+        groups = []
+        start = 0
+        for i in range(group_count):
+            end = start + size + (1 if i < extra else 0)
+            groups.append(level[start:end])
+            start = end
+        level = map_in_order(combine, groups, max_workers)
+    return (final_combine or combine)(level)
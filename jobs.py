@@ -0,0 +1,236 @@
+"""Background document jobs with staged progress, cancellation and persistence.
+
+Each uploaded document (plus its processing options) maps to one job id, so
+Streamlit reruns and other sessions attach to the job already running
+instead of starting over. Jobs run on a small thread pool owned by the
+server process. Finished results are written to JOB_STATE_DIR and are found
+again after a page reload or a server restart. Only the JOB_MEMORY_SLOTS most
+recently used finished jobs stay in memory; older ones are reloaded from disk
+when asked for again.
+"""
+import json
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_STATE_DIR = os.getenv('JOB_STATE_DIR', os.path.join('.mindgraphx_cache', 'jobs'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+# Finished jobs (with their summaries, mindmaps and SVGs) kept in memory
+JOB_MEMORY_SLOTS = int(os.getenv('JOB_MEMORY_SLOTS', '32'))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+_local = threading.local()
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a job once it has been cancelled. Like asyncio.CancelledError it
+    derives from BaseException so the pipeline's broad `except Exception` handlers,
+    which turn API failures into warning text, don't swallow it.
+    """
+
+
+def current_job():
+    """Return the job running on this thread, or None on the Streamlit script thread."""
+    return getattr(_local, "job", None)
+
+
+def bound(func):
+    """Wrap func so it runs as part of the calling thread's job when used on a worker thread."""
+    job = current_job()
+
+    def run(*args, **kwargs):
+        previous = current_job()
+        _local.job = job
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.job = previous
+
+    return run
+
+
+class Job:
+    """State of one background job. Progress is tracked per named stage."""
+
+    def __init__(self, job_id, name):
+        self.id = job_id
+        self.name = name
+        self.status = QUEUED
+        self.stages = OrderedDict()  # stage -> {"done": int, "total": int}
+        self.messages = []  # (level, text) reported by the pipeline
+        self.partial = {}  # latest streamed previews, e.g. {"summary": ..., "mindmap": ...}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def add_total(self, stage, count=1):
+        """Announce count more units of work for stage."""
+        with self._lock:
+            progress = self.stages.setdefault(stage, {"done": 0, "total": 0})
+            progress["total"] += count
+
+    def advance(self, stage, count=1):
+        """Mark count units of stage as done."""
+        with self._lock:
+            progress = self.stages.setdefault(stage, {"done": 0, "total": 0})
+            progress["done"] += count
+            progress["total"] = max(progress["total"], progress["done"])
+
+    def log(self, level, text):
+        with self._lock:
+            self.messages.append((level, str(text)))
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the job was cancelled; call between units of work."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def snapshot(self):
+        """A copy of the stage progress that is safe to read from another thread."""
+        with self._lock:
+            return OrderedDict((stage, dict(progress)) for stage, progress in self.stages.items())
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "stages": self.snapshot(),
+            "messages": list(self.messages),
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(data["id"], data["name"])
+        job.status = data["status"]
+        job.stages = OrderedDict(data.get("stages", {}))
+        job.messages = [tuple(message) for message in data.get("messages", [])]
+        job.result = data.get("result")
+        job.error = data.get("error")
+        job.created = data.get("created", job.created)
+        job.finished = data.get("finished")
+        return job
+
+
+class JobManager:
+    """Runs jobs on a bounded thread pool and persists finished results to disk."""
+
+    def __init__(self, state_dir=JOB_STATE_DIR, max_workers=JOB_WORKERS, memory_slots=JOB_MEMORY_SLOTS):
+        self.state_dir = state_dir
+        self.memory_slots = memory_slots
+        os.makedirs(state_dir, exist_ok=True)
+        self._jobs = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def _path(self, job_id):
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def get(self, job_id):
+        """Return the job with job_id from memory or, if it finished earlier, from disk."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._jobs.move_to_end(job_id)
+                return job
+        try:
+            with open(self._path(job_id), encoding="utf-8") as handle:
+                job = Job.from_dict(json.load(handle))
+        except (OSError, ValueError, KeyError):
+            return None
+        with self._lock:
+            job = self._jobs.setdefault(job_id, job)
+            self._evict()
+            return job
+
+    def submit(self, job_id, name, target, *args, **kwargs):
+        """
+        Start target(job, *args, **kwargs) in the background unless a job with this id is
+        already queued, running or done. Failed and cancelled jobs are restarted.
+        target's return value (JSON-serializable) becomes job.result.
+        """
+        # Loads a job that finished earlier from disk; the check and insert below are
+        # atomic so concurrent reruns submitting the same id start it only once
+        existing = self.get(job_id)
+        with self._lock:
+            existing = self._jobs.get(job_id, existing)
+            if existing is not None and existing.status not in (FAILED, CANCELLED):
+                return existing
+            job = Job(job_id, name)
+            self._jobs[job_id] = job
+            self._jobs.move_to_end(job_id)
+        self._executor.submit(self._run, job, target, args, kwargs)
+        return job
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and job.status not in FINISHED:
+            job.cancel()
+        return job
+
+    def _run(self, job, target, args, kwargs):
+        _local.job = job
+        try:
+            job.check_cancelled()
+            job.status = RUNNING
+            job.result = target(job, *args, **kwargs)
+            job.status = DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.status = FAILED
+            job.error = f"{e}\n{traceback.format_exc()}"
+        finally:
+            _local.job = None
+            job.finished = time.time()
+            job.partial = {}
+            if job.status == DONE:
+                self._save(job)
+            with self._lock:
+                self._evict()
+
+    def _evict(self):
+        """Forget the least recently used finished jobs beyond memory_slots. Call with the lock held."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.memory_slots)]:
+            del self._jobs[job_id]
+
+    def _save(self, job):
+        path = self._path(job.id)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as handle:
+            json.dump(job.to_dict(), handle)
+        os.replace(tmp, path)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    """Return the process-wide job manager shared by every Streamlit session."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
@@ -0,0 +1,301 @@
+"""Tail-latency controls for Gemini calls: deadlines, retries, hedging and a circuit breaker.
+
+Every call made through pipeline.get_model() goes through call_with_policy or
+stream_with_policy:
+
+* Each attempt is bounded by LLM_CALL_TIMEOUT and by the document's
+  Deadline (LLM_DOCUMENT_DEADLINE), so one document can't run forever.
+* Transient errors (overload, quota, timeouts, connection resets) are retried
+  up to LLM_MAX_ATTEMPTS times with full-jitter exponential backoff.
+* With LLM_HEDGE_PERCENTILE set, a call still running past that percentile
+  of recent latencies gets a duplicate request; the first answer wins.
+* A process-wide circuit breaker opens when the recent error rate spikes.
+  While it is open calls fail fast with CircuitOpenError, which the pipeline
+  turns into partial results (missing chunks) instead of waiting on a
+  degraded API. After LLM_BREAKER_COOLDOWN one probe call is let through.
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from google.api_core import exceptions as google_exceptions
+
+LLM_CALL_TIMEOUT = float(os.getenv('LLM_CALL_TIMEOUT', '120'))  # seconds per attempt, 0 = none
+LLM_DOCUMENT_DEADLINE = float(os.getenv('LLM_DOCUMENT_DEADLINE', '900'))  # seconds per document, 0 = none
+LLM_MAX_ATTEMPTS = int(os.getenv('LLM_MAX_ATTEMPTS', '4'))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '0.5'))
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '16'))
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '0'))  # e.g. 95; 0 = no hedging
+HEDGE_MIN_SAMPLES = 20
+LATENCY_SAMPLES = 500
+LLM_BREAKER_WINDOW = int(os.getenv('LLM_BREAKER_WINDOW', '20'))  # most recent calls considered
+LLM_BREAKER_MIN_CALLS = int(os.getenv('LLM_BREAKER_MIN_CALLS', '10'))
+LLM_BREAKER_ERROR_RATE = float(os.getenv('LLM_BREAKER_ERROR_RATE', '0.5'))
+LLM_BREAKER_COOLDOWN = float(os.getenv('LLM_BREAKER_COOLDOWN', '30'))
+
+TRANSIENT_ERRORS = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.Aborted,
+    google_exceptions.GatewayTimeout,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class DeadlineExceeded(Exception):
+    """The document's time budget ran out before the call could be made or retried."""
+
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is open; the call was not sent."""
+
+
+def is_transient(error):
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+class Deadline:
+    """A point in time by which a document's LLM work must finish; seconds <= 0 means none."""
+
+    def __init__(self, seconds=LLM_DOCUMENT_DEADLINE):
+        self.at = time.monotonic() + seconds if seconds > 0 else None
+
+    def remaining(self):
+        if self.at is None:
+            return None
+        return max(0.0, self.at - time.monotonic())
+
+    def timeout(self, limit=LLM_CALL_TIMEOUT):
+        """Timeout for the next attempt: limit, cut short by the deadline. None means unbounded."""
+        remaining = self.remaining()
+        if remaining is None:
+            return limit if limit > 0 else None
+        return min(limit, remaining) if limit > 0 else remaining
+
+
+class LatencyTracker:
+    """Recent successful call latencies, used to pick the hedging threshold."""
+
+    def __init__(self, size=LATENCY_SAMPLES):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent):
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(percent / 100 * len(samples)))]
+
+
+class CircuitBreaker:
+    """Opens when the error rate over the last `window` calls reaches error_rate."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, window=LLM_BREAKER_WINDOW, min_calls=LLM_BREAKER_MIN_CALLS,
+                 error_rate=LLM_BREAKER_ERROR_RATE, cooldown=LLM_BREAKER_COOLDOWN):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._rejected = 0
+        self._trips = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may be sent now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                # Let exactly one probe through; its outcome closes or re-opens the breaker
+                self._probing = True
+                return
+            self._rejected += 1
+            raise CircuitOpenError("Gemini API error rate is too high; skipping calls for now.")
+
+    def record(self, success):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                if success:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if (self.state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.error_rate):
+                self._open()
+
+    def abandon(self):
+        """A call ended without an outcome (e.g. its job was cancelled); a half-open probe may be retried."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probing = False
+        self._trips += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "recent_error_rate": self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0,
+                "trips": self._trips,
+                "rejected": self._rejected,
+            }
+
+
+_breaker = CircuitBreaker()
+_latencies = LatencyTracker()
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+_counters = {"retries": 0, "hedges": 0, "hedge_wins": 0}
+_counters_lock = threading.Lock()
+
+
+def get_breaker():
+    return _breaker
+
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def stats():
+    """Breaker state plus retry and hedging counters for the whole process."""
+    with _counters_lock:
+        counters = dict(_counters)
+    counters.update(_breaker.stats())
+    counters["hedge_threshold"] = _latencies.percentile(LLM_HEDGE_PERCENTILE) if LLM_HEDGE_PERCENTILE > 0 else None
+    return counters
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given 0-based retry attempt."""
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+def _attempt_timeout(deadline):
+    timeout = deadline.timeout()
+    if timeout is not None and timeout <= 0:
+        raise DeadlineExceeded("Document deadline exceeded before the Gemini call could be made.")
+    return timeout
+
+
+def _sleep_before_retry(attempt, error, deadline, check_cancelled):
+    if attempt + 1 >= LLM_MAX_ATTEMPTS or not is_transient(error):
+        raise error
+    delay = backoff_delay(attempt)
+    remaining = deadline.remaining()
+    if remaining is not None and delay >= remaining:
+        raise error
+    _count("retries")
+    time.sleep(delay)
+    if check_cancelled is not None:
+        check_cancelled()
+
+
+def _hedged(attempt, timeout):
+    """Run attempt(timeout); if it outlives the hedge threshold, race a duplicate against it."""
+    threshold = _latencies.percentile(LLM_HEDGE_PERCENTILE) if LLM_HEDGE_PERCENTILE > 0 else None
+    if threshold is None or (timeout is not None and threshold >= timeout):
+        return attempt(timeout)
+    started = time.monotonic()
+    primary = _hedge_executor.submit(attempt, timeout)
+    done, _ = wait([primary], timeout=threshold)
+    if done:
+        return primary.result()
+    _count("hedges")
+    left = None if timeout is None else max(0.0, timeout - (time.monotonic() - started))
+    hedge = _hedge_executor.submit(attempt, left)
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is hedge:
+                    _count("hedge_wins")
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def call_with_policy(attempt, deadline, check_cancelled=None):
+    """
+    Call attempt(timeout) -> response under the retry, hedging and breaker policy.
+    timeout is the number of seconds the attempt may take (None = unbounded).
+    """
+    for number in range(LLM_MAX_ATTEMPTS):
+        _breaker.before_call()
+        timeout = _attempt_timeout(deadline)
+        started = time.monotonic()
+        try:
+            response = _hedged(attempt, timeout)
+        except Exception as e:
+            # Non-transient errors (e.g. a rejected prompt) still prove the API is answering
+            _breaker.record(not is_transient(e))
+            _sleep_before_retry(number, e, deadline, check_cancelled)
+            continue
+        except BaseException:
+            # Cancelled or interrupted: no outcome, but a probe must not stay claimed forever
+            _breaker.abandon()
+            raise
+        _breaker.record(True)
+        _latencies.record(time.monotonic() - started)
+        return response
+
+
+def stream_with_policy(open_stream, deadline, check_cancelled=None):
+    """
+    Yield the parts of open_stream(timeout) under the retry and breaker policy.
+    Attempts are retried only until the first part arrives; after that an error
+    is raised to the caller, because the text already shown can't be taken back.
+    Streams are not hedged.
+    """
+    for number in range(LLM_MAX_ATTEMPTS):
+        _breaker.before_call()
+        timeout = _attempt_timeout(deadline)
+        started = time.monotonic()
+        received = False
+        try:
+            for part in open_stream(timeout):
+                received = True
+                yield part
+        except Exception as e:
+            _breaker.record(not is_transient(e))
+            if received:
+                raise
+            _sleep_before_retry(number, e, deadline, check_cancelled)
+            continue
+        except BaseException:
+            # Includes GeneratorExit when the consumer abandons the stream
+            _breaker.abandon()
+            raise
+        _breaker.record(True)
+        _latencies.record(time.monotonic() - started)
+        return
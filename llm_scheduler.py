@@ -0,0 +1,211 @@
+"""Process-wide scheduler that owns every Gemini call.
+
+All sessions of a Streamlit server share one Scheduler. Before a call is
+sent it must win a slot, which requires:
+
+* a request from the requests-per-minute bucket (GEMINI_RPM),
+* its estimated tokens from the tokens-per-minute bucket (GEMINI_TPM),
+* one of GEMINI_MAX_IN_FLIGHT concurrent slots.
+
+Waiting calls are queued per session (one background job = one session) and
+served round-robin, so a huge upload queues behind its own chunks instead of
+starving everyone else. When the API still answers with a quota error, both
+buckets are drained so every session backs off together.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+GEMINI_RPM = int(os.getenv('GEMINI_RPM', '60'))  # 0 = unlimited
+GEMINI_TPM = int(os.getenv('GEMINI_TPM', '1000000'))  # 0 = unlimited
+GEMINI_MAX_IN_FLIGHT = int(os.getenv('GEMINI_MAX_IN_FLIGHT', '8'))
+# Output tokens reserved per call until the response reports its real usage
+RESERVED_OUTPUT_TOKENS = int(os.getenv('GEMINI_RESERVED_OUTPUT_TOKENS', '1024'))
+# Number of recent queue waits kept for the wait-time metrics
+WAIT_SAMPLES = 1000
+# How often a queued call re-checks whether its job was cancelled
+CANCEL_POLL_SECONDS = 0.25
+
+
+class TokenBucket:
+    """Refills at per_minute / 60 units per second up to a one-minute burst. Not thread-safe."""
+
+    def __init__(self, per_minute, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, amount):
+        """Seconds until amount can be taken; 0 if it can be taken now."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        # A request larger than the burst is let through once the bucket is full
+        needed = min(amount, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate
+
+    def take(self, amount):
+        """Consume amount; the level may go negative, which delays later takers."""
+        if self.rate > 0:
+            self._refill()
+            self.level -= amount
+
+    def drain(self):
+        if self.rate > 0:
+            self._refill()
+            self.level = min(self.level, 0.0)
+
+
+class _Ticket:
+    __slots__ = ("session", "tokens", "enqueued")
+
+    def __init__(self, session, tokens):
+        self.session = session
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+
+
+class Scheduler:
+    """Quota-aware, fair admission control for LLM calls made from any thread."""
+
+    def __init__(self, rpm=GEMINI_RPM, tpm=GEMINI_TPM, max_in_flight=GEMINI_MAX_IN_FLIGHT):
+        self.max_in_flight = max(1, max_in_flight)
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._cond = threading.Condition()
+        # session -> waiting tickets; the first session holds the next turn
+        self._queues = OrderedDict()
+        self._in_flight = 0
+        self._granted = 0
+        self._throttled = 0
+        self._quota_errors = 0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+
+    @contextmanager
+    def slot(self, session, tokens, check_cancelled=None):
+        """
+        Block until a call for session estimated at tokens may run, and hold its slot.
+        check_cancelled() is called while waiting; whatever it raises (e.g.
+        jobs.JobCancelled) gives up the call's place in the queue.
+        """
+        self._acquire(session, tokens, check_cancelled)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def _acquire(self, session, tokens, check_cancelled=None):
+        ticket = _Ticket(session, tokens)
+        with self._cond:
+            self._queues.setdefault(session, deque()).append(ticket)
+            try:
+                while True:
+                    if check_cancelled is not None:
+                        check_cancelled()
+                    timeout = None
+                    if self._next() is ticket and self._in_flight < self.max_in_flight:
+                        timeout = max(self._requests.delay(1), self._tokens.delay(tokens))
+                        if timeout == 0:
+                            self._grant(ticket)
+                            return
+                    if check_cancelled is not None:
+                        # Cancelling a job doesn't notify the condition; wake up to notice it
+                        timeout = CANCEL_POLL_SECONDS if timeout is None else min(timeout, CANCEL_POLL_SECONDS)
+                    self._cond.wait(timeout)
+            except BaseException:
+                self._remove(ticket)
+                raise
+
+    def _next(self):
+        return next((queue[0] for queue in self._queues.values()), None)
+
+    def _grant(self, ticket):
+        self._remove(ticket)
+        if ticket.session in self._queues:
+            # Round robin: the session that was just served waits for everyone else
+            self._queues.move_to_end(ticket.session)
+        self._requests.take(1)
+        self._tokens.take(ticket.tokens)
+        self._in_flight += 1
+        self._granted += 1
+        waited = time.monotonic() - ticket.enqueued
+        if waited > 0.01:
+            self._throttled += 1
+        self._waits.append(waited)
+        self._cond.notify_all()
+
+    def _remove(self, ticket):
+        queue = self._queues.get(ticket.session)
+        if queue is None:
+            return
+        try:
+            queue.remove(ticket)
+        except ValueError:
+            return
+        if not queue:
+            del self._queues[ticket.session]
+        self._cond.notify_all()
+
+    def record_usage(self, estimated, actual):
+        """Correct the token bucket once a response reports how many tokens it really used."""
+        if actual is None:
+            return
+        with self._cond:
+            self._tokens.take(actual - estimated)
+            self._cond.notify_all()
+
+    def record_quota_error(self):
+        """The API rejected a call for quota reasons; make every session back off."""
+        with self._cond:
+            self._quota_errors += 1
+            self._requests.drain()
+            self._tokens.drain()
+
+    def stats(self):
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                "queue_depth": sum(len(queue) for queue in self._queues.values()),
+                "waiting_sessions": len(self._queues),
+                "in_flight": self._in_flight,
+                "granted": self._granted,
+                "throttled": self._throttled,
+                "quota_errors": self._quota_errors,
+                "wait_avg": sum(waits) / len(waits) if waits else 0.0,
+                "wait_p95": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                "wait_max": waits[-1] if waits else 0.0,
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return the process-wide scheduler shared by every Streamlit session."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
+
+
+def configure(rpm=GEMINI_RPM, tpm=GEMINI_TPM, max_in_flight=GEMINI_MAX_IN_FLIGHT):
+    """Replace the process-wide scheduler, e.g. to give each batch worker its share of the quota."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = Scheduler(rpm, tpm, max_in_flight)
+        return _scheduler
@@ -0,0 +1,103 @@
+"""Streaming helpers for Gemini responses.
+
+Streamed chunk calls run on worker threads and hand their text deltas to the
+caller's thread through a queue, because Streamlit elements may only be
+updated from the script thread.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fanout
+
+# Minimum seconds between two progressive redraws of the summary/mindmap views
+STREAM_REFRESH_SECONDS = float(os.getenv('STREAM_REFRESH_SECONDS', '0.75'))
+
+_DONE = object()
+
+
+def stream_text(model, prompt):
+    """Yield the text deltas of a streamed Gemini response."""
+    for part in model.generate_content(prompt, stream=True):
+        try:
+            text = part.text
+        except ValueError:
+            # Parts without text (e.g. safety-blocked candidates) carry nothing to show
+            continue
+        if text:
+            yield text
+
+
+def stream_map(model, prompts, max_workers=None, on_error=None):
+    """
+    Stream every prompt of the sequence prompts concurrently and yield (index, delta)
+    events in arrival order.
+    A None delta marks the end of that prompt's response. The first exception raised
+    by any call is re-raised here, unless on_error(index, exception) is given; then
+    the failed prompt is reported to it and the others keep streaming.
+    """
+    if max_workers is None:
+        max_workers = fanout.LLM_MAX_CONCURRENCY
+    events = queue.Queue()
+    stop = threading.Event()
+
+    def run(index):
+        if stop.is_set():
+            # The consumer went away before this call started; don't open the request
+            return
+        try:
+            # Read the prompt only once its call starts; prompts may build them lazily
+            for delta in stream_text(model, prompts[index]):
+                if stop.is_set():
+                    # The consumer went away (e.g. the job was cancelled); drop the stream
+                    return
+                events.put((index, delta))
+            events.put((index, _DONE))
+        except BaseException as e:
+            # Includes job cancellation, which must reach the consumer rather than kill the thread silently
+            events.put((index, e))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(prompts))), thread_name_prefix="llm-stream")
+    try:
+        for index in range(len(prompts)):
+            executor.submit(run, index)
+        remaining = len(prompts)
+        while remaining:
+            index, item = events.get()
+            if item is _DONE:
+                remaining -= 1
+                yield index, None
+            elif isinstance(item, Exception) and on_error is not None:
+                remaining -= 1
+                on_error(index, item)
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                yield index, item
+    finally:
+        stop.set()
+        # Calls that haven't started yet are dropped; running ones stop at their next delta
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+class Throttle:
+    """Rate-limits redraws: ready() is true at most once per interval seconds."""
+
+    def __init__(self, interval=STREAM_REFRESH_SECONDS):
+        self.interval = interval
+        self._last = 0.0
+
+    def ready(self):
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            return True
+        return False
+
+
+def complete_lines(text):
+    """Return text up to its last newline, so half-streamed lines are not rendered."""
+    end = text.rfind("\n")
+    return text[:end] if end >= 0 else ""
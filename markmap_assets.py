@@ -0,0 +1,95 @@
+"""Pinned Markmap front-end assets, vendored into markmap_frontend/vendor.
+
+The interactive component loads each library from the vendor directory and
+only falls back to its CDN when the file is missing, so a server with the
+assets vendored works offline or air-gapped. They are fetched with
+
+    python scripts/fetch_markmap_assets.py
+
+as part of the install (see README); they are not committed, so a fresh
+checkout on an offline server has none until then. As a safety net, a server that starts
+without them downloads them once in the background (MARKMAP_AUTO_FETCH) so
+the next page load no longer needs the CDNs.
+
+The file names carry the library versions so browsers can cache them
+indefinitely; bump both the URL and the name together when upgrading.
+"""
+import logging
+import os
+import threading
+import urllib.request
+
+VENDOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'markmap_frontend', 'vendor')
+MARKMAP_AUTO_FETCH = os.getenv('MARKMAP_AUTO_FETCH', 'true').lower() in ('1', 'true', 'yes')
+FETCH_TIMEOUT = 60
+
+# Load order matters: d3 before markmap-view before markmap-lib
+ASSETS = {
+    'd3-6.7.0.min.js': 'https://cdn.jsdelivr.net/npm/d3@6.7.0',
+    'markmap-view-0.14.4.min.js': 'https://cdn.jsdelivr.net/npm/markmap-view@0.14.4',
+    'markmap-lib-0.14.3.min.js': 'https://cdn.jsdelivr.net/npm/markmap-lib@0.14.3/dist/browser/index.min.js',
+    'html2canvas-1.4.1.min.js': 'https://cdnjs.cloudflare.com/ajax/libs/html2canvas/1.4.1/html2canvas.min.js',
+    'jspdf-2.4.0.umd.min.js': 'https://cdnjs.cloudflare.com/ajax/libs/jspdf/2.4.0/jspdf.umd.min.js',
+}
+
+logger = logging.getLogger("markmap_assets")
+
+_fetch_started = False
+_fetch_lock = threading.Lock()
+
+
+def path(name):
+    return os.path.join(VENDOR_DIR, name)
+
+
+def missing():
+    """Names of the assets not vendored yet."""
+    return [name for name in ASSETS if not os.path.exists(path(name))]
+
+
+def fetch(names=None):
+    """Download the named assets (default: the missing ones); returns {name: error} for the failures."""
+    os.makedirs(VENDOR_DIR, exist_ok=True)
+    failures = {}
+    for name in missing() if names is None else names:
+        try:
+            with urllib.request.urlopen(ASSETS[name], timeout=FETCH_TIMEOUT) as response:
+                data = response.read()
+        except OSError as e:
+            failures[name] = e
+            continue
+        # Write to a temporary name first so a half-downloaded file is never served
+        tmp = path(name) + '.tmp'
+        with open(tmp, 'wb') as handle:
+            handle.write(data)
+        os.replace(tmp, path(name))
+    return failures
+
+
+def ensure_in_background():
+    """Start downloading missing assets on a daemon thread, at most once per process."""
+    global _fetch_started
+    with _fetch_lock:
+        if _fetch_started or not MARKMAP_AUTO_FETCH or not missing():
+            return
+        _fetch_started = True
+
+    def run():
+        failures = fetch()
+        if failures:
+            logger.warning("Markmap assets not vendored, the CDNs stay in use: %s",
+                           ", ".join(f"{name} ({error})" for name, error in failures.items()))
+
+    threading.Thread(target=run, name="markmap-assets", daemon=True).start()
+
+
+def script_tags():
+    """<script> tags for standalone pages: vendored files inlined, CDN links for the missing ones."""
+    tags = []
+    for name, url in ASSETS.items():
+        try:
+            with open(path(name), encoding='utf-8') as handle:
+                tags.append(f"<script>{handle.read()}</script>")
+        except OSError:
+            tags.append(f'<script src="{url}"></script>')
+    return "\n".join(tags)
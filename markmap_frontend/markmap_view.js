@@ -0,0 +1,143 @@
+// Streamlit component that renders a Markmap mindmap from locally bundled assets.
+// The iframe stays mounted across reruns; Python only sends the markdown when its
+// digest changes, and the last payloads are kept in sessionStorage so a remounted
+// iframe can redraw without another round trip.
+
+// [local vendored file, CDN fallback] for each asset; see scripts/fetch_markmap_assets.py
+const RENDER_ASSETS = [
+    ["vendor/d3-6.7.0.min.js", "https://cdn.jsdelivr.net/npm/d3@6.7.0"],
+    ["vendor/markmap-view-0.14.4.min.js", "https://cdn.jsdelivr.net/npm/markmap-view@0.14.4"],
+    ["vendor/markmap-lib-0.14.3.min.js", "https://cdn.jsdelivr.net/npm/markmap-lib@0.14.3/dist/browser/index.min.js"],
+];
+// Only needed for the in-frame PDF button, so they load on first click
+const EXPORT_ASSETS = [
+    ["vendor/html2canvas-1.4.1.min.js", "https://cdnjs.cloudflare.com/ajax/libs/html2canvas/1.4.1/html2canvas.min.js"],
+    ["vendor/jspdf-2.4.0.umd.min.js", "https://cdnjs.cloudflare.com/ajax/libs/jspdf/2.4.0/jspdf.umd.min.js"],
+];
+const COLORS = ['#2196f3', '#4caf50', '#ff9800', '#f44336'];
+
+let markmapInstance = null;
+let renderedDigest = null;
+let requestedDigest = null;
+let expandSequence = 0;
+let expandLevel = 2;
+
+function sendMessage(type, data) {
+    window.parent.postMessage(Object.assign({ isStreamlitMessage: true, type: type }, data), "*");
+}
+
+function injectScript(src) {
+    return new Promise((resolve, reject) => {
+        const script = document.createElement("script");
+        script.src = src;
+        script.onload = resolve;
+        script.onerror = () => { script.remove(); reject(new Error("Failed to load " + src)); };
+        document.head.appendChild(script);
+    });
+}
+
+async function loadAssets(assets) {
+    for (const [local, cdn] of assets) {
+        try {
+            await injectScript(local);
+        } catch (error) {
+            await injectScript(cdn);
+        }
+    }
+}
+
+const renderAssetsReady = loadAssets(RENDER_ASSETS);
+let exportAssetsReady = null;
+
+function storageKey(digest) {
+    return "markmap:" + digest;
+}
+
+function remember(digest, markdown) {
+    try {
+        sessionStorage.setItem(storageKey(digest), markdown);
+    } catch (error) {
+        // Storage full or disabled: the next remount simply asks Python again
+    }
+}
+
+async function draw(digest, markdown) {
+    await renderAssetsReady;
+    const { root } = new markmap.Transformer().transform(markdown);
+    if (!markmapInstance) {
+        markmapInstance = new markmap.Markmap(document.querySelector('#mindmap'), {
+            maxWidth: 800,
+            color: (node) => COLORS[node.depth % COLORS.length],
+            paddingX: 16,
+            autoFit: true,
+            initialExpandLevel: expandLevel,
+            duration: 500,
+        });
+    }
+    markmapInstance.options.initialExpandLevel = expandLevel;
+    await Promise.resolve(markmapInstance.setData(root));
+    await Promise.resolve(markmapInstance.fit());
+    renderedDigest = digest;
+    document.getElementById("status").textContent = "";
+}
+
+async function onRender(args) {
+    const { digest, markdown, height } = args;
+    expandLevel = args.expand_level;
+    sendMessage("streamlit:setFrameHeight", { height: height });
+    document.getElementById("mindmap-container").style.height = (height - 50) + "px";
+    if (markdown !== null && markdown !== undefined) {
+        remember(digest, markdown);
+    }
+    if (digest === renderedDigest) {
+        return;
+    }
+    const source = markdown !== null && markdown !== undefined ? markdown : sessionStorage.getItem(storageKey(digest));
+    if (source === null) {
+        // The iframe was remounted without the data; ask Python to resend it once
+        if (requestedDigest !== digest) {
+            requestedDigest = digest;
+            sendMessage("streamlit:setComponentValue", { value: { need: digest }, dataType: "json" });
+        }
+        document.getElementById("status").textContent = "Loading mindmap…";
+        return;
+    }
+    try {
+        await draw(digest, source);
+    } catch (error) {
+        console.error('Error rendering mindmap:', error);
+        document.getElementById("status").innerHTML = '<span style="color: red;">Error rendering mindmap. Please check the console for details.</span>';
+    }
+}
+
+// Progressive mode: "➕ N more" links point at #expand:<node id>; ask Python for that subtree
+document.getElementById('mindmap').addEventListener('click', (event) => {
+    const link = event.target.closest('a');
+    const href = link ? link.getAttribute('href') || '' : '';
+    if (!href.startsWith('#expand:')) {
+        return;
+    }
+    event.preventDefault();
+    event.stopPropagation();
+    expandSequence += 1;
+    document.getElementById("status").textContent = "Loading branch…";
+    sendMessage("streamlit:setComponentValue", { value: { expand: href.slice(8), seq: expandSequence }, dataType: "json" });
+}, true);
+
+window.addEventListener("message", (event) => {
+    if (event.data && event.data.type === "streamlit:render") {
+        onRender(event.data.args);
+    }
+});
+
+document.getElementById('download-mindmap').addEventListener('click', async () => {
+    exportAssetsReady = exportAssetsReady || loadAssets(EXPORT_ASSETS);
+    await exportAssetsReady;
+    const canvas = await html2canvas(document.getElementById('mindmap-container'), { scale: 2, useCORS: true });
+    const { jsPDF } = window.jspdf;
+    const pdf = new jsPDF('l', 'mm', 'a4');
+    pdf.addImage(canvas.toDataURL('image/png'), 'PNG', 10, 10, 280, 150);
+    pdf.save("mindmap.pdf");
+});
+
+sendMessage("streamlit:componentReady", { apiVersion: 1 });
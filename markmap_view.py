@@ -0,0 +1,101 @@
+"""Streamlit component that renders Markmap mindmaps from locally bundled assets.
+
+The component's iframe is mounted once and kept across reruns. Only the
+markdown is sent to it, and only when its digest changes; on unchanged
+reruns just the digest is sent. The JavaScript and vendored libraries in
+markmap_frontend/ are served by Streamlit's component route, which marks
+non-HTML files cacheable, so they are fetched once per browser. Assets that
+aren't vendored yet are loaded from their CDNs and downloaded in the
+background (see markmap_assets.py).
+
+Mindmaps larger than LAZY_NODE_THRESHOLD nodes are rendered progressively:
+the full tree stays indexed in this process and the browser receives only
+the top LAZY_INITIAL_LEVELS levels. Collapsed branches end in an "➕ N more"
+link; clicking it reports the branch id back and the next rerun sends that
+subtree.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+import markmap_assets
+import mindmap_tree
+import telemetry
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "markmap_frontend")
+
+LAZY_NODE_THRESHOLD = int(os.getenv('MINDMAP_LAZY_NODE_THRESHOLD', '300'))  # 0 = never lazy
+LAZY_INITIAL_LEVELS = int(os.getenv('MINDMAP_LAZY_LEVELS', '2'))
+# Parsed trees kept in memory, shared by every session
+TREE_INDEX_SIZE = int(os.getenv('MINDMAP_TREE_INDEX_SIZE', '32'))
+
+_component = components.declare_component("markmap_view", path=FRONTEND_DIR)
+
+_trees = OrderedDict()
+_trees_lock = threading.Lock()
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def get_tree(markdown_content, digest=None):
+    """Return the parsed tree for markdown_content from the process-wide LRU index."""
+    digest = digest or _digest(markdown_content)
+    with _trees_lock:
+        tree = _trees.get(digest)
+        if tree is not None:
+            _trees.move_to_end(digest)
+            return tree
+    tree = mindmap_tree.parse_markdown(markdown_content)
+    with _trees_lock:
+        _trees[digest] = tree
+        while len(_trees) > TREE_INDEX_SIZE:
+            _trees.popitem(last=False)
+    return tree
+
+
+def _view(markdown_content, source_digest, request, key):
+    """Return (markdown to send, its digest, lazy) for this rerun, applying expand requests."""
+    tree = get_tree(markdown_content, source_digest)
+    if not (LAZY_NODE_THRESHOLD > 0 and tree.count() > LAZY_NODE_THRESHOLD):
+        return markdown_content, source_digest, False
+    expanded_key = f"_markmap_expanded_{key}"
+    expanded = st.session_state.get(expanded_key)
+    if not expanded or expanded[0] != source_digest:
+        expanded = (source_digest, set())
+    node_id = request.get("expand")
+    if isinstance(node_id, str) and mindmap_tree.find_node(tree, node_id) is not None:
+        expanded[1].add(node_id)
+    st.session_state[expanded_key] = expanded
+    view_markdown = mindmap_tree.to_markdown(tree, LAZY_INITIAL_LEVELS, expanded[1])
+    return view_markdown, _digest(view_markdown), True
+
+
+def markmap_view(markdown_content, height=850, key="mindmap"):
+    """Render markdown_content as an interactive mindmap, resending it only when it changed."""
+    markmap_assets.ensure_in_background()
+    source_digest = _digest(markdown_content)
+    request = st.session_state.get(key)
+    request = request if isinstance(request, dict) else {}
+
+    with telemetry.span("html_build", component="markmap_view") as span:
+        view_markdown, digest, lazy = _view(markdown_content, source_digest, request, key)
+        span.set(lazy=lazy, characters=len(view_markdown))
+
+    sent_key = f"_markmap_sent_{key}"
+    needs_data = st.session_state.get(sent_key) != digest or request.get("need") == digest
+    _component(
+        digest=digest,
+        markdown=view_markdown if needs_data else None,
+        height=height,
+        # Everything sent in progressive mode was asked for, so show it unfolded
+        expand_level=-1 if lazy else 2,
+        key=key,
+        default=None,
+    )
+    st.session_state[sent_key] = digest
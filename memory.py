@@ -0,0 +1,204 @@
+"""Bounded-memory processing of huge documents.
+
+A multi-thousand-page PDF used to be held several times over: the uploaded
+bytes, every page, the joined text, a preprocessed copy, the chunks and
+their prompts. Documents of at least STREAMING_MIN_PAGES selected pages are
+streamed instead:
+
+* pages are extracted a batch at a time (pdf_extract.stream_pages), cleaned
+  and preprocessed one by one, and appended to a PageStore: a temporary file
+  that is memory-mapped once written, so page text lives in the OS page
+  cache rather than on the Python heap;
+* chunks are cut from the store one at a time (chunking.iter_balanced_page_chunks,
+  or iter_page_chunks for incremental reprocessing) and spilled to a
+  SpillList the same way;
+* each chunk's prompt is only built when its Gemini call starts, so at most
+  LLM_MAX_CONCURRENCY prompts exist at once.
+
+Every job has a MemoryBudget. Stages reserve what they are about to hold
+(the upload, an extraction batch, the in-memory text copies, the Gemini
+working set), and a reservation beyond JOB_MEMORY_LIMIT_MB raises
+MemoryLimitExceeded. An in-memory document that would break the ceiling is
+spilled instead. Sizes are counted in characters, which equal bytes for the
+mostly ASCII text of PDFs; the peak is reported with the results.
+"""
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+from collections.abc import Mapping, Sequence
+
+import chunking
+
+JOB_MEMORY_LIMIT_MB = int(os.getenv('JOB_MEMORY_LIMIT_MB', '0'))  # 0 = no ceiling
+STREAMING_MIN_PAGES = int(os.getenv('STREAMING_MIN_PAGES', '1000'))
+SPILL_DIR = os.getenv('SPILL_DIR') or None  # None = the system temp directory
+# The in-memory path holds the pages, the joined text and the chunks
+IN_MEMORY_COPIES = 3
+
+MB = 1024 * 1024
+
+
+class MemoryLimitExceeded(Exception):
+    """A job stage needed more memory than the job's ceiling allows."""
+
+
+class MemoryBudget:
+    """Memory reserved by one job's stages, checked against a ceiling; limit_mb <= 0 means none."""
+
+    def __init__(self, limit_mb=JOB_MEMORY_LIMIT_MB):
+        self.limit = limit_mb * MB if limit_mb > 0 else None
+        self.used = 0
+        self.peak = 0
+        self.spilled = 0
+        self.streaming = False
+        self._lock = threading.Lock()
+
+    def fits(self, nbytes):
+        return self.limit is None or self.used + nbytes <= self.limit
+
+    def reserve(self, nbytes, what):
+        """Count nbytes held for what; raises MemoryLimitExceeded if that breaks the ceiling."""
+        with self._lock:
+            if not self.fits(nbytes):
+                raise MemoryLimitExceeded(
+                    f"{what} needs {nbytes / MB:.1f} MB, but only {(self.limit - self.used) / MB:.1f} MB "
+                    f"of the job's {self.limit / MB:.0f} MB memory ceiling are left."
+                )
+            self.used += nbytes
+            self.peak = max(self.peak, self.used)
+
+    def release(self, nbytes):
+        with self._lock:
+            self.used -= nbytes
+
+    def to_dict(self):
+        return {
+            "streaming": self.streaming,
+            "limit_mb": round(self.limit / MB, 1) if self.limit is not None else None,
+            "peak_mb": round(self.peak / MB, 1),
+            "spilled_mb": round(self.spilled / MB, 1),
+        }
+
+
+class SpillList(Sequence):
+    """
+    Append-only list of strings kept in a temporary file. Call seal() after the
+    last append; items are then decoded on access from a memory map of the file.
+    """
+
+    def __init__(self, budget=None):
+        self._file = tempfile.TemporaryFile(dir=SPILL_DIR)
+        self._spans = []  # (offset, length) of each item's UTF-8 bytes
+        self._size = 0
+        self._map = None
+        self._budget = budget
+
+    def append(self, text):
+        data = text.encode('utf-8')
+        self._file.write(data)
+        self._spans.append((self._size, len(data)))
+        self._size += len(data)
+        if self._budget is not None:
+            self._budget.spilled += len(data)
+
+    def seal(self):
+        self._file.flush()
+        if self._size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def __getitem__(self, index):
+        offset, length = self._spans[index]
+        return self._map[offset:offset + length].decode('utf-8') if length else ""
+
+    def __len__(self):
+        return len(self._spans)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+class PageStore(Mapping):
+    """
+    {page number: text} spilled to a SpillList, for documents too big to hold in
+    memory. Stands in for the joined document text as well: see chunks(), join()
+    and digest. Closing the store also closes the chunk lists it made.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self._pages = SpillList(budget)
+        self._chunk_lists = {}  # (max_tokens, overlap_tokens) -> SpillList
+        self._index = {}  # page number -> position in _pages
+        self._digest = hashlib.sha256()
+        self.characters = 0  # of the non-empty pages joined with chunking.PAGE_BREAK
+
+    def add(self, number, text):
+        self._index[number] = len(self._pages)
+        self._pages.append(text)
+        if text:
+            if self.characters:
+                self.characters += len(chunking.PAGE_BREAK)
+                self._digest.update(chunking.PAGE_BREAK.encode('utf-8'))
+            self.characters += len(text)
+            self._digest.update(text.encode('utf-8'))
+
+    def seal(self):
+        self._pages.seal()
+        return self
+
+    @property
+    def digest(self):
+        """SHA-256 of the joined text; stands in for the text in cache keys."""
+        return self._digest.hexdigest()
+
+    @property
+    def tokens(self):
+        return -(-self.characters // chunking.CHARS_PER_TOKEN)
+
+    def __getitem__(self, number):
+        return self._pages[self._index[number]]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def texts(self):
+        """The non-empty pages in order, one at a time."""
+        return (text for text in map(self.__getitem__, self._index) if text)
+
+    def join(self):
+        """The whole text as one string, for the stages that can't work page by page."""
+        return chunking.PAGE_BREAK.join(self.texts())
+
+    def chunks(self, max_tokens, overlap_tokens, stable=False):
+        """
+        Chunk the pages, spilling the chunks to a sealed SpillList: balanced and
+        overlapping (chunking.iter_balanced_page_chunks), or with stable page-aligned
+        boundaries like chunking.chunk_pages.
+        """
+        key = (max_tokens, overlap_tokens, stable)
+        if key in self._chunk_lists:
+            return self._chunk_lists[key]
+        chunks = self._chunk_lists[key] = SpillList(self.budget)
+        if self.tokens <= max_tokens:
+            if self.characters:
+                chunks.append(self.join())
+        elif stable:
+            for chunk in chunking.iter_page_chunks(self.texts(), max_tokens, overlap_tokens):
+                chunks.append(chunk)
+        else:
+            for chunk in chunking.iter_balanced_page_chunks(self.texts, max_tokens, overlap_tokens):
+                chunks.append(chunk)
+        return chunks.seal()
+
+    def close(self):
+        for chunks in self._chunk_lists.values():
+            chunks.close()
+        self._pages.close()
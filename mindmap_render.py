@@ -0,0 +1,320 @@
+"""Server-side mindmap renderer: tree layout plus SVG, PNG and vector PDF output.
+
+The markdown produced by create_mindmap_markdown is parsed with mindmap_tree,
+laid out left to right in the same style as the interactive Markmap view
+(coloured underlines per depth, curved connectors), and drawn without a
+browser. SVG and PDF are generated as plain text; PNG uses Pillow, which is
+already installed alongside Streamlit. PNGs are scaled down to fit
+MINDMAP_PNG_MAX_PIXELS; a map too large to stay legible at that size raises
+MindmapTooLarge, since drawing it would block for tens of seconds. The PDF uses the standard Helvetica
+font, so its text is limited to Windows-1252: symbols are mapped to ASCII
+stand-ins, accented letters outside it lose their accents, and anything
+else becomes "?".
+"""
+import math
+import os
+import re
+import textwrap
+import unicodedata
+import zlib
+from xml.sax.saxutils import escape
+
+import mindmap_tree
+
+COLORS = ['#2196f3', '#4caf50', '#ff9800', '#f44336']
+TEXT_COLOR = '#333333'
+FONT_SIZE = 14
+LINE_HEIGHT = 18
+CHAR_WIDTH = 0.58 * FONT_SIZE  # average Helvetica glyph width estimate
+MAX_LABEL_CHARS = 40
+H_GAP = 48
+V_GAP = 8
+MARGIN = 24
+LINE_WIDTH = 2
+NODE_RADIUS = 3
+NODE_STROKE_WIDTH = 1.5
+PNG_SCALE = 2
+# PNGs are scaled down to at most this many pixels, but never below PNG_MIN_SCALE
+PNG_MAX_PIXELS = int(os.getenv('MINDMAP_PNG_MAX_PIXELS', '8000000'))
+PNG_MIN_SCALE = 0.75
+# Cubic Bezier control point offset that approximates a quarter circle
+_CIRCLE_KAPPA = 0.5523
+
+_LINK_RE = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_EMPHASIS_RE = re.compile(r"(\*\*|__|\*|_|`)")
+# ASCII stand-ins for symbols the PDF's WinAnsi font can't show, e.g. the pipeline's incomplete-section marker
+_PDF_SUBSTITUTES = str.maketrans({
+    "⚠": "(!)", "→": "->", "←": "<-", "↔": "<->", "⇒": "=>", "≤": "<=", "≥": ">=", "≠": "!=", "✓": "[x]",
+    "✔": "[x]", "✗": "[ ]", "✘": "[ ]",
+})
+
+
+class MindmapTooLarge(Exception):
+    """The mindmap is too large to render as a legible PNG within PNG_MAX_PIXELS."""
+
+
+class LayoutNode:
+    """A positioned mindmap node; (x, y) is the top-left corner of its label."""
+
+    __slots__ = ("lines", "depth", "children", "x", "y", "width", "height")
+
+    def __init__(self, title, depth):
+        label = _EMPHASIS_RE.sub("", _LINK_RE.sub(r"\1", title)).strip()
+        self.lines = textwrap.wrap(label, MAX_LABEL_CHARS) or [""]
+        self.depth = depth
+        self.children = []
+        self.x = 0.0
+        self.y = 0.0
+        self.width = max(len(line) for line in self.lines) * CHAR_WIDTH
+        self.height = len(self.lines) * LINE_HEIGHT
+
+    @property
+    def underline_y(self):
+        return self.y + self.height + LINE_WIDTH
+
+    @property
+    def color(self):
+        return COLORS[self.depth % len(COLORS)]
+
+
+def _build(tree_node, depth):
+    node = LayoutNode(tree_node.title, depth)
+    node.children = [_build(child, depth + 1) for child in tree_node.children]
+    return node
+
+
+def _span(node, spans):
+    """Vertical space needed by node's subtree (memoized in spans)."""
+    children_span = sum(_span(child, spans) for child in node.children)
+    children_span += V_GAP * max(len(node.children) - 1, 0)
+    spans[id(node)] = max(node.height + V_GAP, children_span)
+    return spans[id(node)]
+
+
+def _place(node, x, top, spans):
+    node.x = x
+    if not node.children:
+        node.y = top + (spans[id(node)] - node.height) / 2
+        return
+    children_span = sum(spans[id(child)] for child in node.children) + V_GAP * (len(node.children) - 1)
+    child_top = top + (spans[id(node)] - children_span) / 2
+    child_x = x + node.width + H_GAP
+    for child in node.children:
+        _place(child, child_x, child_top, spans)
+        child_top += spans[id(child)] + V_GAP
+    # Centre the parent's underline between its first and last child
+    middle = (node.children[0].underline_y + node.children[-1].underline_y) / 2
+    node.y = middle - node.height - LINE_WIDTH
+
+
+def layout(markdown, title="Mindmap"):
+    """
+    Lay out a markdown mindmap. Returns (root, width, height) where root is a
+    LayoutNode tree. Several top-level headings are grouped under a root titled title.
+    """
+    tree = mindmap_tree.parse_markdown(markdown)
+    if len(tree.children) == 1:
+        root = _build(tree.children[0], 0)
+    else:
+        tree.title = title
+        root = _build(tree, 0)
+    spans = {}
+    total = _span(root, spans)
+    _place(root, MARGIN, MARGIN, spans)
+    width = max(node.x + node.width for node in _walk(root)) + MARGIN
+    return root, width, total + 2 * MARGIN
+
+
+def _walk(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(node.children)
+
+
+def _edges(root):
+    """Yield (parent, child) pairs with the connector's cubic Bezier control points."""
+    for parent in _walk(root):
+        for child in parent.children:
+            x0, y0 = parent.x + parent.width, parent.underline_y
+            x3, y3 = child.x, child.underline_y
+            mid = (x0 + x3) / 2
+            yield child, (x0, y0, mid, y0, mid, y3, x3, y3)
+
+
+def render_svg(markdown, title="Mindmap"):
+    """Render the mindmap as a standalone SVG document (str)."""
+    root, width, height = layout(markdown, title)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+        f'viewBox="0 0 {width:.0f} {height:.0f}" font-family="Helvetica, Arial, sans-serif" font-size="{FONT_SIZE}">',
+        '<rect width="100%" height="100%" fill="#ffffff"/>',
+    ]
+    for child, (x0, y0, x1, y1, x2, y2, x3, y3) in _edges(root):
+        parts.append(
+            f'<path d="M{x0:.1f},{y0:.1f} C{x1:.1f},{y1:.1f} {x2:.1f},{y2:.1f} {x3:.1f},{y3:.1f}" '
+            f'fill="none" stroke="{child.color}" stroke-width="{LINE_WIDTH}"/>'
+        )
+    for node in _walk(root):
+        parts.append(
+            f'<line x1="{node.x:.1f}" y1="{node.underline_y:.1f}" x2="{node.x + node.width:.1f}" '
+            f'y2="{node.underline_y:.1f}" stroke="{node.color}" stroke-width="{LINE_WIDTH}"/>'
+        )
+        if node.children:
+            parts.append(
+                f'<circle cx="{node.x + node.width:.1f}" cy="{node.underline_y:.1f}" r="{NODE_RADIUS}" '
+                f'fill="#ffffff" stroke="{node.color}" stroke-width="{NODE_STROKE_WIDTH}"/>'
+            )
+        for i, line in enumerate(node.lines):
+            baseline = node.y + (i + 1) * LINE_HEIGHT - 4
+            parts.append(f'<text x="{node.x:.1f}" y="{baseline:.1f}" fill="{TEXT_COLOR}">{escape(line)}</text>')
+    parts.append('</svg>')
+    return "\n".join(parts)
+
+
+def _rgb(color):
+    color = color.lstrip('#')
+    return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def _bezier_points(x0, y0, x1, y1, x2, y2, x3, y3, steps=16):
+    points = []
+    for i in range(steps + 1):
+        t = i / steps
+        u = 1 - t
+        points.append((
+            u ** 3 * x0 + 3 * u * u * t * x1 + 3 * u * t * t * x2 + t ** 3 * x3,
+            u ** 3 * y0 + 3 * u * u * t * y1 + 3 * u * t * t * y2 + t ** 3 * y3,
+        ))
+    return points
+
+
+def _load_font(size):
+    from PIL import ImageFont
+
+    for name in ("DejaVuSans.ttf", "Arial.ttf", "LiberationSans-Regular.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 has a single fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def render_png(markdown, title="Mindmap", scale=PNG_SCALE, max_pixels=PNG_MAX_PIXELS):
+    """
+    Render the mindmap as PNG bytes using Pillow, scaled down to at most max_pixels.
+    Raises MindmapTooLarge when that would need a scale below PNG_MIN_SCALE.
+    """
+    from io import BytesIO
+
+    from PIL import Image, ImageDraw
+
+    root, width, height = layout(markdown, title)
+    if max_pixels > 0:
+        scale = min(scale, math.sqrt(max_pixels / (width * height)))
+        if scale < PNG_MIN_SCALE:
+            raise MindmapTooLarge(
+                f"The mindmap ({width:.0f}×{height:.0f} px) is too large for a legible PNG; "
+                "download it as SVG or PDF instead."
+            )
+    image = Image.new("RGB", (int(width * scale), int(height * scale)), "white")
+    draw = ImageDraw.Draw(image)
+    font = _load_font(int(FONT_SIZE * scale))
+    line_width = max(1, int(LINE_WIDTH * scale))
+
+    for child, control_points in _edges(root):
+        points = [(x * scale, y * scale) for x, y in _bezier_points(*control_points)]
+        draw.line(points, fill=_rgb(child.color), width=line_width, joint="curve")
+    for node in _walk(root):
+        underline = node.underline_y * scale
+        draw.line([(node.x * scale, underline), ((node.x + node.width) * scale, underline)],
+                  fill=_rgb(node.color), width=line_width)
+        if node.children:
+            cx, r = (node.x + node.width) * scale, NODE_RADIUS * scale
+            draw.ellipse([cx - r, underline - r, cx + r, underline + r], fill="white", outline=_rgb(node.color),
+                         width=max(1, round(NODE_STROKE_WIDTH * scale)))
+        for i, line in enumerate(node.lines):
+            draw.text((node.x * scale, (node.y + i * LINE_HEIGHT) * scale), line, fill=_rgb(TEXT_COLOR), font=font)
+
+    output = BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def _winansi(char):
+    try:
+        return char.encode("cp1252")
+    except UnicodeEncodeError:
+        # e.g. "ő" -> "o"; characters without a Latin base letter become "?"
+        base = unicodedata.normalize("NFKD", char).encode("cp1252", errors="ignore")
+        return base or b"?"
+
+
+def _pdf_text(text):
+    data = b"".join(_winansi(char) for char in text.translate(_PDF_SUBSTITUTES))
+    return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _pdf_circle(cx, cy, r):
+    """PDF path operators for a circle drawn as four cubic Bezier quarter arcs."""
+    k = r * _CIRCLE_KAPPA
+    return (
+        f"{cx + r:.1f} {cy:.1f} m "
+        f"{cx + r:.1f} {cy + k:.1f} {cx + k:.1f} {cy + r:.1f} {cx:.1f} {cy + r:.1f} c "
+        f"{cx - k:.1f} {cy + r:.1f} {cx - r:.1f} {cy + k:.1f} {cx - r:.1f} {cy:.1f} c "
+        f"{cx - r:.1f} {cy - k:.1f} {cx - k:.1f} {cy - r:.1f} {cx:.1f} {cy - r:.1f} c "
+        f"{cx + k:.1f} {cy - r:.1f} {cx + r:.1f} {cy - k:.1f} {cx + r:.1f} {cy:.1f} c h"
+    )
+
+
+def render_pdf(markdown, title="Mindmap"):
+    """Render the mindmap as a single-page vector PDF (bytes) sized to fit the tree."""
+    root, width, height = layout(markdown, title)
+
+    def colour(color):
+        return " ".join(f"{channel / 255:.3f}" for channel in _rgb(color))
+
+    ops = [f"{LINE_WIDTH} w 1 J"]
+    for child, (x0, y0, x1, y1, x2, y2, x3, y3) in _edges(root):
+        ops.append(
+            f"{colour(child.color)} RG {x0:.1f} {height - y0:.1f} m "
+            f"{x1:.1f} {height - y1:.1f} {x2:.1f} {height - y2:.1f} {x3:.1f} {height - y3:.1f} c S"
+        )
+    for node in _walk(root):
+        underline = height - node.underline_y
+        ops.append(f"{colour(node.color)} RG {node.x:.1f} {underline:.1f} m {node.x + node.width:.1f} {underline:.1f} l S")
+        if node.children:
+            # White-filled circle at the end of the underline, as in the SVG and PNG
+            ops.append(f"q {NODE_STROKE_WIDTH} w 1 1 1 rg {_pdf_circle(node.x + node.width, underline, NODE_RADIUS)} B Q")
+    ops.append(f"{colour(TEXT_COLOR)} rg")
+    content = "\n".join(ops).encode("ascii")
+    text_ops = []
+    for node in _walk(root):
+        for i, line in enumerate(node.lines):
+            baseline = height - (node.y + (i + 1) * LINE_HEIGHT - 4)
+            text_ops.append(b"BT /F1 %d Tf %.1f %.1f Td (%s) Tj ET" % (FONT_SIZE, node.x, baseline, _pdf_text(line)))
+    stream = zlib.compress(content + b"\n" + b"\n".join(text_ops))
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.0f %.0f] "
+        b"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>" % (width, height),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream",
+    ]
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(output)
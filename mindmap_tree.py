@@ -0,0 +1,221 @@
+"""In-memory mindmap tree with a markdown parser, serializer and structural merge.
+
+The per-chunk mindmaps returned by Gemini are parsed into MindmapNode trees
+and merged so that identical or near-identical headings from different
+chunks become a single node and repeated bullet points appear once. The
+merge visits every source node once and looks children up by a normalized
+key, so it runs in time linear in the total number of nodes.
+"""
+import os
+import re
+
+# Optional caps for very large merged mindmaps, e.g. 6 levels and 25 children per node
+MINDMAP_MAX_DEPTH = int(os.getenv('MINDMAP_MAX_DEPTH', '0'))  # 0 = unlimited
+MINDMAP_MAX_CHILDREN = int(os.getenv('MINDMAP_MAX_CHILDREN', '0'))  # 0 = unlimited
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_BULLET_RE = re.compile(r"^(\s*)(?:[-*+]|\d+[.)])\s+(.*)$")
+_NUMBERING_RE = re.compile(r"^(?:(?:chapter|section|part)\s+)?(?:\d+(?:\.\d+)*[.):]?|[ivxlc]+[.):]|[a-z][.)])\s+", re.I)
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+class MindmapNode:
+    """A heading or bullet in the mindmap. The root node has no title."""
+
+    __slots__ = ("title", "is_heading", "children", "_index")
+
+    def __init__(self, title="", is_heading=True):
+        self.title = title
+        self.is_heading = is_heading
+        self.children = []
+        self._index = None
+
+    def add_child(self, child):
+        self.children.append(child)
+        if self._index is not None:
+            self._index.setdefault(normalize_title(child.title), child)
+        return child
+
+    def find_child(self, title):
+        """Return the child whose normalized title matches title, if any."""
+        if self._index is None:
+            self._index = {}
+            for child in self.children:
+                self._index.setdefault(normalize_title(child.title), child)
+        return self._index.get(normalize_title(title))
+
+    def count(self):
+        """Number of nodes in this subtree, excluding the node itself."""
+        total = 0
+        stack = list(self.children)
+        while stack:
+            node = stack.pop()
+            total += 1
+            stack.extend(node.children)
+        return total
+
+    def __repr__(self):
+        return f"MindmapNode({self.title!r}, children={len(self.children)})"
+
+
+def normalize_title(title):
+    """
+    Reduce a heading or bullet to a comparison key so near-identical entries match:
+    case, emphasis, punctuation, leading numbering and simple plurals are ignored.
+    """
+    key = title.replace("**", "").replace("__", "").replace("`", "").strip()
+    key = _NUMBERING_RE.sub("", key)
+    key = _PUNCTUATION_RE.sub(" ", key.lower())
+    words = [word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+             for word in _SPACE_RE.split(key) if word]
+    return " ".join(words)
+
+
+def parse_markdown(markdown):
+    """Parse heading/bullet markdown (as produced by the mindmap prompt) into a tree."""
+    root = MindmapNode()
+    headings = [(0, root)]  # (heading level, node)
+    bullets = []  # (indent, node) for the bullet list under the current heading
+    for line in markdown.splitlines():
+        if not line.strip() or line.strip().startswith("```"):
+            continue
+        heading = _HEADING_RE.match(line)
+        if heading:
+            level = len(heading.group(1))
+            while headings[-1][0] >= level:
+                headings.pop()
+            node = headings[-1][1].add_child(MindmapNode(heading.group(2), True))
+            headings.append((level, node))
+            bullets = []
+            continue
+        bullet = _BULLET_RE.match(line)
+        indent = len(bullet.group(1).expandtabs(4)) if bullet else 0
+        title = bullet.group(2).strip() if bullet else line.strip()
+        while bullets and bullets[-1][0] >= indent:
+            bullets.pop()
+        parent = bullets[-1][1] if bullets else headings[-1][1]
+        node = parent.add_child(MindmapNode(title, False))
+        bullets.append((indent, node))
+    return root
+
+
+def to_markdown(root, levels=0, expanded=()):
+    """
+    Serialize a tree back to markdown: headings for the first six levels, bullets below.
+
+    With levels > 0 only the top `levels` levels are written, plus `levels` more
+    below every node whose id is in expanded. Hidden children are replaced by an
+    "➕ N more" link to "#expand:<id>", where a node's id is the dot-separated path
+    of child indices from the root (see find_node).
+    """
+    lines = []
+
+    def emit(node, node_id, depth, bullet_depth, budget):
+        if node.is_heading and bullet_depth == 0 and depth <= 6:
+            lines.append(f"{'#' * depth} {node.title}")
+            child_bullet_depth = 0
+        else:
+            lines.append(f"{'  ' * bullet_depth}- {node.title}")
+            child_bullet_depth = bullet_depth + 1
+        if node_id in expanded:
+            budget = levels
+        if not node.children:
+            return
+        if budget is not None and budget <= 0:
+            lines.append(f"{'  ' * child_bullet_depth}- [➕ {node.count()} more](#expand:{node_id})")
+            return
+        for i in _emit_order(node, depth + 1, child_bullet_depth):
+            emit(node.children[i], f"{node_id}.{i}", depth + 1, child_bullet_depth,
+                 None if budget is None else budget - 1)
+
+    top_budget = levels - 1 if levels > 0 else None
+    for i in _emit_order(root, 1, 0):
+        emit(root.children[i], str(i), 1, 0, top_budget)
+    return "\n".join(lines)
+
+
+def _emit_order(node, depth, bullet_depth):
+    """
+    Indices of node's children with the ones written as bullets first. A bullet
+    after a sub-heading would belong to that sub-heading when parsed again, and
+    merging can add bullets to a heading that already has sub-headings.
+    """
+    if bullet_depth or depth > 6:
+        return range(len(node.children))
+    return sorted(range(len(node.children)), key=lambda i: node.children[i].is_heading)
+
+
+def to_dict(node):
+    """Convert a tree to nested {"title", "children"} dicts for JSON export."""
+    return {"title": node.title, "children": [to_dict(child) for child in node.children]}
+
+
+def find_node(root, node_id):
+    """
+    Return the node addressed by a dot-separated child-index path such as "0.3.1",
+    or None if there is no such node. The id comes from the browser, so any string is accepted.
+    """
+    node = root
+    for part in node_id.split("."):
+        try:
+            index = int(part)
+        except ValueError:
+            return None
+        # Checked explicitly: a negative index would silently count from the end
+        if not 0 <= index < len(node.children):
+            return None
+        node = node.children[index]
+    return node
+
+
+def merge_into(target, source):
+    """Merge source's children into target, unifying matching nodes and deduplicating bullets."""
+    stack = [(target, source)]
+    while stack:
+        into, node = stack.pop()
+        for child in node.children:
+            existing = into.find_child(child.title)
+            if existing is None:
+                # Copy the node rather than adopting its subtree so duplicates
+                # inside the subtree are folded together as well
+                existing = into.add_child(MindmapNode(child.title, child.is_heading))
+            else:
+                existing.is_heading = existing.is_heading or child.is_heading
+            if child.children:
+                stack.append((existing, child))
+    return target
+
+
+def merge_markdown(markdowns):
+    """Parse and merge several markdown mindmaps into a single tree."""
+    merged = MindmapNode()
+    for markdown in markdowns:
+        merge_into(merged, parse_markdown(markdown))
+    return merged
+
+
+def prune(root, max_depth=MINDMAP_MAX_DEPTH, max_children=MINDMAP_MAX_CHILDREN):
+    """
+    Cap the tree's depth and fan-out in place so it stays renderable.
+    When a node has too many children the largest subtrees are kept (in their
+    original order) and the rest are replaced by a "… N more" bullet.
+    Returns the number of nodes removed.
+    """
+    removed = 0
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if max_depth and depth >= max_depth:
+            removed += node.count()
+            node.children = []
+        elif max_children and len(node.children) > max_children:
+            ranked = sorted(range(len(node.children)), key=lambda i: node.children[i].count(), reverse=True)
+            keep = sorted(ranked[:max_children - 1])
+            dropped = len(node.children) - len(keep)
+            removed += sum(node.children[i].count() + 1 for i in ranked[max_children - 1:])
+            node.children = [node.children[i] for i in keep]
+            node.children.append(MindmapNode(f"… {dropped} more", False))
+        node._index = None
+        stack.extend((child, depth + 1) for child in node.children)
+    return removed
@@ -0,0 +1,99 @@
+"""Process-wide cache of the NLP resources the pipeline needs.
+
+NLTK corpora and models are looked up at most once per server process, on
+first use, instead of calling nltk.download() whenever the pipeline is
+imported (each call fetches NLTK's package index to check for updates):
+
+* NLTK_DATA_DIR is searched first, so a deployment can bundle the data with
+  the app (python scripts/fetch_nltk_data.py) and never touch the network.
+* A resource that is found nowhere is downloaded into NLTK_DATA_DIR once,
+  unless NLTK_DOWNLOAD is off (e.g. air-gapped servers).
+* If it still isn't available, a built-in fallback is used: a stop word
+  list and a regex word tokenizer.
+
+nltk itself is only imported by the first lookup; importing it costs about
+a second. Each first lookup is timed as an "nlp_resource" span.
+"""
+import functools
+import os
+import re
+import threading
+
+import telemetry
+
+NLTK_DATA_DIR = os.getenv('NLTK_DATA_DIR', 'nltk_data')
+NLTK_DOWNLOAD = os.getenv('NLTK_DOWNLOAD', 'true').lower() in ('1', 'true', 'yes')
+# NLTK package id -> resource path passed to nltk.data.find
+NLTK_RESOURCES = {
+    'stopwords': 'corpora/stopwords',
+    'punkt': 'tokenizers/punkt',
+    # NLTK 3.8.2 and later tokenize with punkt_tab instead of the pickled punkt models
+    'punkt_tab': 'tokenizers/punkt_tab',
+}
+
+# Used when the NLTK stopwords corpus isn't available (e.g. offline)
+_FALLBACK_STOP_WORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers
+herself him himself his how i if in into is it its itself just me more most my myself no nor not now of off on
+once only or other our ours ourselves out over own same she should so some such than that the their theirs them
+themselves then there these they this those through to too under until up very was we were what when where which
+while who whom why will with would you your yours yourself yourselves
+""".split())
+# Words (with inner apostrophes and hyphens) and single punctuation marks, like NLTK's word tokenizer
+_WORD_RE = re.compile(r"\w+(?:['’-]\w+)*|[^\w\s]")
+
+_available = {}
+_lock = threading.Lock()
+
+
+def _locate(name):
+    import nltk
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+    try:
+        nltk.data.find(NLTK_RESOURCES[name])
+        return "local"
+    except LookupError:
+        pass
+    if NLTK_DOWNLOAD and nltk.download(name, download_dir=NLTK_DATA_DIR, quiet=True, raise_on_error=False):
+        return "downloaded"
+    return "missing"
+
+
+def nltk_resource(name):
+    """True when NLTK package name (a key of NLTK_RESOURCES) is installed; looked up once per process."""
+    with _lock:
+        if name not in _available:
+            with telemetry.span("nlp_resource", resource=name) as span:
+                source = _locate(name)
+                span.set(source=source)
+            _available[name] = source != "missing"
+        return _available[name]
+
+
+@functools.lru_cache(maxsize=1)
+def stop_words():
+    """English stop words from NLTK, or a built-in list when the corpus isn't available."""
+    if nltk_resource('stopwords'):
+        from nltk.corpus import stopwords
+        return frozenset(stopwords.words('english'))
+    return _FALLBACK_STOP_WORDS
+
+
+@functools.lru_cache(maxsize=1)
+def _word_tokenizer():
+    if nltk_resource('punkt_tab') or nltk_resource('punkt'):
+        from nltk.tokenize import word_tokenize
+        try:
+            # Loads the model now; raises LookupError if this NLTK version needs the other punkt package
+            word_tokenize("Warm up.")
+            return word_tokenize
+        except LookupError:
+            pass
+    return _WORD_RE.findall
+
+
+def word_tokenize(text):
+    """Split text into words and punctuation with NLTK, or a regex when its punkt model isn't available."""
+    return _word_tokenizer()(text)
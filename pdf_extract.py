@@ -0,0 +1,267 @@
+"""Parallel, page-level PDF text extraction with a persistent per-page cache.
+
+Pages are extracted across a process pool (PyPDF2 text extraction is pure
+Python and CPU bound, so threads would serialize on the GIL). Extracted text
+is cached on disk keyed by the file's SHA-256 and the page number, so a
+re-upload or a Streamlit rerun only pays for hashing the bytes.
+"""
+import atexit
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from PyPDF2 import PdfReader
+from PyPDF2.errors import PyPdfError
+
+import chunking
+import llm_cache
+
+PAGE_CACHE_PATH = os.getenv('PAGE_CACHE_PATH', os.path.join('.mindgraphx_cache', 'page_cache.sqlite3'))
+PAGE_CACHE_MAX_BYTES = int(os.getenv('PAGE_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', str(os.cpu_count() or 1)))
+# Below this many uncached pages the process pool start-up isn't worth it
+PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '32'))
+# Pages extracted per batch when a document is streamed (see stream_pages)
+STREAM_BATCH_PAGES = int(os.getenv('PDF_STREAM_BATCH_PAGES', '256'))
+
+
+class ExtractedPDF:
+    """Page-indexed text of a PDF. pages maps 0-based page numbers to their text."""
+
+    def __init__(self, file_hash, num_pages, pages):
+        self.file_hash = file_hash
+        self.num_pages = num_pages
+        self.pages = pages
+
+    @property
+    def text(self):
+        """All non-empty pages joined with chunking.PAGE_BREAK."""
+        return chunking.PAGE_BREAK.join(text for text in self.pages.values() if text).strip()
+
+    def __len__(self):
+        return len(self.pages)
+
+
+def file_hash(data):
+    """Return the SHA-256 hex digest of the PDF bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def parse_page_range(spec, num_pages):
+    """
+    Turn a 1-based page selection such as "1-5, 8, 10-" into sorted 0-based page numbers.
+    An empty spec selects every page; out-of-range pages are ignored.
+    """
+    if not spec or not spec.strip():
+        return list(range(num_pages))
+    selected = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, _, end = part.partition('-')
+            first = int(start) if start.strip() else 1
+            last = int(end) if end.strip() else num_pages
+        else:
+            first = last = int(part)
+        if first > last:
+            raise ValueError(f"Invalid page range: {part}")
+        selected.update(range(max(first, 1) - 1, min(last, num_pages)))
+    return sorted(selected)
+
+
+def _extract_page_batch(path, page_numbers):
+    """Worker: extract the text of page_numbers from the PDF at path."""
+    reader = PdfReader(path)
+    return [(number, reader.pages[number].extract_text() or "") for number in page_numbers]
+
+
+def _batches(page_numbers, workers):
+    """Split page numbers into contiguous batches, a few per worker for load balancing."""
+    batch_count = max(1, min(len(page_numbers), workers * 4))
+    size = -(-len(page_numbers) // batch_count)
+    return [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_page_cache = None
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn avoids forking the Streamlit server's threads into the workers
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+atexit.register(_reset_pool)
+
+
+def get_page_cache():
+    """Return the process-wide per-page text cache."""
+    global _page_cache
+    with _pool_lock:
+        if _page_cache is None:
+            _page_cache = llm_cache.LLMCache(PAGE_CACHE_PATH, PAGE_CACHE_MAX_BYTES)
+        return _page_cache
+
+
+def _page_key(digest, number):
+    return llm_cache.make_key('page', digest, number)
+
+
+def _extract_parallel(data, page_numbers):
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(data)
+        pool = _get_pool()
+        futures = [
+            pool.submit(_extract_page_batch, path, batch)
+            for batch in _batches(page_numbers, PDF_EXTRACT_WORKERS)
+        ]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+    finally:
+        os.remove(path)
+
+
+def read_outline(pdf_file):
+    """
+    Return the PDF's bookmarks as (depth, title, page number) tuples in document
+    order, depth 0 being the top level. The page number is 0-based, or None when
+    the bookmark doesn't point at a page. Returns [] when there are no bookmarks.
+    """
+    data = pdf_file if isinstance(pdf_file, bytes) else pdf_file.getvalue()
+    reader = PdfReader(BytesIO(data))
+    entries = []
+
+    def walk(items, depth):
+        for item in items:
+            if isinstance(item, list):
+                # A nested list holds the children of the bookmark before it
+                walk(item, depth + 1)
+                continue
+            title = str(item.title or "").strip()
+            if not title:
+                continue
+            try:
+                page = reader.get_destination_page_number(item)
+            except (PyPdfError, KeyError, AttributeError, ValueError):
+                page = None
+            entries.append((depth, title, page if page is not None and page >= 0 else None))
+
+    try:
+        walk(reader.outline, 0)
+    except (PyPdfError, KeyError, AttributeError, ValueError):
+        # A damaged outline only costs the draft mindmap its structure
+        pass
+    return entries
+
+
+class PageStream:
+    """
+    Pages of a PDF extracted batch_pages at a time as they are iterated, so a
+    huge document never has all of its page text in memory. Iterating yields
+    (0-based page number, text) pairs in page order.
+    """
+
+    def __init__(self, data, digest, num_pages, numbers, batch_pages):
+        self.data = data
+        self.file_hash = digest
+        self.num_pages = num_pages
+        self.numbers = numbers
+        self.batch_pages = max(1, batch_pages)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __iter__(self):
+        for texts in self.batches():
+            yield from texts.items()
+
+    def batches(self):
+        """Yield {page number: text} for batch_pages pages at a time, in page order."""
+        for start in range(0, len(self.numbers), self.batch_pages):
+            batch = self.numbers[start:start + self.batch_pages]
+            texts = _extract(self.data, self.file_hash, batch)
+            yield {number: texts[number] for number in batch}
+
+    def read(self):
+        """Extract every selected page at once; returns an ExtractedPDF."""
+        texts = _extract(self.data, self.file_hash, self.numbers)
+        return ExtractedPDF(self.file_hash, self.num_pages, {number: texts[number] for number in self.numbers})
+
+
+def stream_pages(pdf_file, pages=None, page_range=None, batch_pages=STREAM_BATCH_PAGES):
+    """
+    Open a PDF for page-by-page extraction; returns a PageStream. Arguments are
+    those of extract_pages, plus the number of pages extracted per batch.
+    """
+    data = pdf_file if isinstance(pdf_file, bytes) else pdf_file.getvalue()
+    digest = file_hash(data)
+    num_pages = len(PdfReader(BytesIO(data)).pages)
+    if pages is None:
+        pages = parse_page_range(page_range, num_pages)
+    pages = [number for number in pages if 0 <= number < num_pages]
+    return PageStream(data, digest, num_pages, pages, batch_pages)
+
+
+def _extract(data, digest, pages):
+    """Return {page number: text} for pages, from the page cache or extracted (and then cached)."""
+    cache = get_page_cache()
+    cached = cache.get_many(_page_key(digest, number) for number in pages)
+    texts = {}
+    missing = []
+    for number in pages:
+        key = _page_key(digest, number)
+        if key in cached:
+            texts[number] = cached[key]
+        else:
+            missing.append(number)
+
+    if missing:
+        extracted = None
+        if len(missing) >= PARALLEL_MIN_PAGES and PDF_EXTRACT_WORKERS > 1:
+            try:
+                extracted = _extract_parallel(data, missing)
+            except BrokenProcessPool:
+                _reset_pool()
+        if extracted is None:
+            reader = PdfReader(BytesIO(data))
+            extracted = [(number, reader.pages[number].extract_text() or "") for number in missing]
+        texts.update(extracted)
+        cache.set_many((_page_key(digest, number), text) for number, text in extracted)
+    return texts
+
+
+def extract_pages(pdf_file, pages=None, page_range=None):
+    """
+    Extract the text of a PDF page by page.
+
+    pdf_file may be raw bytes or a file-like object (e.g. a Streamlit upload).
+    Select pages with either pages (0-based page numbers) or page_range (a
+    1-based spec such as "1-20, 35"). Returns an ExtractedPDF.
+    """
+    return stream_pages(pdf_file, pages, page_range).read()
@@ -0,0 +1,969 @@
+"""Streamlit-independent summary and mindmap pipeline.
+
+Everything between "PDF bytes in" and "summary plus mindmap markdown out"
+lives here, so the Streamlit app, its background jobs and the batch CLI
+(batch.py) share one implementation. Nothing in this module touches
+Streamlit: diagnostics go to the "pipeline" logger and, inside a background
+job, errors and progress are recorded on the job.
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+from collections.abc import Sequence
+from contextlib import ExitStack, contextmanager
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+import chunking
+import dedup
+import draft_mindmap
+import fanout
+import jobs
+import llm_cache
+import llm_resilience
+import llm_scheduler
+import llm_stream
+import memory
+import nlp_resources
+import telemetry
+import mindmap_tree
+import pdf_extract
+import versioning
+
+logger = logging.getLogger("pipeline")
+
+MODEL_NAME = 'gemini-pro'
+# Chunks are packed by estimated tokens up to the model's input limit
+CHUNK_MAX_TOKENS = chunking.max_chunk_tokens(MODEL_NAME)
+CHUNK_OVERLAP_TOKENS = chunking.CHUNK_OVERLAP_TOKENS
+
+SUMMARY_PROMPT = "Summarize the following text in 5-7 bullet points:\n\n{text}"
+SUMMARY_REDUCE_PROMPT = "Summarize the following bullet points into 5-7 concise bullet points:\n\n{text}"
+MINDMAP_PROMPT = """
+Create a hierarchical markdown mindmap from the following text.
+Use proper markdown heading syntax (# for main topics, ## for subtopics, ### for details).
+Focus on the main concepts and their relationships.
+Include relevant details and connections between ideas.
+Keep the structure clean and organized.
+
+Format the output exactly like this example:
+# Main Topic
+## Subtopic 1
+### Detail 1
+- Key point 1
+- Key point 2
+### Detail 2
+## Subtopic 2
+### Detail 3
+### Detail 4
+
+Text to analyze: {text}
+
+Respond only with the markdown mindmap, no additional text.
+"""
+COMBINED_PROMPT = """
+Analyze the following text and respond with exactly two sections.
+
+<summary>
+Summarize the text in 5-7 bullet points.
+</summary>
+<mindmap>
+Create a hierarchical markdown mindmap of the text.
+Use proper markdown heading syntax (# for main topics, ## for subtopics, ### for details)
+and "- " bullets for key points. Focus on the main concepts and their relationships.
+</mindmap>
+
+Text to analyze: {text}
+
+Respond only with the <summary>...</summary> and <mindmap>...</mindmap> sections,
+replacing the instructions inside each tag with your output. No additional text.
+"""
+
+# Partial summaries are re-summarized in groups of this size; below 2 means a single flat reduce
+SUMMARY_REDUCE_FAN_IN = int(os.getenv('SUMMARY_REDUCE_FAN_IN', '8'))
+
+# "combined" sends each chunk once for both outputs; "separate" keeps the two-call path;
+# "offline" makes no Gemini calls and returns the local extractive summary and draft mindmap
+PIPELINE_MODES = ("combined", "separate", "offline")
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'combined')
+# Cut chunks at stable page boundaries so a revised document only resends its changed chunks
+INCREMENTAL = os.getenv('INCREMENTAL', 'false').lower() in ('1', 'true', 'yes')
+# Condense longer texts to this many tokens with extractive.condense before calling Gemini; 0 = off
+EXTRACTIVE_TOKEN_BUDGET = int(os.getenv('EXTRACTIVE_TOKEN_BUDGET', '0'))
+
+
+def preprocess_text(text):
+    """Preprocess the text by removing stop words."""
+    stop_words = nlp_resources.stop_words()
+    word_tokens = nlp_resources.word_tokenize(text)
+    filtered_text = ' '.join([word for word in word_tokens if word.lower() not in stop_words])
+    return filtered_text
+
+
+def offline_summary(text, reason="Gemini could not be reached."):
+    """Extractive bullets shown when no Gemini summary could be produced; the ⚠ keeps them out of the cache."""
+    return f"⚠ {reason} Showing the document's key sentences instead:\n\n{key_sentences(text)}"
+
+
+def key_sentences(text):
+    """
+    The most salient sentences of text as bullets (extractive.summarize). A streamed
+    document (a memory.PageStore) is summarized chunk by chunk, then over the picks.
+    """
+    # extractive pulls in scipy; only load it when a document needs it
+    import extractive
+    with telemetry.span("offline_summary", characters=_characters(text)):
+        if not isinstance(text, memory.PageStore):
+            return extractive.summarize(text)
+        picks = [extractive.summarize(chunk) for chunk in _chunk(text)]
+        return extractive.summarize("\n\n".join(line[2:] for bullets in picks for line in bullets.splitlines()))
+
+
+def _chunk(text):
+    """
+    Split text, a string or a streamed document's memory.PageStore, into Gemini-sized
+    chunks: balanced and overlapping, or page-aligned for incremental reprocessing.
+    """
+    stable = _incremental.get()
+    if isinstance(text, memory.PageStore):
+        return text.chunks(CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, stable)
+    if stable:
+        return chunking.chunk_pages(text, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS)
+    return chunking.chunk_text(text, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS)
+
+
+def _characters(text):
+    return text.characters if isinstance(text, memory.PageStore) else len(text)
+
+
+def _tokens(text):
+    return text.tokens if isinstance(text, memory.PageStore) else chunking.estimate_tokens(text)
+
+
+def _text_key(text):
+    """text as a cache key part; a PageStore is keyed by its digest rather than joined."""
+    return f"pages:{text.digest}" if isinstance(text, memory.PageStore) else text
+
+
+def report_error(message):
+    """Record an error on the background job running this code, or log it."""
+    job = jobs.current_job()
+    if job is not None:
+        job.log("error", message)
+    else:
+        logger.error(message)
+
+
+def report_warning(message):
+    """Record a warning on the background job running this code, or log it."""
+    job = jobs.current_job()
+    if job is not None:
+        job.log("warning", message)
+    else:
+        logger.warning(message)
+
+
+def configure(api_key):
+    """Configure the Gemini client; raises ValueError when no API key is given."""
+    if not api_key:
+        raise ValueError("API Key is missing. Please provide a valid Google API key.")
+    genai.configure(api_key=api_key)
+
+
+# Optional semaphore shared by every worker process of a batch run (see set_llm_limit);
+# the per-process quota and fairness rules live in llm_scheduler
+_llm_slots = None
+
+
+def set_llm_limit(semaphore):
+    """
+    Bound the number of Gemini calls in flight with semaphore, which may be a
+    multiprocessing semaphore shared across processes. None removes the limit.
+    """
+    global _llm_slots
+    _llm_slots = semaphore
+
+
+@contextmanager
+def _llm_slot():
+    if _llm_slots is None:
+        yield
+        return
+    _llm_slots.acquire()
+    try:
+        yield
+    finally:
+        _llm_slots.release()
+
+
+def _usage(response):
+    """(input, output, total) token counts reported by a response, or Nones."""
+    metadata = getattr(response, "usage_metadata", None)
+    return tuple(getattr(metadata, field, None) or None
+                 for field in ("prompt_token_count", "candidates_token_count", "total_token_count"))
+
+
+def _response_text(response):
+    try:
+        return response.text or ""
+    except ValueError:
+        return ""
+
+
+def _request_options(timeout):
+    return {"timeout": timeout} if timeout is not None else None
+
+
+class _ScheduledModel:
+    """
+    GenerativeModel proxy that routes every call through the process-wide
+    llm_scheduler (quota buckets, fair queuing), the optional batch-wide slot
+    and the llm_resilience policy (deadlines, retries, hedging, circuit breaker).
+    """
+
+    def __init__(self, model, session, deadline, job=None, calls=None):
+        self._model = model
+        self._session = session
+        self._deadline = deadline
+        self._check_cancelled = job.check_cancelled if job is not None else None
+        # The document's CallCounts, if process_document is counting them
+        self.calls = calls
+
+    @contextmanager
+    def _slot(self, prompt):
+        estimated = chunking.estimate_tokens(prompt) + llm_scheduler.RESERVED_OUTPUT_TOKENS
+        scheduler = llm_scheduler.get_scheduler()
+        usage = []
+        with scheduler.slot(self._session, estimated, self._check_cancelled), _llm_slot():
+            try:
+                yield usage
+            except google_exceptions.ResourceExhausted:
+                scheduler.record_quota_error()
+                raise
+        scheduler.record_usage(estimated, usage[-1] if usage else None)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        if stream:
+            return llm_resilience.stream_with_policy(
+                lambda timeout: self._stream(prompt, timeout, **kwargs), self._deadline, self._check_cancelled
+            )
+
+        def attempt(timeout):
+            with self._slot(prompt) as usage, telemetry.span("llm_request", session=self._session) as span:
+                response = self._model.generate_content(prompt, request_options=_request_options(timeout), **kwargs)
+                input_tokens, output_tokens, total_tokens = _usage(response)
+                usage.append(total_tokens)
+                span.set(
+                    input_tokens=input_tokens or chunking.estimate_tokens(prompt),
+                    output_tokens=output_tokens or chunking.estimate_tokens(_response_text(response)),
+                )
+            return response
+
+        return llm_resilience.call_with_policy(attempt, self._deadline, self._check_cancelled)
+
+    def _stream(self, prompt, timeout, **kwargs):
+        with self._slot(prompt) as usage, telemetry.span("llm_request", session=self._session, stream=True) as span:
+            parts = self._model.generate_content(prompt, stream=True, request_options=_request_options(timeout), **kwargs)
+            input_tokens = output_tokens = None
+            characters = 0
+            for part in parts:
+                # The last part of a stream carries the usage of the whole response
+                input_tokens, output_tokens, total_tokens = _usage(part)
+                usage.append(total_tokens)
+                characters += len(_response_text(part))
+                yield part
+            span.set(
+                input_tokens=input_tokens or chunking.estimate_tokens(prompt),
+                output_tokens=output_tokens or -(-characters // chunking.CHARS_PER_TOKEN),
+            )
+
+
+class CallCounts:
+    """Chunk prompts of one document that were sent to Gemini or answered from the chunk cache."""
+
+    def __init__(self):
+        self.sent = 0
+        self.cached = 0
+        self._lock = threading.Lock()
+
+    def add(self, sent=0, cached=0):
+        with self._lock:
+            self.sent += sent
+            self.cached += cached
+
+    def to_dict(self):
+        return {"sent": self.sent, "cached": self.cached}
+
+
+# Deadline and call counts of the document being processed by this thread (set by process_document)
+_document_deadline = contextvars.ContextVar("document_deadline", default=None)
+_document_calls = contextvars.ContextVar("document_calls", default=None)
+_incremental = contextvars.ContextVar("incremental", default=INCREMENTAL)
+
+
+def get_model():
+    """
+    Return the Gemini model used by every pipeline call. Calls made for a background
+    job are queued under that job, so concurrent documents take turns, and all calls
+    for one document share its deadline and call counts.
+    """
+    job = jobs.current_job()
+    session = job.id if job is not None else f"thread-{threading.get_ident()}"
+    deadline = _document_deadline.get() or llm_resilience.Deadline()
+    return _ScheduledModel(genai.GenerativeModel(MODEL_NAME), session, deadline, job, _document_calls.get())
+
+
+def _is_cacheable(result):
+    """Only complete results are cached so transient API failures get retried."""
+    return bool(result) and "⚠" not in result and not result.startswith("Error generating")
+
+
+def _map_chunks(model, prompt_template, chunks, on_partial=None, stage="chunk calls"):
+    """
+    Run prompt_template over every chunk in parallel and return the response texts in chunk order.
+    With on_partial, responses are streamed and on_partial(texts) is called with the
+    accumulated text of every chunk, at most once per STREAM_REFRESH_SECONDS.
+    Inside a background job every call is counted towards stage and checks for cancellation.
+    """
+    with telemetry.span(stage.replace(" ", "_"), calls=len(chunks), streaming=on_partial is not None):
+        return _call_chunks(model, prompt_template, chunks, on_partial, stage)
+
+
+class _Prompts(Sequence):
+    """
+    prompt_template applied to chunks[indexes[i]], built on access, so the prompts
+    of a huge document's chunks are never all in memory at once.
+    """
+
+    def __init__(self, prompt_template, chunks, indexes=None):
+        self._template = prompt_template
+        self._chunks = chunks
+        self._indexes = indexes if indexes is not None else range(len(chunks))
+
+    def __getitem__(self, i):
+        return self._template.format(text=self._chunks[self._indexes[i]])
+
+    def __len__(self):
+        return len(self._indexes)
+
+
+def _call_chunks(model, prompt_template, chunks, on_partial, stage):
+    prompts = _Prompts(prompt_template, chunks)
+    job = jobs.current_job()
+    if job is not None:
+        job.add_total(stage, len(prompts))
+
+    # Responses are cached per prompt, so a revised document only sends the chunks
+    # (and reduce groups) whose text changed
+    cache = llm_cache.get_cache()
+    keys = [llm_cache.make_key('chunk', MODEL_NAME, prompt) for prompt in prompts]
+    cached = cache.get_many(keys)
+    pending = [idx for idx, key in enumerate(keys) if key not in cached]
+    if model.calls is not None:
+        model.calls.add(sent=len(pending), cached=len(prompts) - len(pending))
+    if job is not None and len(pending) < len(prompts):
+        job.advance(stage, len(prompts) - len(pending))
+
+    def store(idx, response_text):
+        if response_text and response_text.strip():
+            cache.set(keys[idx], response_text)
+
+    failures = []
+
+    def failed(idx, error):
+        # A failed chunk becomes an empty response, which the summary and mindmap
+        # steps report as a missing section instead of failing the whole document
+        logger.debug("Gemini call for chunk %d failed: %s", idx + 1, error)
+        failures.append(error)
+        if job is not None:
+            job.advance(stage)
+
+    def report_failures():
+        if failures:
+            report_error(f"{len(failures)} of {len(prompts)} Gemini calls failed ({failures[0]}); "
+                         "the affected sections are marked as missing.")
+
+    if on_partial is None:
+        def call(idx):
+            if job is not None:
+                job.check_cancelled()
+            try:
+                with telemetry.span("chunk_call", stage=stage, chunk=idx + 1):
+                    response_text = model.generate_content(prompts[idx]).text
+            except Exception as e:
+                failed(idx, e)
+                return ""
+            store(idx, response_text)
+            if job is not None:
+                job.advance(stage)
+            return response_text
+
+        # Fan the uncached chunks out in parallel; responses come back in chunk order
+        responses = [cached.get(key, "") for key in keys]
+        for idx, response_text in zip(pending, fanout.map_in_order(call, pending)):
+            responses[idx] = response_text
+        report_failures()
+        return responses
+
+    texts = [cached.get(key, "") for key in keys]
+    throttle = llm_stream.Throttle()
+
+    def stream_failed(position, error):
+        # Drop what was streamed before the failure; it is an incomplete response
+        texts[pending[position]] = ""
+        failed(pending[position], error)
+
+    streamed = llm_stream.stream_map(model, _Prompts(prompt_template, chunks, pending), on_error=stream_failed)
+    for position, delta in streamed:
+        idx = pending[position]
+        if job is not None:
+            job.check_cancelled()
+        if delta is None:
+            store(idx, texts[idx])
+            if job is not None:
+                job.advance(stage)
+            continue
+        texts[idx] += delta
+        if throttle.ready():
+            on_partial(texts)
+    on_partial(texts)
+    report_failures()
+    return texts
+
+
+def generate_summary(text, on_partial=None):
+    """
+    Generate a summary of the text using Gemini AI, with chunking if needed.
+    Results are served from the persistent LLM cache when the same text was summarized before.
+    on_partial(summary_so_far) is called as streamed output arrives.
+    """
+    cache = llm_cache.get_cache()
+    cache_key = llm_cache.make_key(
+        'summary', MODEL_NAME, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, _incremental.get(), SUMMARY_PROMPT, SUMMARY_REDUCE_PROMPT,
+        SUMMARY_REDUCE_FAN_IN, _text_key(text),
+    )
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    summary = _generate_summary(text, on_partial)
+    if _is_cacheable(summary):
+        cache.set(cache_key, summary)
+    return summary
+
+
+def _generate_summary(text, on_partial=None):
+    """
+    Call Gemini to summarize the text, chunking it if needed.
+    Per-chunk responses are logged at DEBUG level.
+    """
+    try:
+        model = get_model()
+
+        # Split text into chunks of whole pages whose boundaries survive edits elsewhere
+        chunks = _chunk(text)
+        show_bullets = on_partial and (lambda texts: on_partial("\n".join(t.strip() for t in texts if t.strip())))
+
+        if len(chunks) > 1:
+            logger.debug("Splitting text into chunks for summary... %s", chunking.chunk_stats(chunks, CHUNK_MAX_TOKENS))
+
+            responses = _map_chunks(model, SUMMARY_PROMPT, chunks, show_bullets)
+            if not any(response_text.strip() for response_text in responses):
+                return offline_summary(text)
+
+            for idx, (chunk, response_text) in enumerate(zip(chunks, responses)):
+                logger.debug("Summary chunk %d length=%d", idx + 1, len(chunk))
+                logger.debug("Summary chunk %d AI response: %s", idx + 1, response_text)
+
+            return _reduce_summaries(model, responses, on_partial)
+
+        else:
+            # No chunking needed
+            response_text = _map_chunks(model, SUMMARY_PROMPT, chunks or [text], show_bullets)[0]
+            logger.debug("Single-chunk summary response: %s", response_text)
+
+            if not response_text or not response_text.strip():
+                return offline_summary(text)
+            return response_text.strip()
+
+    except Exception as e:
+        return offline_summary(text, f"Error generating summary: {str(e)}.")
+
+
+def _reduce_summaries(model, chunk_summaries, on_partial=None):
+    """
+    Combine per-chunk bullet summaries and re-summarize them into 5-7 bullets.
+    With many chunks the partial summaries are reduced in groups of SUMMARY_REDUCE_FAN_IN,
+    level by level, so the final prompt stays bounded regardless of document length.
+    Only the final reduce call is streamed to on_partial.
+    """
+    summaries = []
+    for idx, summary in enumerate(chunk_summaries):
+        if summary and summary.strip():
+            summaries.append(summary.strip())
+        else:
+            summaries.append(f"⚠ Could not generate summary for chunk {idx+1}.")
+
+    def reduce_group(group, on_partial=None):
+        # Combine chunk summaries and re-summarize them
+        combined_summary = "\n".join(group)
+        show = on_partial and (lambda texts: on_partial(texts[0]))
+        response_text = _map_chunks(model, SUMMARY_REDUCE_PROMPT, [combined_summary], show, stage="reduce")[0]
+        if response_text and response_text.strip():
+            return response_text.strip()
+        return combined_summary
+
+    def final_reduce(group):
+        return reduce_group(group, on_partial)
+
+    # Intermediate groups run on fan-out threads; keep their calls attributed to the job
+    reduce_group = jobs.bound(reduce_group)
+
+    with telemetry.span("summary_reduce", inputs=len(summaries), fan_in=SUMMARY_REDUCE_FAN_IN):
+        if SUMMARY_REDUCE_FAN_IN < 2:
+            final_summary = final_reduce(summaries)
+        else:
+            final_summary = fanout.tree_reduce(summaries, reduce_group, SUMMARY_REDUCE_FAN_IN, final_combine=final_reduce)
+
+    logger.debug("Final combined summary response: %s", final_summary)
+    return final_summary
+
+
+def create_mindmap_markdown(text, on_partial=None):
+    """
+    Create a hierarchical markdown mindmap from the text using Gemini AI, with chunking if needed.
+    Results are served from the persistent LLM cache when the same text was mapped before.
+    on_partial(markdown_so_far) is called with the complete headings streamed so far.
+    """
+    cache = llm_cache.get_cache()
+    cache_key = llm_cache.make_key(
+        'mindmap', MODEL_NAME, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, _incremental.get(), MINDMAP_PROMPT,
+        mindmap_tree.MINDMAP_MAX_DEPTH, mindmap_tree.MINDMAP_MAX_CHILDREN, _text_key(text),
+    )
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    markdown_content = _create_mindmap_markdown(text, on_partial)
+    if _is_cacheable(markdown_content):
+        cache.set(cache_key, markdown_content)
+    return markdown_content
+
+
+def _preview_mindmap(chunk_mindmaps):
+    """Merge the complete lines streamed so far into a provisional mindmap (no debug output)."""
+    partial = [llm_stream.complete_lines(mindmap) for mindmap in chunk_mindmaps]
+    return mindmap_tree.to_markdown(mindmap_tree.merge_markdown(partial))
+
+
+def _create_mindmap_markdown(text, on_partial=None):
+    """
+    Call Gemini to build the markdown mindmap, chunking the text if needed.
+    Per-chunk responses are logged at DEBUG level.
+    """
+    try:
+        model = get_model()
+
+        # Split text into chunks of whole pages whose boundaries survive edits elsewhere
+        chunks = _chunk(text)
+        show_mindmap = on_partial and (lambda texts: on_partial(_preview_mindmap(texts)))
+
+        if len(chunks) > 1:
+            logger.debug("Splitting text into chunks for mindmap... %s", chunking.chunk_stats(chunks, CHUNK_MAX_TOKENS))
+
+            responses = _map_chunks(model, MINDMAP_PROMPT, chunks, show_mindmap)
+
+            for idx, (chunk, response_text) in enumerate(zip(chunks, responses)):
+                logger.debug("Mindmap chunk %d length=%d", idx + 1, len(chunk))
+                logger.debug("Mindmap chunk %d AI response: %s", idx + 1, response_text)
+
+            return _assemble_mindmap(responses)
+
+        else:
+            # No chunking needed
+            response_text = _map_chunks(model, MINDMAP_PROMPT, chunks or [text], show_mindmap)[0]
+            logger.debug("Single-chunk mindmap AI response: %s", response_text)
+
+            if not response_text or not response_text.strip():
+                report_error("Received empty response from Gemini AI for mindmap.")
+                return None
+            return response_text.strip()
+
+    except Exception as e:
+        report_error(f"Error generating mindmap: {str(e)}")
+        return None
+
+
+def _assemble_mindmap(chunk_mindmaps):
+    """
+    Merge per-chunk mindmap subtrees into a single markdown document.
+    Matching headings across chunks are unified and repeated bullets are dropped.
+    If MINDMAP_MAX_DEPTH / MINDMAP_MAX_CHILDREN are set, the tree is capped to them
+    and a warning says how many nodes were pruned.
+    """
+    with telemetry.span("mindmap_merge", chunks=len(chunk_mindmaps)) as span:
+        merged = mindmap_tree.MindmapNode()
+        failed = []
+        for idx, mindmap in enumerate(chunk_mindmaps):
+            if mindmap and mindmap.strip():
+                mindmap_tree.merge_into(merged, mindmap_tree.parse_markdown(mindmap))
+            else:
+                failed.append(idx)
+
+        pruned = mindmap_tree.prune(merged)
+        if pruned:
+            report_warning(f"{pruned} mindmap nodes pruned to stay within MINDMAP_MAX_DEPTH="
+                           f"{mindmap_tree.MINDMAP_MAX_DEPTH} / MINDMAP_MAX_CHILDREN={mindmap_tree.MINDMAP_MAX_CHILDREN}.")
+        if failed:
+            missing = merged.add_child(mindmap_tree.MindmapNode("Missing sections"))
+            for idx in failed:
+                missing.add_child(mindmap_tree.MindmapNode(f"⚠ Could not generate mindmap for chunk {idx+1}.", False))
+
+        combined_mindmap = mindmap_tree.to_markdown(merged)
+        span.set(nodes=merged.count(), pruned=pruned, failed_chunks=len(failed))
+    logger.debug("Final combined mindmap markdown:\n%s", combined_mindmap)
+    return combined_mindmap
+
+
+def generate_summary_and_mindmap(text, on_summary=None, on_mindmap=None):
+    """
+    Produce the summary and the mindmap from a single Gemini call per chunk.
+    Returns a (summary, markdown_content) tuple; markdown_content is None on failure.
+    on_summary / on_mindmap receive the partial outputs while the response streams.
+    """
+    cache = llm_cache.get_cache()
+    cache_key = llm_cache.make_key(
+        'combined', MODEL_NAME, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, _incremental.get(), COMBINED_PROMPT,
+        SUMMARY_REDUCE_PROMPT, SUMMARY_REDUCE_FAN_IN, mindmap_tree.MINDMAP_MAX_DEPTH, mindmap_tree.MINDMAP_MAX_CHILDREN,
+        _text_key(text),
+    )
+    cached = cache.get(cache_key)
+    if cached is not None:
+        result = json.loads(cached)
+        return result["summary"], result["mindmap"]
+
+    summary, markdown_content = _generate_summary_and_mindmap(text, on_summary, on_mindmap)
+    if _is_cacheable(summary) and _is_cacheable(markdown_content):
+        cache.set(cache_key, json.dumps({"summary": summary, "mindmap": markdown_content}))
+    return summary, markdown_content
+
+
+def _generate_summary_and_mindmap(text, on_summary=None, on_mindmap=None):
+    """
+    Call Gemini once per chunk with the combined prompt, then feed the bullets into
+    the summary reduce step and the subtrees into the mindmap assembly step.
+    """
+    try:
+        model = get_model()
+
+        # Split text into chunks of whole pages whose boundaries survive edits elsewhere
+        chunks = _chunk(text)
+        if len(chunks) > 1:
+            logger.debug("Splitting text into chunks for combined summary and mindmap... %s", chunking.chunk_stats(chunks, CHUNK_MAX_TOKENS))
+
+        def show_sections(texts):
+            sections = [parse_combined_response(response_text) for response_text in texts]
+            if on_summary:
+                on_summary("\n".join(bullets for bullets, _ in sections if bullets))
+            if on_mindmap:
+                on_mindmap(_preview_mindmap([mindmap for _, mindmap in sections]))
+
+        streaming = on_summary is not None or on_mindmap is not None
+        responses = _map_chunks(model, COMBINED_PROMPT, chunks, show_sections if streaming else None)
+        sections = [parse_combined_response(response_text) for response_text in responses]
+
+        for idx, (chunk, response_text) in enumerate(zip(chunks, responses)):
+            logger.debug("Combined chunk %d length=%d", idx + 1, len(chunk))
+            logger.debug("Combined chunk %d AI response: %s", idx + 1, response_text)
+
+        if not any(bullets for bullets, _ in sections):
+            summary = offline_summary(text)
+        elif len(chunks) > 1:
+            summary = _reduce_summaries(model, [bullets for bullets, _ in sections], on_summary)
+        else:
+            summary = sections[0][0]
+        if len(chunks) > 1:
+            return summary, _assemble_mindmap([mindmap for _, mindmap in sections])
+
+        mindmap = sections[0][1]
+        if not mindmap:
+            report_error("Received empty response from Gemini AI for mindmap.")
+            return summary, None
+        return summary, mindmap
+
+    except Exception as e:
+        report_error(f"Error generating mindmap: {str(e)}")
+        return offline_summary(text, f"Error generating summary: {str(e)}."), None
+
+
+def parse_combined_response(response_text):
+    """
+    Split a combined response into its (summary bullets, mindmap markdown) sections.
+    Falls back to treating bullets before the first heading as the summary when the
+    model drops the section tags.
+    """
+    if not response_text:
+        return "", ""
+
+    sections = {}
+    for name in ("summary", "mindmap"):
+        match = re.search(rf"<{name}>(.*?)(?:</{name}>|(?=<\w+>)|$)", response_text, re.S | re.I)
+        if match:
+            sections[name] = match.group(1).strip()
+    if sections:
+        return sections.get("summary", ""), sections.get("mindmap", "")
+
+    lines = response_text.strip().splitlines()
+    first_heading = next((i for i, line in enumerate(lines) if line.lstrip().startswith("#")), len(lines))
+    return "\n".join(lines[:first_heading]).strip(), "\n".join(lines[first_heading:]).strip()
+
+
+def analyze_sentiment(text):
+    # TextBlob is only needed here; importing it on first use keeps it off the app's cold start
+    from textblob import TextBlob
+    if isinstance(text, memory.PageStore):
+        # Average the chunks' polarities, weighted by length, instead of joining the whole text
+        weighted = total = 0
+        for chunk in _chunk(text):
+            weighted += TextBlob(chunk).sentiment.polarity * len(chunk)
+            total += len(chunk)
+        sentiment = weighted / total if total else 0
+    else:
+        sentiment = TextBlob(text).sentiment.polarity
+    if sentiment > 0:
+        return "😊 Positive"
+    elif sentiment < 0:
+        return "😞 Negative"
+    else:
+        return "😐 Neutral"
+
+
+def process_document(pdf_file, page_range=None, preprocess=False, mode=PIPELINE_MODE, on_summary=None, on_mindmap=None,
+                     deduplicate=dedup.DEDUP_ENABLED, token_budget=EXTRACTIVE_TOKEN_BUDGET, on_draft=None,
+                     focus=None, document_id=None, spill=None, memory_limit_mb=memory.JOB_MEMORY_LIMIT_MB,
+                     sentiment=False, incremental=INCREMENTAL):
+    """
+    Run the whole pipeline on one PDF (bytes, a file-like object or a path).
+    Returns a JSON-serializable dict with the summary and mindmap markdown, or
+    None when no text could be extracted. Inside a background job, extraction
+    progress is reported on the job and cancellation is honoured. With
+    deduplicate, repeated headers, footers and paragraphs are removed before
+    any Gemini call (see dedup.py). A token_budget > 0 condenses longer text to
+    its most salient sentences first (see extractive.py). on_draft(markdown)
+    receives a local draft mindmap (see draft_mindmap.py) before any Gemini call.
+    With a focus topic, only the passages that best match it are summarized and
+    mapped (see retrieval.py). With a document_id, the pages are diffed against
+    the previous version processed under that id (see versioning.py); chunks
+    whose pages didn't change are answered from the chunk cache. That needs
+    incremental, which cuts chunks at stable page boundaries (chunking.chunk_pages)
+    instead of balancing them, so an edit doesn't move every later chunk.
+    With spill (by default for documents of memory.STREAMING_MIN_PAGES pages or
+    more), pages are streamed through the pipeline a batch at a time and
+    spilled to disk. memory_limit_mb caps what the job may hold (see memory.py);
+    memory.MemoryLimitExceeded is raised beyond it. The document's sentiment is
+    only analyzed when sentiment is true; otherwise the result's "sentiment" is None.
+    """
+    if isinstance(pdf_file, (str, os.PathLike)):
+        with open(pdf_file, 'rb') as handle:
+            pdf_file = handle.read()
+    incremental_token = _incremental.set(incremental)
+    try:
+        with telemetry.span("document", mode=mode, preprocess=preprocess, page_range=page_range), ExitStack() as cleanup:
+            return _process_document(
+                pdf_file, page_range, preprocess, mode, on_summary, on_mindmap, deduplicate, token_budget, on_draft,
+                focus, document_id, spill, memory_limit_mb, sentiment, cleanup,
+            )
+    finally:
+        _incremental.reset(incremental_token)
+
+
+def _ingest(batches, store, deduplicate, on_batch=None):
+    """
+    Clean {page number: text} batches one page at a time into store (a
+    memory.PageStore), then seal it. Only one batch is held in memory.
+    Returns (characters extracted, dedup stats or None).
+    """
+    deduplicator = dedup.Deduplicator() if deduplicate else None
+    characters = 0
+    for batch in batches:
+        held = sum(len(page) for page in batch.values())
+        store.budget.reserve(held, f"A batch of {len(batch)} pages")
+        for number, page in batch.items():
+            characters += len(page)
+            if deduplicator is not None:
+                page = deduplicator.feed(page)
+            store.add(number, page)
+        store.budget.release(held)
+        if on_batch is not None:
+            on_batch()
+    store.seal()
+    return characters, deduplicator.stats.to_dict() if deduplicator is not None else None
+
+
+def _process_document(
+            pdf_file, page_range, preprocess, mode, on_summary, on_mindmap, deduplicate, token_budget, on_draft, focus,
+            document_id, spill, memory_limit_mb, sentiment, cleanup,
+        ):
+    job = jobs.current_job()
+    budget = memory.MemoryBudget(memory_limit_mb)
+    source = pdf_extract.stream_pages(pdf_file, page_range=page_range)
+    budget.reserve(len(source.data), "The uploaded PDF")
+    if spill is None:
+        # The text is rarely larger than the PDF itself
+        spill = len(source) >= memory.STREAMING_MIN_PAGES or not budget.fits(memory.IN_MEMORY_COPIES * len(source.data))
+    dedup_stats = None
+    if spill:
+        batch_count = -(-len(source) // source.batch_pages)
+        if job is not None:
+            job.add_total("extraction", batch_count)
+        store = memory.PageStore(budget)
+        cleanup.callback(store.close)
+        with telemetry.span("stream_pages", page_range=page_range, batches=batch_count) as span:
+            advance = (lambda: job.advance("extraction")) if job is not None else None
+            characters, dedup_stats = _ingest(source.batches(), store, deduplicate, advance)
+            span.set(pages=len(source), num_pages=source.num_pages, characters=characters,
+                     spilled_bytes=budget.spilled, **(dedup_stats or {}))
+        if not store.characters:
+            return None
+        pages = text = store
+    else:
+        if job is not None:
+            job.add_total("extraction")
+        with telemetry.span("pdf_extraction", page_range=page_range) as span:
+            document = source.read()
+            span.set(pages=len(document), num_pages=document.num_pages, characters=len(document.text))
+        if job is not None:
+            job.advance("extraction")
+        text = document.text
+        if not text:
+            return None
+        characters = len(text)
+        pages = document.pages
+        if not budget.fits(memory.IN_MEMORY_COPIES * characters):
+            # Too big to hold in memory after all: spill the pages and go on as a streamed document
+            logger.info("%d characters don't fit the job's memory ceiling; spilling the pages to disk", characters)
+            text = document = None
+            store = memory.PageStore(budget)
+            cleanup.callback(store.close)
+            with telemetry.span("stream_pages", page_range=page_range, batches=1) as span:
+                _, dedup_stats = _ingest([pages], store, deduplicate)
+                span.set(characters=characters, spilled_bytes=budget.spilled, **(dedup_stats or {}))
+            pages = text = store
+        else:
+            budget.reserve(memory.IN_MEMORY_COPIES * characters, "The document text")
+            if deduplicate:
+                with telemetry.span("dedup", characters=characters) as span:
+                    cleaned, stats = dedup.deduplicate(pages.values())
+                    pages = dict(zip(pages, cleaned))
+                    text = chunking.PAGE_BREAK.join(page for page in cleaned if page).strip()
+                    dedup_stats = stats.to_dict()
+                    span.set(**dedup_stats)
+    budget.streaming = isinstance(text, memory.PageStore)
+    if dedup_stats:
+        logger.info("Removed %d repeated characters (~%d tokens) before calling Gemini",
+                    dedup_stats["characters_saved"], dedup_stats["tokens_saved"])
+    revision = None
+    if document_id:
+        with telemetry.span("versioning", document=document_id) as span:
+            revision = versioning.record(document_id, source.file_hash, pages, page_range)
+            span.set(version=revision["version"], pages_changed=len(revision["pages_changed"]),
+                     pages_added=len(revision["pages_added"]), pages_removed=revision["pages_removed"])
+        if revision["previous_file_hash"] not in (None, source.file_hash):
+            logger.info("%s version %d: %d pages changed, %d added, %d removed", document_id, revision["version"],
+                        len(revision["pages_changed"]), len(revision["pages_added"]), revision["pages_removed"])
+    draft = None
+    if on_draft is not None or mode == "offline":
+        with telemetry.span("draft_mindmap") as span:
+            draft = draft_mindmap.build(pages, pdf_extract.read_outline(pdf_file))
+            span.set(characters=len(draft))
+        if on_draft is not None:
+            on_draft(draft)
+    focused = None
+    if focus and focus.strip():
+        import retrieval
+        with telemetry.span("retrieval", focus=focus) as span:
+            index = retrieval.get_index(source.file_hash, pages, variant="dedup" if deduplicate else "")
+            focused_text, focused_pages = retrieval.focused_text(index, pages, focus)
+            span.set(passages=len(index.spans), pages=len(focused_pages), characters=len(focused_text))
+        if focused_text:
+            text = focused_text
+            focused = {"topic": focus, "pages": [number + 1 for number in focused_pages],
+                       "tokens": chunking.estimate_tokens(text)}
+        else:
+            report_warning(f"Nothing in the document matches the focus topic {focus!r}; processing the whole document.")
+    condensed = None
+    if token_budget > 0 and _tokens(text) > token_budget:
+        import extractive
+        with telemetry.span("extractive", token_budget=token_budget) as span:
+            tokens_before = _tokens(text)
+            if isinstance(text, memory.PageStore):
+                # Sentences are ranked across the whole document, so it has to be joined
+                budget.reserve(2 * text.characters, "Condensing the document")
+                text = text.join()
+            text = extractive.condense(text, token_budget)
+            condensed = {"tokens_before": tokens_before, "tokens_after": chunking.estimate_tokens(text)}
+            span.set(**condensed)
+        logger.info("Condensed the text from ~%d to ~%d tokens", condensed["tokens_before"], condensed["tokens_after"])
+    if preprocess:
+        with telemetry.span("preprocess", characters=characters):
+            if isinstance(text, memory.PageStore):
+                # Page by page into a second spilled store; the cleaned pages stay untouched
+                preprocessed = memory.PageStore(budget)
+                cleanup.callback(preprocessed.close)
+                for number, page in text.items():
+                    preprocessed.add(number, preprocess_text(page) if page else page)
+                text = preprocessed.seal()
+            else:
+                budget.reserve(len(text), "Preprocessing the text")
+                text = preprocess_text(text)
+        logger.debug("Preprocessed text: %d characters", _characters(text))
+    if job is not None:
+        job.check_cancelled()
+
+    if mode != "offline":
+        # Prompts in flight (and their cache keys) plus every chunk's response
+        chunk_characters = CHUNK_MAX_TOKENS * chunking.CHARS_PER_TOKEN
+        responses = (_tokens(text) // CHUNK_MAX_TOKENS + 1) * llm_scheduler.RESERVED_OUTPUT_TOKENS * chunking.CHARS_PER_TOKEN
+        budget.reserve(2 * fanout.LLM_MAX_CONCURRENCY * chunk_characters + responses, "The Gemini calls")
+
+    # Every Gemini call for this document shares one deadline and one set of call counts
+    calls = CallCounts()
+    deadline_token = _document_deadline.set(llm_resilience.Deadline())
+    calls_token = _document_calls.set(calls)
+    try:
+        if mode == "offline":
+            summary = key_sentences(text)
+            markdown_content = draft
+        elif mode == "combined":
+            # One Gemini call per chunk yields both the summary and the mindmap
+            summary, markdown_content = generate_summary_and_mindmap(text, on_summary, on_mindmap)
+        elif mode == "separate":
+            summary = generate_summary(text, on_summary)
+            markdown_content = create_mindmap_markdown(text, on_mindmap)
+        else:
+            raise ValueError(f"Unknown pipeline mode {mode!r}; expected one of {PIPELINE_MODES}")
+    finally:
+        _document_calls.reset(calls_token)
+        _document_deadline.reset(deadline_token)
+    return {
+        "file_hash": source.file_hash,
+        "mode": mode,
+        "summary": summary,
+        "markdown": markdown_content,
+        # False when a Gemini call failed and the outputs carry warnings instead
+        "complete": _is_cacheable(summary) and _is_cacheable(markdown_content),
+        "sentiment": analyze_sentiment(text) if sentiment else None,
+        "characters": characters,
+        "dedup": dedup_stats,
+        "condensed": condensed,
+        "focus": focused,
+        "revision": revision,
+        "calls": calls.to_dict(),
+        "memory": budget.to_dict(),
+        "pages": len(source),
+        "num_pages": source.num_pages,
+    }
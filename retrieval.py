@@ -0,0 +1,192 @@
+"""BM25 passage index for topic-focused summaries and mindmaps.
+
+A document's pages are cut into passages of about PASSAGE_CHARS characters
+at line boundaries and indexed once. The index is a sparse passages x terms
+matrix of term frequencies. It is stored in the page cache next to the
+extracted text, so repeat queries on the same document need neither
+re-extraction nor re-indexing. focused_text(query) returns only the
+best-scoring passages, up to FOCUS_TOKEN_BUDGET tokens and in document
+order, and only that text is sent to Gemini.
+"""
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+import chunking
+import llm_cache
+import nlp_resources
+import pdf_extract
+
+PASSAGE_CHARS = 1500
+FOCUS_TOKEN_BUDGET = int(os.getenv('FOCUS_TOKEN_BUDGET', '20000'))
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Parsed indexes kept in memory so a rerun doesn't even parse the cached JSON
+INDEX_MEMORY_SLOTS = 8
+INDEX_VERSION = 1
+
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9'-]*")
+
+
+def tokenize(text):
+    """Lowercased words without stop words, with a light plural strip so "caches" matches "cache"."""
+    ignored = nlp_resources.stop_words()
+    terms = []
+    for word in _WORD_RE.findall(text.lower()):
+        if word in ignored:
+            continue
+        if word.endswith("'s"):
+            word = word[:-2]
+        elif len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def _passages(pages):
+    """Yield (page number, start, end) spans of about PASSAGE_CHARS characters, cut at line ends."""
+    for number in sorted(pages):
+        text = pages[number]
+        start = 0
+        while start < len(text):
+            end = text.find("\n", start + PASSAGE_CHARS)
+            end = len(text) if end < 0 else end + 1
+            if text[start:end].strip():
+                yield number, start, end
+            start = end
+
+
+class BM25Index:
+    """Term frequencies per passage plus the passage spans needed to cut their text out of the pages."""
+
+    def __init__(self, spans, vocabulary, matrix):
+        self.spans = spans  # [(page number, start, end)]
+        self.vocabulary = vocabulary  # term -> column
+        self.matrix = matrix.tocsc()  # passages x terms; columns are read per query term
+        self.lengths = np.asarray(matrix.sum(axis=1)).ravel()
+        self.average_length = self.lengths.mean() if len(self.lengths) else 0.0
+        document_frequency = np.diff(self.matrix.indptr)
+        n = len(spans)
+        self.idf = np.log(1 + (n - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    @classmethod
+    def build(cls, pages):
+        spans = list(_passages(pages))
+        vocabulary = {}
+        indices = []
+        indptr = [0]
+        for number, start, end in spans:
+            indices.extend(vocabulary.setdefault(term, len(vocabulary)) for term in tokenize(pages[number][start:end]))
+            indptr.append(len(indices))
+        matrix = sparse.csr_matrix(
+            (np.ones(len(indices)), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(spans), len(vocabulary)),
+        )
+        matrix.sum_duplicates()
+        return cls(spans, vocabulary, matrix)
+
+    def to_json(self):
+        matrix = self.matrix.tocsr()
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        return json.dumps({
+            "version": INDEX_VERSION,
+            "spans": self.spans,
+            "terms": terms,
+            "indptr": matrix.indptr.tolist(),
+            "indices": matrix.indices.tolist(),
+            "counts": matrix.data.astype(np.int64).tolist(),
+        })
+
+    @classmethod
+    def from_json(cls, payload):
+        data = json.loads(payload)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError("Stale BM25 index format")
+        matrix = sparse.csr_matrix(
+            (np.asarray(data["counts"], dtype=np.float64), np.asarray(data["indices"]), np.asarray(data["indptr"])),
+            shape=(len(data["spans"]), len(data["terms"])),
+        )
+        vocabulary = {term: column for column, term in enumerate(data["terms"])}
+        return cls([tuple(span) for span in data["spans"]], vocabulary, matrix)
+
+    def search(self, query):
+        """Return (passage indexes best first, their scores) for passages matching any query term."""
+        columns = [self.vocabulary[term] for term in set(tokenize(query)) if term in self.vocabulary]
+        scores = np.zeros(len(self.spans))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / (self.average_length or 1.0))
+        for column in columns:
+            start, end = self.matrix.indptr[column], self.matrix.indptr[column + 1]
+            rows = self.matrix.indices[start:end]
+            frequency = self.matrix.data[start:end]
+            scores[rows] += self.idf[column] * frequency * (BM25_K1 + 1) / (frequency + norm[rows])
+        matched = np.flatnonzero(scores > 0)
+        order = matched[np.argsort(-scores[matched], kind="stable")]
+        return order.tolist(), scores[order].tolist()
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(file_hash, pages, variant=""):
+    """
+    Return the BM25 index of pages ({page number: text}) of the PDF with file_hash.
+    variant distinguishes differently cleaned texts of the same PDF (e.g. deduplicated).
+    """
+    key = llm_cache.make_key('bm25', INDEX_VERSION, file_hash, sorted(pages), PASSAGE_CHARS, variant)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    cache = pdf_extract.get_page_cache()
+    payload = cache.get(key)
+    index = None
+    if payload is not None:
+        try:
+            index = BM25Index.from_json(payload)
+        except (ValueError, KeyError):
+            index = None
+    if index is None:
+        index = BM25Index.build(pages)
+        cache.set(key, index.to_json())
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > INDEX_MEMORY_SLOTS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def focused_text(index, pages, query, token_budget=FOCUS_TOKEN_BUDGET):
+    """
+    Return (text, page numbers) of the passages best matching query, within
+    token_budget tokens and in document order; ("", []) when nothing matches.
+    """
+    order, _ = index.search(query)
+    picked = []
+    used = 0
+    for i in order:
+        number, start, end = index.spans[i]
+        tokens = chunking.estimate_tokens(pages[number][start:end])
+        if used + tokens > token_budget:
+            if picked:
+                break
+            continue
+        picked.append(i)
+        used += tokens
+    picked.sort()
+    parts = []
+    previous_page = None
+    for i in picked:
+        number, start, end = index.spans[i]
+        if parts:
+            # Keep page breaks so the chunker still prefers to cut between pages
+            parts.append(chunking.PAGE_BREAK if number != previous_page else "\n")
+        parts.append(pages[number][start:end].strip())
+        previous_page = number
+    return "".join(parts), sorted({index.spans[i][0] for i in picked})
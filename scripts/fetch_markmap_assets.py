@@ -0,0 +1,29 @@
+"""Download the pinned Markmap front-end assets into markmap_frontend/vendor.
+
+Run once (with network access) as part of the install, before deploying to
+an air-gapped or high-latency environment:
+
+    python scripts/fetch_markmap_assets.py
+
+The asset list and pinned versions live in markmap_assets.py.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import markmap_assets  # noqa: E402
+
+
+def main():
+    failures = markmap_assets.fetch(list(markmap_assets.ASSETS))
+    for name in markmap_assets.ASSETS:
+        if name in failures:
+            print(f"Failed to download {markmap_assets.ASSETS[name]}: {failures[name]}", file=sys.stderr)
+        else:
+            print(f"{name}: {os.path.getsize(markmap_assets.path(name))} bytes")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
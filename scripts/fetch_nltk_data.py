@@ -0,0 +1,36 @@
+"""Download the NLTK data the pipeline uses into nltk_data/ next to the app.
+
+Run once (with network access) before deploying, so the server never checks
+NLTK's package index at runtime:
+
+    python scripts/fetch_nltk_data.py
+
+The app looks in NLTK_DATA_DIR (default nltk_data, relative to the working
+directory) first; see nlp_resources.py. Set NLTK_DOWNLOAD=false on servers
+that must not download anything.
+"""
+import os
+import sys
+
+import nltk
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'nltk_data')
+
+# punkt_tab is what NLTK 3.8.2+ tokenizes with; punkt serves older versions
+PACKAGES = ('stopwords', 'punkt', 'punkt_tab')
+
+
+def main():
+    os.makedirs(DATA_DIR, exist_ok=True)
+    failed = False
+    for package in PACKAGES:
+        if nltk.download(package, download_dir=DATA_DIR, quiet=True, raise_on_error=False):
+            print(f"{package}: ok")
+        else:
+            print(f"Failed to download {package}", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
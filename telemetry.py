@@ -0,0 +1,234 @@
+"""Hot-path instrumentation: timed spans written to a rotating trace file.
+
+Spans are recorded as Chrome Trace Event Format "complete" events, one JSON
+object per line, in TELEMETRY_PATH. The file opens directly in Perfetto
+(ui.perfetto.dev) or chrome://tracing; the format allows the closing bracket
+to be missing, so the file is valid while it is being appended to. When it
+grows past TELEMETRY_MAX_BYTES it is rotated to trace.json.1, .2, ...
+
+Per-stage aggregates (count, total and p95 time, token counts) are also kept
+in memory for the app's performance panel.
+"""
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+TELEMETRY_ENABLED = os.getenv('TELEMETRY_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+TELEMETRY_PATH = os.getenv('TELEMETRY_PATH', os.path.join('.mindgraphx_cache', 'telemetry', 'trace.json'))
+TELEMETRY_MAX_BYTES = int(os.getenv('TELEMETRY_MAX_BYTES', str(10 * 1024 * 1024)))
+TELEMETRY_BACKUPS = int(os.getenv('TELEMETRY_BACKUPS', '3'))
+# Durations kept per span name for the percentile columns
+STAGE_SAMPLES = 1000
+
+_current = contextvars.ContextVar("telemetry_span", default=None)
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """A timed operation. Attributes set while it runs are written with it."""
+
+    __slots__ = ("name", "attrs", "id", "parent_id")
+
+    def __init__(self, name, attrs, parent):
+        self.name = name
+        self.attrs = attrs
+        self.id = next(_span_ids)
+        self.parent_id = parent.id if parent is not None else None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class _NullSpan:
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class TraceWriter:
+    """Appends trace events to a size-rotated file. Safe to use from any thread."""
+
+    def __init__(self, path=TELEMETRY_PATH, max_bytes=TELEMETRY_MAX_BYTES, backups=TELEMETRY_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+        if self._size == 0:
+            self._file.write("[\n")
+            self._size = 2
+
+    def _rotate(self):
+        self._file.close()
+        for number in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{number}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{number + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def write(self, event):
+        line = json.dumps(event, default=str) + ",\n"
+        with self._lock:
+            if self._file is None:
+                self._open()
+            elif self._size + len(line) > self.max_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._file.flush()
+            self._size += len(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class StageStats:
+    """In-memory aggregates per span name."""
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, attrs):
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = {
+                    "count": 0, "total": 0.0, "max": 0.0, "errors": 0,
+                    "input_tokens": 0, "output_tokens": 0, "samples": deque(maxlen=STAGE_SAMPLES),
+                }
+            stage["count"] += 1
+            stage["total"] += seconds
+            stage["max"] = max(stage["max"], seconds)
+            stage["samples"].append(seconds)
+            stage["errors"] += "error" in attrs
+            stage["input_tokens"] += attrs.get("input_tokens") or 0
+            stage["output_tokens"] += attrs.get("output_tokens") or 0
+
+    def summary(self):
+        """One row per span name, slowest total first."""
+        rows = []
+        with self._lock:
+            for name, stage in self._stages.items():
+                samples = sorted(stage["samples"])
+                rows.append({
+                    "stage": name,
+                    "count": stage["count"],
+                    "total_s": round(stage["total"], 3),
+                    "avg_s": round(stage["total"] / stage["count"], 3),
+                    "p95_s": round(samples[int(0.95 * (len(samples) - 1))], 3),
+                    "max_s": round(stage["max"], 3),
+                    "errors": stage["errors"],
+                    "input_tokens": stage["input_tokens"],
+                    "output_tokens": stage["output_tokens"],
+                })
+        rows.sort(key=lambda row: row["total_s"], reverse=True)
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+_stats = StageStats()
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = TraceWriter()
+        return _writer
+
+
+def configure(path=TELEMETRY_PATH, enabled=TELEMETRY_ENABLED):
+    """Point the trace at another file (e.g. one per batch worker process) or switch tracing off."""
+    global _writer, TELEMETRY_ENABLED
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+        _writer = TraceWriter(path)
+        TELEMETRY_ENABLED = enabled
+
+
+def summary():
+    return _stats.summary()
+
+
+def reset():
+    _stats.reset()
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Time the enclosed block as span name. Spans opened inside it on the same thread
+    become its children. Yields the Span so attributes known only at the end
+    (e.g. output_tokens) can be added with span.set(...).
+    """
+    if not TELEMETRY_ENABLED:
+        yield _NULL_SPAN
+        return
+    current = Span(name, attrs, _current.get())
+    token = _current.set(current)
+    started_at = time.time()
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        _current.reset(token)
+        _emit(name, started_at, seconds, current.attrs, current.id, current.parent_id)
+
+
+def record(name, seconds, **attrs):
+    """Record a duration measured without a span (e.g. before telemetry was imported) as span name."""
+    if not TELEMETRY_ENABLED:
+        return
+    parent = _current.get()
+    _emit(name, time.time() - seconds, seconds, attrs, next(_span_ids), parent.id if parent is not None else None)
+
+
+def _emit(name, started_at, seconds, attrs, span_id, parent_id):
+    _stats.record(name, seconds, attrs)
+    args = dict(attrs, span_id=span_id)
+    if parent_id is not None:
+        args["parent_id"] = parent_id
+    try:
+        get_writer().write({
+            "name": name,
+            "cat": "pipeline",
+            "ph": "X",
+            "ts": int(started_at * 1e6),
+            "dur": int(seconds * 1e6),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        })
+    except OSError:
+        # Tracing must never break the pipeline (e.g. a read-only or full disk)
+        pass
@@ -0,0 +1,34 @@
+import random
+
+import chunking
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa".split()
+
+
+def make_pages(count, seed=4):
+    rng = random.Random(seed)
+    return [
+        "\n\n".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 260))) + "."
+                    for _ in range(rng.randint(3, 12)))
+        for _ in range(count)
+    ]
+
+
+def test_chunk_text_is_lossless_and_within_budget():
+    text = chunking.PAGE_BREAK.join(make_pages(120))
+
+    chunks = chunking.chunk_text(text, 8000, 0)
+
+    assert "".join(chunks) == text
+    assert max(chunking.estimate_tokens(chunk) for chunk in chunks) <= 8000
+
+
+def test_chunk_text_leaves_no_trailing_fragment():
+    pages = make_pages(400)
+
+    sizes = [chunking.estimate_tokens(chunk) for chunk in chunking.chunk_text(pages, 8000)]
+    page_sizes = [chunking.estimate_tokens(chunk)
+                  for chunk in chunking.iter_balanced_page_chunks(lambda: pages, 8000)]
+
+    assert len(sizes) <= len(page_sizes)
+    assert min(sizes) >= 0.5 * max(sizes)
@@ -0,0 +1,41 @@
+import dedup
+
+PAGES = 30
+
+
+def page(number):
+    rows = [f"Widget {name} {number * 37 + i},{number:03d} {number % 9}.{i}% {number + i}"
+            for i, name in enumerate("ABC")]
+    return "\n".join([
+        "ACME Corp Annual Report",
+        *rows,
+        f"Quarter {number % 4 + 1} revenue 1{number}",
+        f"Body sentence {number} about the quarterly results.",
+        f"Page {number} of {PAGES}",
+    ])
+
+
+def test_running_header_and_page_numbers_are_removed():
+    cleaned, stats = dedup.deduplicate(page(number) for number in range(1, PAGES + 1))
+
+    assert stats.lines_removed == 2 * (PAGES - dedup.BOILERPLATE_MIN_PAGES)
+    assert cleaned[0].startswith("ACME Corp Annual Report")
+    assert "ACME Corp Annual Report" not in cleaned[-1]
+    assert f"Page {PAGES} of {PAGES}" not in cleaned[-1]
+
+
+def test_numeric_table_rows_at_page_edges_survive():
+    cleaned, _ = dedup.deduplicate(page(number) for number in range(1, PAGES + 1))
+
+    for number, text in enumerate(cleaned, start=1):
+        for i, name in enumerate("ABC"):
+            assert f"Widget {name} {number * 37 + i},{number:03d} {number % 9}.{i}% {number + i}" in text
+
+
+def test_numbered_headings_are_not_running_headers():
+    pages = [f"Chapter {number}\nBody text of chapter {number}." for number in range(1, PAGES + 1)]
+
+    cleaned, stats = dedup.deduplicate(pages)
+
+    assert stats.lines_removed == 0
+    assert cleaned[-1].startswith(f"Chapter {PAGES}")
@@ -0,0 +1,55 @@
+import mindmap_tree
+
+FIRST_CHUNK = """# Main Topic
+## Subtopic 1
+### Detail 1
+- Key point 1
+"""
+SECOND_CHUNK = """# Main Topic
+## Subtopic 1
+- chunk2 bullet
+"""
+
+
+def shape(node):
+    """The tree as nested tuples, ignoring the order of siblings."""
+    return node.title, node.is_heading, sorted(shape(child) for child in node.children)
+
+
+def test_merged_tree_survives_markdown_round_trip():
+    merged = mindmap_tree.merge_markdown([FIRST_CHUNK, SECOND_CHUNK])
+
+    reparsed = mindmap_tree.parse_markdown(mindmap_tree.to_markdown(merged))
+
+    assert shape(reparsed) == shape(merged)
+    subtopic = reparsed.find_child("Main Topic").find_child("Subtopic 1")
+    assert subtopic.find_child("chunk2 bullet") is not None
+    assert subtopic.find_child("Detail 1").find_child("chunk2 bullet") is None
+
+
+def test_bullets_are_written_before_sub_headings():
+    merged = mindmap_tree.merge_markdown([FIRST_CHUNK, SECOND_CHUNK])
+
+    assert mindmap_tree.to_markdown(merged).splitlines() == [
+        "# Main Topic",
+        "## Subtopic 1",
+        "- chunk2 bullet",
+        "### Detail 1",
+        "- Key point 1",
+    ]
+
+
+def test_node_ids_keep_child_indices():
+    merged = mindmap_tree.merge_markdown([FIRST_CHUNK, SECOND_CHUNK])
+
+    markdown = mindmap_tree.to_markdown(merged, levels=2)
+
+    assert "#expand:0.0" in markdown
+    assert mindmap_tree.find_node(merged, "0.0.1").title == "chunk2 bullet"
+
+
+def test_find_node_rejects_malformed_ids():
+    merged = mindmap_tree.merge_markdown([FIRST_CHUNK, SECOND_CHUNK])
+
+    for node_id in ("", "0.x", "0..1", "0.-1", "0.9", "1e3", "0.0.1.0"):
+        assert mindmap_tree.find_node(merged, node_id) is None, node_id
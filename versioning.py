@@ -0,0 +1,104 @@
+"""Revision tracking for documents that are uploaded again after an edit.
+
+In incremental mode a processed document is remembered under a document
+id as the fingerprints of its cleaned pages. In the app the id is the
+upload's file name plus a fingerprint of its first page, so unrelated files
+that share a name aren't diffed against each other. In batch runs it is the
+manifest id. A new version is diffed against the stored one, so the
+results can say which pages changed.
+
+The savings come from the rest of the pipeline. With incremental processing
+on, chunking.chunk_pages keeps chunk boundaries fixed around unchanged pages
+(balanced chunks would all shift after an edit), and every chunk's Gemini
+response is cached under its prompt (see pipeline._call_chunks). A revised
+document therefore only sends the chunks whose pages changed, plus the
+summary reduce calls above them. The mindmap is reassembled locally from the
+cached subtrees of the unchanged chunks and the new subtrees of the changed
+ones.
+"""
+import difflib
+import hashlib
+import json
+import re
+
+import llm_cache
+
+REVISION_FORMAT = 1
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(page):
+    """Fingerprint of a page's text; whitespace differences from extraction don't count as edits."""
+    normalized = _SPACE_RE.sub(" ", page).strip()
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def diff(previous, current):
+    """
+    Compare two page fingerprint lists. Returns (changed, added, removed, unchanged):
+    indexes into current of edited and inserted pages, and counts of the others.
+    """
+    changed = []
+    added = []
+    removed = unchanged = 0
+    matcher = difflib.SequenceMatcher(None, previous, current, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            unchanged += i2 - i1
+        elif tag == "replace":
+            # Pair edited pages up; any surplus on either side was inserted or deleted
+            paired = min(i2 - i1, j2 - j1)
+            changed.extend(range(j1, j1 + paired))
+            added.extend(range(j1 + paired, j2))
+            removed += (i2 - i1) - paired
+        elif tag == "insert":
+            added.extend(range(j1, j2))
+        elif tag == "delete":
+            removed += i2 - i1
+    return changed, added, removed, unchanged
+
+
+def record(document_id, file_hash, pages, page_range=None):
+    """
+    Diff pages ({page number: text}) against the stored previous version of
+    document_id, then store them as its latest version. Returns a dict with the
+    version number, the previous version's file hash (None for a first upload)
+    and the 1-based numbers of changed and added pages.
+    """
+    cache = llm_cache.get_cache()
+    key = llm_cache.make_key('revision', REVISION_FORMAT, document_id, page_range)
+    numbers = sorted(pages)
+    fingerprints = [fingerprint(pages[number]) for number in numbers]
+
+    previous = None
+    stored = cache.get(key)
+    if stored is not None:
+        try:
+            previous = json.loads(stored)
+        except ValueError:
+            previous = None
+
+    revision = {
+        "document": document_id,
+        "version": 1,
+        "previous_file_hash": None,
+        "pages_changed": [],
+        "pages_added": [],
+        "pages_removed": 0,
+        "pages_unchanged": 0,
+    }
+    if previous is not None:
+        changed, added, removed, unchanged = diff(previous["pages"], fingerprints)
+        revision.update(
+            version=previous["version"] + (previous["file_hash"] != file_hash),
+            previous_file_hash=previous["file_hash"],
+            pages_changed=[numbers[i] + 1 for i in changed],
+            pages_added=[numbers[i] + 1 for i in added],
+            pages_removed=removed,
+            pages_unchanged=unchanged,
+        )
+        if previous["file_hash"] == file_hash:
+            return revision
+    cache.set(key, json.dumps({"version": revision["version"], "file_hash": file_hash, "pages": fingerprints}))
+    return revision